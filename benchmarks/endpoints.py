@@ -0,0 +1,434 @@
+"""
+Throughput, latency and peak memory of every endpoint at realistic sizes.
+
+Drives `main:app` in-process (benchmarks.asgi, no server or sockets) with each
+collection pre-loaded with 1k, 100k and 1M synthetic records, and reports per
+endpoint and filter combination: requests/s, p50/p99 latency, the latency of
+the first request (which builds the lazily built views: search index, facet
+counts, columnar mirror) and the peak RSS while the case ran.
+
+Each (size, collection) runs in a fresh worker process that loads only that
+collection (plus a few hundred conversions for destinations to refer to), so
+1M records fit in memory and one case's allocations do not inflate the next
+size's figures. Writes create, update and then delete records, leaving the
+store at its pre-loaded size. The list response cache is off unless
+--response-cache is given, so list requests do the work rather than replay it.
+
+Results are JSON (stdout, or --output), tagged with the app version and git
+commit; --compare OLD.json prints the change in throughput and p99 per case
+against an earlier run, e.g. of the previous release.
+
+    python -m benchmarks.endpoints --output bench.json
+    python -m benchmarks.endpoints --records 1000 100000 --compare bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.asgi import call  # noqa: E402
+
+COLLECTIONS = ("persons", "addresses", "conversions", "destinations")
+NDJSON = {"Accept": "application/x-ndjson"}
+
+# (method, path, JSON body or None, headers)
+Request = Tuple[str, str, Optional[object], Dict[str, str]]
+Case = Callable[[], Request]
+
+
+def get(path: str, headers: Optional[Dict[str, str]] = None) -> Request:
+    return "GET", path, None, headers or {}
+
+
+def send(method: str, path: str, body: object) -> Request:
+    return method, path, body, {}
+
+
+# ------------------------------------------------------------------ memory
+def reset_peak_rss() -> None:
+    """Restart the kernel's peak RSS count (Linux); elsewhere a no-op."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS since reset_peak_rss, or of the whole process where unsupported."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ------------------------------------------------------------------ worker
+def preload(app_main, collection: str, records: int) -> Dict[str, List[UUID]]:
+    """Put `records` synthetic records in the store of `collection`."""
+    from benchmarks.records import FACTORIES, conversion, destination
+
+    ids: Dict[str, List[UUID]] = {}
+
+    def load(name: str, factory, count: int) -> None:
+        ids[name] = []
+
+        def records_of():
+            for i in range(count):
+                record = factory(i)
+                ids[name].append(record.id)
+                yield record.id, record
+
+        getattr(app_main, name).put_many(records_of())
+
+    if collection == "destinations":
+        load("conversions", conversion, min(records, 500))
+        known = ids["conversions"]
+        load(
+            "destinations",
+            lambda i: destination(i, [known[(i + c) % len(known)] for c in range(10)]),
+            records,
+        )
+    else:
+        load(collection, FACTORIES[collection], records)
+    return ids
+
+
+def payload(record, exclude=("id", "created_at", "updated_at", "links")) -> dict:
+    return record.model_dump(mode="json", exclude=set(exclude))
+
+
+def suite(
+    collection: str, records: int, ids: Dict[str, List[UUID]], created: List[str]
+) -> Dict[str, Case]:
+    """The requests per case of `collection`; writes go last, deletes after creates."""
+    from benchmarks.records import FACTORIES, destination
+
+    rng = random.Random(0)
+    pick = ids[collection]
+    fresh = iter(range(records, 2**62))
+
+    def any_id() -> UUID:
+        return rng.choice(pick)
+
+    def one(values: int) -> int:
+        return rng.randrange(values)
+
+    if collection == "persons":
+        cases = {
+            "get": lambda: get(f"/persons/{any_id()}"),
+            "list": lambda: get("/persons?limit=100"),
+            "list city": lambda: get(f"/persons?city=City{one(300)}&limit=100"),
+            "list country+city": lambda: get(
+                f"/persons?country=USA&city=City{one(300)}&limit=100"
+            ),
+            "list first_name+last_name": lambda: get(
+                f"/persons?first_name=First{one(500)}&last_name=Last{one(2000)}"
+            ),
+            "list last_name ndjson": lambda: get(
+                f"/persons?last_name=Last{one(2000)}", NDJSON
+            ),
+            "search": lambda: get(f"/search?q=Last{one(2000)}&collections=persons"),
+            "search prefix": lambda: get("/search?q=Fir&collections=persons"),
+            "search two words": lambda: get(
+                f"/search?q=First{one(500)}+Last{one(2000)}&collections=persons"
+            ),
+            "search fuzzy": lambda: get(f"/search?q=Lsat{one(2000)}&collections=persons"),
+            "health": lambda: get("/health"),
+            "health echo": lambda: get("/health/bench?echo=bench"),
+            "create": lambda: send("POST", "/persons", payload(FACTORIES["persons"](next(fresh)))),
+            "update": lambda: send(
+                "PATCH", f"/persons/{any_id()}", {"phone": f"+1-212-555-{one(10000):04d}"}
+            ),
+            "delete": lambda: send("DELETE", "/persons:batch", [created.pop()]),
+        }
+    elif collection == "addresses":
+        cases = {
+            "get": lambda: get(f"/addresses/{any_id()}"),
+            "list": lambda: get("/addresses?limit=100"),
+            "list city": lambda: get(f"/addresses?city=City{one(300)}&limit=100"),
+            "list country+state": lambda: get(
+                f"/addresses?country=Japan&state=S{one(50)}&limit=100"
+            ),
+            "list postal_code": lambda: get(f"/addresses?postal_code={10000 + one(90000)}"),
+            "facets": lambda: get("/addresses/facets"),
+            "facets country": lambda: get("/addresses/facets?country=France"),
+            "facets state": lambda: get(f"/addresses/facets?state=S{one(50)}"),
+            "create": lambda: send(
+                "POST", "/addresses", payload(FACTORIES["addresses"](next(fresh)))
+            ),
+            "update": lambda: send(
+                "PATCH", f"/addresses/{any_id()}", {"postal_code": f"{10000 + one(90000)}"}
+            ),
+            "delete": lambda: send("DELETE", "/addresses:batch", [created.pop()]),
+        }
+    elif collection == "conversions":
+        cases = {
+            "get": lambda: get(f"/conversions/{any_id()}"),
+            "list": lambda: get("/conversions?limit=100"),
+            "list host_institution": lambda: get(
+                f"/conversions?host_institution=University+{one(50)}&limit=100"
+            ),
+            "list host_institution+home_course_id": lambda: get(
+                f"/conversions?host_institution=University+{one(50)}"
+                f"&home_course_id={one(5000)}"
+            ),
+            "stats": lambda: get("/conversions/stats"),
+            "stats by host_institution": lambda: get(
+                "/conversions/stats?group_by=host_institution"
+            ),
+            "stats by home_course_id filtered": lambda: get(
+                f"/conversions/stats?group_by=home_course_id"
+                f"&foreign_institution_id=ABC{one(50):03d}"
+            ),
+            "resolve": lambda: send(
+                "POST",
+                "/conversions:resolve",
+                [
+                    {"institution_id": f"ABC{one(50):03d}", "course_id": one(5000)}
+                    for _ in range(10)
+                ],
+            ),
+            "search": lambda: get(f"/search?q=University+{one(50)}&collections=conversions"),
+            "create": lambda: send(
+                "POST", "/conversions", payload(FACTORIES["conversions"](next(fresh)))
+            ),
+            "update": lambda: send(
+                "PATCH",
+                f"/conversions/{any_id()}",
+                {"host_institution": f"University {one(50)}"},
+            ),
+            "delete": lambda: send("DELETE", f"/conversions/{created.pop()}", None),
+        }
+    elif collection == "destinations":
+        known = ids["conversions"]
+
+        def new_destination() -> dict:
+            record = destination(next(fresh), rng.sample(known, min(10, len(known))))
+            return payload(record)
+
+        cases = {
+            "get": lambda: get(f"/destinations/{any_id()}"),
+            "get expand": lambda: get(f"/destinations/{any_id()}?expand=conversions"),
+            "list": lambda: get("/destinations?limit=100"),
+            "list expand": lambda: get("/destinations?limit=100&expand=conversions"),
+            "list continent": lambda: get("/destinations?continent=Asia&limit=100"),
+            "list continent+country": lambda: get(
+                "/destinations?continent=Europe&country=France&limit=100"
+            ),
+            "list name": lambda: get(f"/destinations?name=University+{one(50)}&limit=100"),
+            "facets": lambda: get("/destinations/facets"),
+            "facets continent": lambda: get("/destinations/facets?continent=Europe"),
+            "facets name": lambda: get(f"/destinations/facets?name=University+{one(50)}"),
+            "search": lambda: get(f"/search?q=University+{one(50)}&collections=destinations"),
+            "create": lambda: send("POST", "/destinations", new_destination()),
+            "update": lambda: send(
+                "PATCH", f"/destinations/{any_id()}", {"department": "Mathematics"}
+            ),
+            "delete": lambda: send("DELETE", f"/destinations/{created.pop()}", None),
+        }
+    else:
+        raise ValueError(f"Unknown collection {collection!r}")
+    return cases
+
+
+async def measure(
+    app, case: Case, requests: int, concurrency: int, created: List[str]
+) -> dict:
+    """Issue `requests` requests of `case` from `concurrency` concurrent clients."""
+    latencies: List[float] = []
+    remaining = requests
+
+    async def issue() -> float:
+        method, path, body, headers = case()
+        if body is not None:
+            headers = {**headers, "Content-Type": "application/json"}
+            body = json.dumps(body).encode()
+        started = time.perf_counter()
+        status, _, content = await call(app, method, path, headers, body or b"")
+        elapsed = time.perf_counter() - started
+        if not 200 <= status < 300:
+            raise RuntimeError(f"{method} {path} returned {status}: {content[:200]!r}")
+        if status == 201:
+            created.append(json.loads(content)["id"])
+        return elapsed
+
+    async def client() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            latencies.append(await issue())
+
+    # The first request pays for building the views the endpoint reads
+    first = await issue()
+    for _ in range(min(20, requests)):
+        await issue()
+    reset_peak_rss()
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    latencies.sort()
+    return {
+        "requests": requests,
+        "requests_per_s": round(requests / wall, 1),
+        "cpu_us_per_request": round(cpu / requests * 1e6, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+        "first_ms": round(first * 1000, 3),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run_worker(collection: str, records: int, requests: int, concurrency: int) -> dict:
+    import main as app_main
+
+    started = time.perf_counter()
+    ids = preload(app_main, collection, records)
+    preload_s = time.perf_counter() - started
+    reset_peak_rss()
+    loaded_mb = peak_rss_mb()
+    created: List[str] = []
+    cases = {}
+    for name, case in suite(collection, records, ids, created).items():
+        cases[name] = await measure(app_main.app, case, requests, concurrency, created)
+        print(
+            f"{records:>9} {collection:<13} {name:<38} "
+            f"{cases[name]['requests_per_s']:>9.1f} req/s  "
+            f"p50 {cases[name]['p50_ms']:>8.3f} ms  p99 {cases[name]['p99_ms']:>8.3f} ms",
+            file=sys.stderr,
+        )
+    return {
+        "app_version": app_main.app.version,
+        "backend": app_main.store_backend,
+        "preload_s": round(preload_s, 1),
+        "rss_loaded_mb": loaded_mb,
+        "cases": cases,
+    }
+
+
+# ------------------------------------------------------------------ driver
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run_size(args, collection: str, records: int, tmp: str) -> dict:
+    """Benchmark one collection at one size in a fresh worker process."""
+    env = dict(os.environ)
+    for name in ("DATA_DIR", "OPENAPI_CACHE"):
+        env.pop(name, None)
+    if not args.response_cache:
+        env["RESPONSE_CACHE_BYTES"] = "0"
+    if env.get("STORE_BACKEND") == "sqlite":
+        env["SQLITE_PATH"] = os.path.join(tmp, f"{collection}-{records}.sqlite3")
+    result = subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.endpoints", "--worker", collection,
+            "--records", str(records), "--requests", str(args.requests),
+            "--concurrency", str(args.concurrency),
+        ],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True, check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def compare(old: dict, new: dict) -> None:
+    """Print throughput and p99 changes per case between two reports."""
+    print(
+        f"{'records':>9} {'collection':<13} {'case':<38} {'req/s':>8} {'p99':>8}",
+        file=sys.stderr,
+    )
+    for records, collections in new["results"].items():
+        for collection, result in collections.items():
+            before = old["results"].get(records, {}).get(collection, {}).get("cases", {})
+            for name, case in result["cases"].items():
+                if name not in before:
+                    continue
+                throughput = case["requests_per_s"] / before[name]["requests_per_s"] - 1
+                p99 = case["p99_ms"] / before[name]["p99_ms"] - 1
+                print(
+                    f"{records:>9} {collection:<13} {name:<38} "
+                    f"{throughput:>+8.1%} {p99:>+8.1%}",
+                    file=sys.stderr,
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--collections", nargs="+", choices=COLLECTIONS, default=COLLECTIONS)
+    parser.add_argument("--requests", type=int, default=1000, help="Measured requests per case")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent in-process clients")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="Keep the list response cache on")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    parser.add_argument("--worker", choices=COLLECTIONS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = asyncio.run(
+            run_worker(args.worker, args.records[0], args.requests, args.concurrency)
+        )
+        print(json.dumps(result))
+        return
+
+    # Taken from the workers, so this process never opens a store itself
+    report = {
+        "app_version": None,
+        "git_commit": git_commit(),
+        "backend": None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "requests_per_case": args.requests,
+        "concurrency": args.concurrency,
+        "response_cache": args.response_cache,
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for records in args.records:
+            results = report["results"][str(records)] = {}
+            for collection in args.collections:
+                result = run_size(args, collection, records, tmp)
+                report["app_version"] = result.pop("app_version")
+                report["backend"] = result.pop("backend")
+                results[collection] = result
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
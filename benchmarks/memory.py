@@ -0,0 +1,183 @@
+"""
+Memory per stored record of the memory backend.
+
+Loads the same synthetic records into each collection's MemoryRepository,
+which holds every record as its JSON bytes only, and into a replica of the
+previous layout, which held the pydantic model plus its JSON bytes. Memory is
+measured with tracemalloc and covers everything the store keeps: records,
+indexes, paging order and versions.
+
+With --views, measures the derived views main.py keeps on each store (search
+index, facet counts, columnar mirror) instead, with the symbol tables of
+utils.symbols and with interning switched off.
+
+    python -m benchmarks.memory --records 20000 [--views]
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from typing import Callable, Dict, Type
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pydantic import BaseModel  # noqa: E402
+
+from benchmarks.records import FACTORIES  # noqa: E402
+from resources.memory import MemoryRepository  # noqa: E402
+from services import addresses, conversions, destinations, persons  # noqa: E402
+from services.addresses import ADDRESS_INDEXES  # noqa: E402
+from services.conversions import CONVERSION_INDEXES  # noqa: E402
+from services.destinations import DESTINATION_INDEXES  # noqa: E402
+from services.persons import PERSON_INDEXES  # noqa: E402
+from utils.columnar import ColumnarMirror  # noqa: E402
+from utils.facets import FacetCounts  # noqa: E402
+from utils.search import SearchIndex  # noqa: E402
+from utils.symbols import SymbolTable  # noqa: E402
+
+INDEXES = {
+    "persons": PERSON_INDEXES,
+    "addresses": ADDRESS_INDEXES,
+    "conversions": CONVERSION_INDEXES,
+    "destinations": DESTINATION_INDEXES,
+}
+
+# The derived views main.py subscribes to each store
+VIEWS: Dict[str, Callable[[MemoryRepository], list]] = {
+    "persons": lambda s: [
+        SearchIndex(s, persons.PERSON_SEARCH_FIELDS, persons.PERSON_FUZZY_FIELDS)
+    ],
+    "addresses": lambda s: [FacetCounts(s, addresses.ADDRESS_FACETS)],
+    "conversions": lambda s: [
+        SearchIndex(
+            s, conversions.CONVERSION_SEARCH_FIELDS, conversions.CONVERSION_FUZZY_FIELDS
+        ),
+        ColumnarMirror(
+            s, conversions.CONVERSION_DIMENSIONS, conversions.CONVERSION_MEASURES
+        ),
+    ],
+    "destinations": lambda s: [
+        SearchIndex(
+            s,
+            destinations.DESTINATION_SEARCH_FIELDS,
+            destinations.DESTINATION_FUZZY_FIELDS,
+        ),
+        FacetCounts(s, destinations.DESTINATION_FACETS),
+    ],
+}
+
+
+class ModelRepository(MemoryRepository):
+    """The layout before: the model itself is held, its JSON bytes on the side."""
+
+    def __init__(self, name: str, model: Type[BaseModel], indexes: Dict[str, Callable]):
+        super().__init__(name, model, indexes)
+        self.encoded: Dict = {}
+
+    def _pack(self, record: BaseModel) -> BaseModel:
+        self.encoded[record.id] = record.model_dump_json().encode()
+        return record
+
+    def __getitem__(self, record_id):
+        return dict.__getitem__(self, record_id)
+
+    def get(self, record_id, default=None):
+        return dict.get(self, record_id, default)
+
+
+def measure(store_class, name: str, records: int) -> float:
+    """Bytes per record held by a store of `store_class` loaded with `records`."""
+    factory = FACTORIES[name]
+    model = type(factory(0))
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = store_class(name, model, INDEXES[name])
+    for i in range(records):
+        record = factory(i)
+        store[record.id] = record
+    del record
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del store
+    return used / records
+
+
+def measure_views(name: str, records: int) -> float:
+    """Bytes per record held by the derived views of a store of `records`."""
+    factory = FACTORIES[name]
+    store = MemoryRepository(name, type(factory(0)), INDEXES[name])
+    store.put_many((r.id, r) for r in map(factory, range(records)))
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    views = VIEWS[name](store)
+    for view in views:
+        view._sync()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del views, store
+    return used / records
+
+
+def run_views(records: int) -> dict:
+    results = {}
+    intern = SymbolTable.intern
+    for name in FACTORIES:
+        SymbolTable.intern = lambda self, value: value
+        try:
+            before = measure_views(name, records)
+        finally:
+            SymbolTable.intern = intern
+        after = measure_views(name, records)
+        results[name] = {
+            "copies_bytes_per_record": round(before),
+            "interned_bytes_per_record": round(after),
+            "reduction": round(1 - after / before, 3),
+        }
+        print(
+            f"{name:<13} {before:>8.0f} B -> {after:>8.0f} B per record "
+            f"({results[name]['reduction']:.0%} less)",
+            file=sys.stderr,
+        )
+    return {"records": records, "views": results}
+
+
+def run(records: int) -> dict:
+    results = {}
+    for name in FACTORIES:
+        before = measure(ModelRepository, name, records)
+        after = measure(MemoryRepository, name, records)
+        results[name] = {
+            "models_bytes_per_record": round(before),
+            "json_bytes_per_record": round(after),
+            "reduction": round(1 - after / before, 3),
+        }
+        print(
+            f"{name:<13} {before:>8.0f} B -> {after:>8.0f} B per record "
+            f"({results[name]['reduction']:.0%} less)",
+            file=sys.stderr,
+        )
+    return {"records": records, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument(
+        "--views", action="store_true", help="measure the derived views instead"
+    )
+    args = parser.parse_args()
+    report = run_views(args.records) if args.views else run(args.records)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Read-throughput scaling of the multi-worker mode.
+
+Preloads one SQLite store, then for each worker count starts
+`uvicorn main:app --workers N` against it and drives GET /persons/{id} and a
+filtered GET /conversions from client processes for a fixed time. Prints
+requests/s per worker count and the speed-up over a single worker.
+
+    python -m benchmarks.multiworker --records 10000 --duration 10 --workers 1 2 4
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models.conversion import ConversionRead  # noqa: E402
+from models.person import PersonRead  # noqa: E402
+from resources.sqlite import SqliteDatabase, SqliteRepository  # noqa: E402
+from services.conversions import CONVERSION_INDEXES  # noqa: E402
+from services.persons import PERSON_INDEXES  # noqa: E402
+
+INSTITUTIONS = [f"University {i}" for i in range(50)]
+
+
+def preload(path: str, records: int) -> List[str]:
+    """Fill the store directly (no HTTP) and return the person IDs."""
+    db = SqliteDatabase(path)
+    persons = SqliteRepository(db, "persons", PersonRead, PERSON_INDEXES)
+    conversions = SqliteRepository(db, "conversions", ConversionRead, CONVERSION_INDEXES)
+    ids = []
+    for i in range(records):
+        person = PersonRead(
+            uni=f"ab{i % 10000}",
+            first_name=f"First{i % 500}",
+            last_name=f"Last{i % 2000}",
+            email=f"user{i}@example.com",
+            addresses=[{"street": f"{i} Main St", "city": f"City{i % 300}", "country": "USA"}],
+        )
+        persons[person.id] = person
+        ids.append(str(person.id))
+        conversion = ConversionRead(
+            foreign_course={"id": i, "name": f"Course {i}", "institution_id": "ABC124"},
+            home_course={"id": i % 400, "name": f"Home {i % 400}", "institution_id": "ABC123"},
+            host_institution=INSTITUTIONS[i % len(INSTITUTIONS)],
+        )
+        conversions[conversion.id] = conversion
+    db.close()
+    return ids
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+def client(args) -> int:
+    port, ids, duration, seed = args
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    done = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        if done % 2:
+            path = f"/persons/{rng.choice(ids)}"
+        else:
+            institution = rng.choice(INSTITUTIONS).replace(" ", "%20")
+            path = f"/conversions?host_institution={institution}&limit=20"
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"GET {path} returned {response.status}")
+        done += 1
+    return done
+
+
+def run(workers: int, path: str, ids: List[str], duration: float, clients: int) -> float:
+    port = free_port()
+    env = dict(os.environ, STORE_BACKEND="sqlite", SQLITE_PATH=path, WORKERS=str(workers))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        wait_ready(port)
+        # wait_ready() only proves one worker is up; give the rest time to boot
+        time.sleep(1.0 + 0.5 * workers)
+        sample = ids[:5000]
+        with multiprocessing.Pool(clients) as pool:
+            counts = pool.map(
+                client, [(port, sample, duration, seed) for seed in range(clients)]
+            )
+        return sum(counts) / duration
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=10_000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--workers", type=int, nargs="+",
+        default=sorted({1, 2, 4, cores} - {w for w in (2, 4) if w > cores}),
+    )
+    parser.add_argument("--clients", type=int, default=None,
+                        help="Client processes (default: 2 x largest worker count)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        print(f"Preloading {args.records} persons and conversions ...")
+        ids = preload(path, args.records)
+        clients = args.clients or 2 * max(args.workers)
+
+        results = {}
+        for workers in args.workers:
+            results[workers] = run(workers, path, ids, args.duration, clients)
+            print(f"workers={workers:<3} {results[workers]:10.1f} req/s")
+
+    base = results[args.workers[0]] / args.workers[0]
+    print(json.dumps(
+        {
+            "cores": cores,
+            "records": args.records,
+            "req_per_s": results,
+            "scaling_efficiency": {w: round(r / (base * w), 3) for w, r in results.items()},
+        },
+        indent=2,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Deterministic synthetic records for the benchmarks, one factory per collection.
+Field values repeat with realistic cardinalities (a few hundred cities, a few
+dozen host institutions) so indexes and filters behave as on real data.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional
+from uuid import UUID, uuid4
+
+from pydantic import BaseModel
+
+from models.address import AddressRead
+from models.conversion import ConversionRead
+from models.destination import DestinationRead
+from models.person import PersonRead
+
+CONTINENTS = ["Europe", "Asia", "North America", "South America", "Oceania"]
+COUNTRIES = ["France", "Germany", "Japan", "USA", "Brazil", "Australia", "Spain"]
+
+
+def _course(i: int, institution: str) -> dict:
+    return {
+        "id": i % 5000,
+        "name": f"Course {i % 5000}",
+        "institution_id": institution,
+        "credits": 1 + i % 6,
+    }
+
+
+def person(i: int) -> PersonRead:
+    return PersonRead(
+        uni=f"ab{i % 10000}",
+        first_name=f"First{i % 500}",
+        last_name=f"Last{i % 2000}",
+        email=f"user{i}@example.com",
+        phone="+1-212-555-0199",
+        birth_date="1990-01-01",
+        addresses=[
+            {"street": f"{i} Main St", "city": f"City{i % 300}", "country": "USA"},
+            {"street": f"{i} Side St", "city": "Paris", "country": "France"},
+        ],
+    )
+
+
+def address(i: int) -> AddressRead:
+    return AddressRead(
+        street=f"{i} Main St",
+        city=f"City{i % 300}",
+        state=f"S{i % 50}",
+        postal_code=f"{10000 + i % 90000}",
+        country=COUNTRIES[i % len(COUNTRIES)],
+    )
+
+
+def conversion(i: int) -> ConversionRead:
+    host = f"University {i % 50}"
+    return ConversionRead(
+        foreign_course=_course(i, f"ABC{i % 50:03d}"),
+        home_course=_course(i * 7, "CUC001"),
+        host_institution=host,
+    )
+
+
+def destination(i: int, conversion_ids: Optional[List[UUID]] = None) -> DestinationRead:
+    """A destination referring to `conversion_ids` (ten fresh IDs by default)."""
+    if conversion_ids is None:
+        conversion_ids = [uuid4() for _ in range(10)]
+    return DestinationRead(
+        dest_id=f"ABC{i % 50:03d}",
+        name=f"University {i % 50}",
+        continent=CONTINENTS[i % len(CONTINENTS)],
+        country=COUNTRIES[i % len(COUNTRIES)],
+        department="Computer Science",
+        conversions=conversion_ids,
+    )
+
+
+FACTORIES: Dict[str, Callable[[int], BaseModel]] = {
+    "persons": person,
+    "addresses": address,
+    "conversions": conversion,
+    "destinations": destination,
+}
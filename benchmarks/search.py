@@ -0,0 +1,121 @@
+"""
+Lookup latency of the /search inverted index.
+
+Loads synthetic records into a collection's MemoryRepository with its
+SearchIndex subscribed, so the index is built incrementally as by live
+writes, then times SearchIndex.search() for whole-word, prefix, two-word and
+fuzzy queries (lookup only, without the HTTP layer or fetching the records).
+
+    python -m benchmarks.search --collection persons --records 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.records import FACTORIES  # noqa: E402
+from resources.memory import MemoryRepository  # noqa: E402
+from services.conversions import (  # noqa: E402
+    CONVERSION_FUZZY_FIELDS,
+    CONVERSION_SEARCH_FIELDS,
+)
+from services.destinations import (  # noqa: E402
+    DESTINATION_FUZZY_FIELDS,
+    DESTINATION_SEARCH_FIELDS,
+)
+from services.persons import PERSON_FUZZY_FIELDS, PERSON_SEARCH_FIELDS  # noqa: E402
+from utils.search import SearchIndex  # noqa: E402
+
+FIELDS = {
+    "persons": (PERSON_SEARCH_FIELDS, PERSON_FUZZY_FIELDS),
+    "destinations": (DESTINATION_SEARCH_FIELDS, DESTINATION_FUZZY_FIELDS),
+    "conversions": (CONVERSION_SEARCH_FIELDS, CONVERSION_FUZZY_FIELDS),
+}
+
+# Queries per collection and kind, matching the values benchmarks.records makes
+QUERIES: Dict[str, Dict[str, List[str]]] = {
+    "persons": {
+        "word": ["last1234", "user98765", "first42"],
+        "prefix": ["last12", "user9876", "firs"],
+        "two_words": ["first42 last1542", "first7 last"],
+        "fuzzy": ["lsat1234", "frist42"],
+    },
+    "destinations": {
+        "word": ["university", "science"],
+        "prefix": ["univ", "comp"],
+        "two_words": ["university 42", "computer sci"],
+        "fuzzy": ["univeristy", "sceince"],
+    },
+    "conversions": {
+        "word": ["course", "4242"],
+        "prefix": ["cour", "424"],
+        "two_words": ["course 4242", "course 42"],
+        "fuzzy": ["corse"],
+    },
+}
+
+
+def percentile(samples: List[float], q: float) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1]
+
+
+def run(collection: str, records: int, lookups: int, limit: int) -> dict:
+    factory = FACTORIES[collection]
+    store = MemoryRepository(collection, type(factory(0)), {})
+    fields, fuzzy = FIELDS[collection]
+    index = SearchIndex(store, fields, fuzzy)
+    started = time.perf_counter()
+    store.put_many((r.id, r) for r in map(factory, range(records)))
+    load_s = time.perf_counter() - started
+    results = {}
+    rng = random.Random(0)
+    for kind, queries in QUERIES[collection].items():
+        hits = len(index.search(queries[0], limit))
+        samples = []
+        for _ in range(lookups):
+            query = rng.choice(queries)
+            started = time.perf_counter()
+            index.search(query, limit)
+            samples.append((time.perf_counter() - started) * 1e6)
+        results[kind] = {
+            "queries": queries,
+            "hits_first_query": hits,
+            "p50_us": round(percentile(samples, 50), 1),
+            "p99_us": round(percentile(samples, 99), 1),
+        }
+        print(
+            f"{kind:<10} p50 {results[kind]['p50_us']:>9.1f} us  "
+            f"p99 {results[kind]['p99_us']:>9.1f} us",
+            file=sys.stderr,
+        )
+    return {
+        "collection": collection,
+        "records": records,
+        "distinct_tokens": len(index.postings),
+        "load_and_index_s": round(load_s, 1),
+        "limit": limit,
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--collection", choices=sorted(FIELDS), default="persons")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.collection, args.records, args.lookups, args.limit), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+CPU cost per request of the pre-serialized JSON read path.
+
+Compares the real GET /persons/{id}, GET /persons, GET /destinations/{id} and
+GET /destinations handlers, which answer from the stores' JSON bytes, with
+replicas of the previous handlers that return models through response_model.
+The replicas are mounted on the same app and read the same store. The app is
+called in-process (benchmarks.asgi), and the list response cache is switched
+off so every list request does the work.
+
+    python -m benchmarks.serialization --records 5000 --requests 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+from uuid import UUID
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["RESPONSE_CACHE_BYTES"] = "0"
+
+from fastapi import APIRouter  # noqa: E402
+
+import main as app_main  # noqa: E402
+from benchmarks.asgi import call  # noqa: E402
+from benchmarks.records import conversion, destination, person  # noqa: E402
+from models.destination import DestinationRead  # noqa: E402
+from models.person import PersonRead  # noqa: E402
+
+
+def preload(records: int) -> Dict[str, List[UUID]]:
+    conversions = [conversion(i) for i in range(min(records, 500))]
+    persons, destinations = [], []
+    for i in range(records):
+        persons.append(person(i))
+        destinations.append(
+            destination(
+                i,
+                [conversions[(i + c) % len(conversions)].id for c in range(10)],
+            )
+        )
+    app_main.conversions.put_many((c.id, c) for c in conversions)
+    app_main.persons.put_many((p.id, p) for p in persons)
+    app_main.destinations.put_many((d.id, d) for d in destinations)
+    return {"persons": [p.id for p in persons], "destinations": [d.id for d in destinations]}
+
+
+def mount_baseline() -> None:
+    """The read handlers as they were: models out, response_model serializes."""
+    router = APIRouter(prefix="/_baseline")
+
+    @router.get("/persons/{person_id}", response_model=PersonRead)
+    def get_person(person_id: UUID):
+        return app_main.persons[person_id]
+
+    @router.get("/persons", response_model=List[PersonRead])
+    def list_persons(limit: int = 100):
+        return app_main.persons.find({}, None, limit).records
+
+    @router.get("/destinations/{destination_id}", response_model=DestinationRead)
+    def get_destination(destination_id: UUID):
+        return app_main.destinations[destination_id]
+
+    @router.get("/destinations", response_model=List[DestinationRead])
+    def list_destinations(limit: int = 100):
+        return app_main.destinations.find({}, None, limit).records
+
+    app_main.app.include_router(router)
+
+
+async def measure(paths: Callable[[], str], requests: int) -> Dict[str, float]:
+    # Warm up (route compilation, first-call caches)
+    for _ in range(min(50, requests)):
+        await call(app_main.app, "GET", paths())
+    cpu, wall = time.process_time(), time.perf_counter()
+    body_bytes = 0
+    for _ in range(requests):
+        status, _, body = await call(app_main.app, "GET", paths())
+        if status != 200:
+            raise RuntimeError(f"GET returned {status}")
+        body_bytes += len(body)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return {
+        "cpu_us_per_request": round(cpu / requests * 1e6, 1),
+        "requests_per_s": round(requests / wall, 1),
+        "bytes_per_response": body_bytes // requests,
+    }
+
+
+async def run(records: int, requests: int, page: int) -> dict:
+    ids = preload(records)
+    mount_baseline()
+    rng = random.Random(0)
+    cases = {
+        "get_person": lambda p: f"{p}/persons/{rng.choice(ids['persons'])}",
+        "list_persons": lambda p: f"{p}/persons?limit={page}",
+        "get_destination": lambda p: f"{p}/destinations/{rng.choice(ids['destinations'])}",
+        "list_destinations": lambda p: f"{p}/destinations?limit={page}",
+    }
+    results = {}
+    for name, path in cases.items():
+        # The list endpoints serialize `page` records per request
+        n = requests if name.startswith("get") else max(requests // 10, 20)
+        baseline = await measure(lambda: path("/_baseline"), n)
+        fast = await measure(lambda: path(""), n)
+        results[name] = {
+            "baseline": baseline,
+            "preserialized": fast,
+            "cpu_reduction": round(
+                1 - fast["cpu_us_per_request"] / baseline["cpu_us_per_request"], 3
+            ),
+        }
+        print(
+            f"{name:<18} {baseline['cpu_us_per_request']:>9.1f} us -> "
+            f"{fast['cpu_us_per_request']:>9.1f} us CPU/request "
+            f"({results[name]['cpu_reduction']:.0%} less)",
+            file=sys.stderr,
+        )
+    return {
+        "backend": app_main.store_backend,
+        "records": records,
+        "page_size": page,
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+    report = asyncio.run(run(args.records, args.requests, args.page_size))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Cold start of the app: import-time breakdown and time to first request.
+
+Runs `python -X importtime -c "import main"` and sums the self time of every
+imported module per first-party module and per third-party package. Then it
+starts `uvicorn main:app` several times and measures, from process launch,
+how long the first GET /persons takes to answer 200, and how long the first
+GET /openapi.json takes after that. With --records the server first recovers
+that many records per collection from a DATA_DIR snapshot.
+
+Pass --openapi-cache to serve a document written by `python -m
+framework.openapi`. Pass --budget to exit with status 1 when the median time
+to first request exceeds it, which makes this usable as a CI regression gate.
+
+    python -m benchmarks.startup --runs 5 --openapi-cache --budget 3
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.multiworker import free_port  # noqa: E402
+
+FIRST_PARTY = ("main", "models", "services", "utils", "resources", "framework", "middleware")
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_breakdown(env: Dict[str, str], top: int) -> dict:
+    """Self import time (ms) per first-party module / third-party package."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    groups: Dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        self_us, name = int(match.group(1)), match.group(4)
+        package = name.split(".")[0]
+        groups[name if package in FIRST_PARTY else package] += self_us / 1000
+        total += self_us / 1000
+    ranked = sorted(groups.items(), key=lambda item: -item[1])[:top]
+    return {"total_ms": round(total, 1), "top_ms": {k: round(v, 1) for k, v in ranked}}
+
+
+def preload(data_dir: str, records: int) -> None:
+    """Write a snapshot of `records` synthetic records per collection."""
+    from benchmarks.memory import INDEXES
+    from benchmarks.records import FACTORIES
+    from framework.persistence import Persistence
+    from resources.memory import MemoryRepository
+
+    collections = {}
+    for name, factory in FACTORIES.items():
+        model = type(factory(0))
+        collections[name] = (MemoryRepository(name, model, INDEXES[name]), model)
+    persistence = Persistence(data_dir, collections)
+    persistence.recover()
+    for name, factory in FACTORIES.items():
+        store = collections[name][0]
+        store.put_many((r.id, r) for r in map(factory, range(records)))
+    persistence.close()
+
+
+def _get(port: int, path: str) -> Optional[int]:
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    except OSError:
+        return None
+
+
+def cold_start(env: Dict[str, str], timeout: float) -> Dict[str, float]:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        while _get(port, "/persons?limit=1") != 200:
+            if time.perf_counter() - started > timeout or server.poll() is not None:
+                raise RuntimeError("Server did not answer in time")
+            time.sleep(0.005)
+        first_request = time.perf_counter() - started
+        schema_started = time.perf_counter()
+        if _get(port, "/openapi.json") != 200:
+            raise RuntimeError("GET /openapi.json failed")
+        return {
+            "first_request_s": first_request,
+            "first_openapi_s": time.perf_counter() - schema_started,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--records", type=int, default=0,
+                        help="Records per collection recovered at startup")
+    parser.add_argument("--openapi-cache", action="store_true",
+                        help="Serve a precomputed OpenAPI document")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Fail if the median time to first request exceeds this (s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.pop("OPENAPI_CACHE", None)
+        if args.records:
+            env["DATA_DIR"] = os.path.join(tmp, "data")
+            print(f"Writing a snapshot of {args.records} records per collection ...",
+                  file=sys.stderr)
+            preload(env["DATA_DIR"], args.records)
+        if args.openapi_cache:
+            env["OPENAPI_CACHE"] = os.path.join(tmp, "openapi.json")
+            subprocess.run(
+                [sys.executable, "-m", "framework.openapi", env["OPENAPI_CACHE"]],
+                cwd=ROOT, env={k: v for k, v in env.items() if k != "DATA_DIR"},
+                check=True,
+            )
+        breakdown = import_breakdown(env, args.top)
+        runs = [cold_start(env, args.timeout) for _ in range(args.runs)]
+
+    report = {
+        "records_per_collection": args.records,
+        "openapi_cache": args.openapi_cache,
+        "imports": breakdown,
+    }
+    for key in ("first_request_s", "first_openapi_s"):
+        samples = [run[key] for run in runs]
+        report[key] = {
+            "median": round(statistics.median(samples), 3),
+            "max": round(max(samples), 3),
+        }
+    print(json.dumps(report, indent=2))
+    if args.budget is not None and report["first_request_s"]["median"] > args.budget:
+        print(
+            f"Time to first request {report['first_request_s']['median']} s "
+            f"exceeds the budget of {args.budget} s",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Bulk import/export for the persons, addresses, conversions and destinations stores.
+
+Rows are streamed in fixed-size chunks straight into (or out of) the configured
+store, so files of any size run in bounded memory. The store is set up exactly
+as `main.py` sets it up (STORE_BACKEND, SQLITE_PATH, DATA_DIR), which means an
+import only makes sense against a store that outlives this process: SQLite, or
+the memory backend with DATA_DIR (the server must be stopped in that case).
+
+    python bulk.py import persons persons.jsonl
+    python bulk.py import conversions conversions.csv --chunk-size 10000
+    python bulk.py export destinations - --format csv > destinations.csv
+
+CSV layout: nested objects are flattened into dotted columns
+(`foreign_course.id`), list fields (`addresses`, `conversions`) hold JSON.
+
+Destinations are checked against the conversions store as the API checks
+them, so a row naming an unknown conversion is rejected: import conversions
+first. Rows exported before conversions became references (with the
+conversions embedded) are still accepted: their conversions are stored too.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+import typing
+from typing import Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple, Type
+
+from dotenv import load_dotenv
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+load_dotenv()
+
+COLLECTIONS = ("persons", "addresses", "conversions", "destinations")
+
+
+# -----------------------------------------------------------------------------
+# CSV <-> nested dict helpers
+# -----------------------------------------------------------------------------
+def _is_list(annotation) -> bool:
+    origin = typing.get_origin(annotation)
+    if origin in (list, List):
+        return True
+    if origin is typing.Annotated:
+        return _is_list(typing.get_args(annotation)[0])
+    return origin is typing.Union and any(
+        _is_list(arg) for arg in typing.get_args(annotation)
+    )
+
+
+def _nested_model(annotation) -> Optional[Type[BaseModel]]:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in typing.get_args(annotation):
+        if isinstance(arg, type) and issubclass(arg, BaseModel):
+            return arg
+    return None
+
+
+def csv_columns(model: Type[BaseModel]) -> Tuple[List[str], Set[str]]:
+    """Column names for `model` and the subset that holds JSON-encoded lists."""
+    columns, json_columns = [], set()
+    for name, info in model.model_fields.items():
+        nested = _nested_model(info.annotation)
+        if _is_list(info.annotation):
+            columns.append(name)
+            json_columns.add(name)
+        elif nested is not None:
+            columns.extend(f"{name}.{sub}" for sub in nested.model_fields)
+        else:
+            columns.append(name)
+    return columns, json_columns
+
+
+def flatten(data: dict, json_columns: Set[str]) -> Dict[str, object]:
+    row = {}
+    for key, value in data.items():
+        if key in json_columns:
+            row[key] = "" if value is None else json.dumps(value)
+        elif isinstance(value, dict):
+            for sub, sub_value in value.items():
+                row[f"{key}.{sub}"] = sub_value
+        else:
+            row[key] = value
+    return row
+
+
+def unflatten(row: Dict[str, str], json_columns: Set[str]) -> dict:
+    data: dict = {}
+    for key, value in row.items():
+        if key is None:
+            # csv.DictReader files the cells beyond the header under None
+            raise ValueError(f"{len(value)} more cell(s) than header columns")
+        if value == "" or value is None:
+            continue  # empty cell = field not given
+        if key in json_columns:
+            value = json.loads(value)
+        head, _, sub = key.partition(".")
+        if sub:
+            data.setdefault(head, {})[sub] = value
+        else:
+            data[key] = value
+    return data
+
+
+# -----------------------------------------------------------------------------
+# Readers / writers
+# -----------------------------------------------------------------------------
+def read_rows(
+    f: TextIO, fmt: str, model: Type[BaseModel]
+) -> Iterator[Tuple[int, object]]:
+    """Yield (line number, parsed row); a row that cannot be parsed is an Exception."""
+    if fmt == "csv":
+        _, json_columns = csv_columns(model)
+        reader = csv.DictReader(f)
+        for row in reader:
+            try:
+                yield reader.line_num, unflatten(row, json_columns)
+            except ValueError as exc:
+                yield reader.line_num, exc
+    else:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as exc:
+                yield line_no, exc
+
+
+class Progress:
+    """Prints rows/sec to stderr once per chunk and a summary at the end."""
+
+    def __init__(self, action: str, quiet: bool = False):
+        self.action = action
+        self.quiet = quiet
+        self.rows = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def update(self, rows: int, errors: int = 0) -> None:
+        self.rows += rows
+        self.errors += errors
+        if not self.quiet:
+            print(
+                f"\r{self.action}: {self.rows:,} rows, {self.errors:,} errors, "
+                f"{self.rate():,.0f} rows/s",
+                end="",
+                file=sys.stderr,
+                flush=True,
+            )
+
+    def finish(self) -> None:
+        elapsed = time.perf_counter() - self.started
+        print(
+            f"\r{self.action}: {self.rows:,} rows, {self.errors:,} errors "
+            f"in {elapsed:.2f}s ({self.rate():,.0f} rows/s)",
+            file=sys.stderr,
+        )
+
+
+def _check_destination(record: BaseModel) -> None:
+    # Imported late, like main: the service checks the store main.py injects
+    from services.destinations import check_conversions
+
+    check_conversions(record.conversions)
+
+
+# Checks a record must pass besides its model's validation, as in the API
+CHECKS: Dict[str, Callable[[BaseModel], None]] = {"destinations": _check_destination}
+
+
+def _upgrade_destination(row: dict) -> Optional[Callable[[], None]]:
+    from services.destinations import adopt_conversions, split_embedded_conversions
+
+    split = split_embedded_conversions(row)
+    return (lambda: adopt_conversions(split)) if split else None
+
+
+# Rewrite a row from an older schema in place before it is validated; what they
+# return (if anything) writes what the row needs first, once it validates
+UPGRADES: Dict[str, Callable[[dict], Optional[Callable[[], None]]]] = {
+    "destinations": _upgrade_destination
+}
+
+
+def import_file(
+    store, model: Type[BaseModel], f: TextIO, fmt: str, chunk_size: int,
+    errors: TextIO, progress: Progress,
+    check: Optional[Callable[[BaseModel], None]] = None,
+    upgrade: Optional[Callable[[dict], Optional[Callable[[], None]]]] = None,
+) -> None:
+    """
+    Validate and write the rows of `f` chunk by chunk. `check` vets each record
+    as the API would (e.g. its references), raising RequestValidationError;
+    `upgrade` is one of UPGRADES.
+    """
+    chunk = []
+    bad = 0
+    for line_no, row in read_rows(f, fmt, model):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            prepare = upgrade(row) if upgrade is not None else None
+            # Read models keep exported IDs/timestamps and generate missing ones
+            record = model.model_validate(row)
+            if prepare is not None:
+                prepare()
+            if check is not None:
+                check(record)
+        except (ValueError, ValidationError, RequestValidationError) as exc:
+            bad += 1
+            if isinstance(exc, ValidationError):
+                detail = exc.errors(include_url=False)
+            elif isinstance(exc, RequestValidationError):
+                detail = exc.errors()
+            else:
+                detail = str(exc)
+            entry = {"line": line_no, "error": detail}
+            errors.write(json.dumps(entry, default=str) + "\n")
+            continue
+        chunk.append((record.id, record))
+        if len(chunk) >= chunk_size:
+            store.put_many(chunk)
+            progress.update(len(chunk), bad)
+            chunk, bad = [], 0
+    if chunk or bad:
+        store.put_many(chunk)
+        progress.update(len(chunk), bad)
+
+
+def export_file(
+    store, model: Type[BaseModel], f: TextIO, fmt: str, chunk_size: int,
+    progress: Progress,
+) -> None:
+    writer = None
+    if fmt == "csv":
+        columns, json_columns = csv_columns(model)
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+    # JSON Lines is written from the stored JSON bytes; CSV needs the models
+    for records in store.scan((), None, chunk_size, raw=writer is None):
+        if writer is None:
+            f.write("".join(r.decode() + "\n" for r in records))
+        else:
+            writer.writerows(
+                flatten(r.model_dump(mode="json"), json_columns) for r in records
+            )
+        progress.update(len(records))
+
+
+def _open(path: str, mode: str) -> TextIO:
+    if path == "-":
+        stream = sys.stdin if "r" in mode else sys.stdout
+        return io.TextIOWrapper(stream.buffer, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Stream JSONL/CSV files into or out of the API's stores."
+    )
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("collection", choices=COLLECTIONS)
+    parser.add_argument("path", help="File to read/write, or - for stdin/stdout")
+    parser.add_argument(
+        "--format", choices=("jsonl", "csv"), help="Default: from the file extension"
+    )
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument(
+        "--errors",
+        default="-",
+        help="Where import writes per-row errors as JSONL (default: stderr)",
+    )
+    parser.add_argument("--quiet", action="store_true", help="No progress output")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+
+    import main as app_main
+
+    if args.action == "import" and app_main.store_backend == "memory":
+        if app_main.persistence is None:
+            parser.error(
+                "importing into the memory backend needs DATA_DIR "
+                "(or STORE_BACKEND=sqlite)"
+            )
+    if app_main.persistence is not None:
+        app_main.persistence.recover()
+    if args.collection == "destinations":
+        # As at server startup: stored destinations may predate the schema
+        app_main.destinations_module.migrate_embedded_conversions()
+
+    store = getattr(app_main, args.collection)
+    # Per-chunk progress redraws one line, which only makes sense on a terminal
+    progress = Progress(
+        f"{args.action} {args.collection}",
+        quiet=args.quiet or not sys.stderr.isatty(),
+    )
+    try:
+        if args.action == "import":
+            if args.errors == "-":
+                errors = sys.stderr
+            else:
+                errors = open(args.errors, "w", encoding="utf-8")
+            try:
+                with _open(args.path, "r") as f:
+                    import_file(
+                        store, store.model, f, fmt, args.chunk_size, errors, progress,
+                        CHECKS.get(args.collection),
+                        UPGRADES.get(args.collection),
+                    )
+            finally:
+                if errors is not sys.stderr:
+                    errors.close()
+        else:
+            with _open(args.path, "w") as f:
+                export_file(store, store.model, f, fmt, args.chunk_size, progress)
+    finally:
+        if app_main.persistence is not None:
+            app_main.persistence.close()
+        if app_main.sqlite_db is not None:
+            app_main.sqlite_db.close()
+    progress.finish()
+    return 1 if progress.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+OpenAPI document precomputed at build time.
+
+FastAPI builds the schema on the first hit of /openapi.json or /docs, walking
+every route and model (with their large examples); on a freshly started pod
+that lands on a user. Write the document once when the image is built:
+
+    python -m framework.openapi openapi.json
+
+and start the app with OPENAPI_CACHE=openapi.json to serve it from disk. The
+file records a digest of what the document is generated from: the app's
+routes, the source of its modules (models, their examples and docstrings,
+Query/Body declarations, responses) and the FastAPI and Pydantic versions.
+If any of it changed (the file is stale), the schema is generated as usual.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sys
+from typing import Callable, Iterator, Optional
+
+import fastapi
+import pydantic
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+DIGEST_KEY = "x-routes-digest"
+
+# The directory holding main.py and the app's packages
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _source_files(root: str = ROOT) -> Iterator[str]:
+    """The app's modules: the .py files at `root` and in its packages, sorted."""
+    for directory, subdirs, files in os.walk(root):
+        if directory != root and "__init__.py" not in files:
+            subdirs[:] = []  # not a package (e.g. a virtualenv or the tests)
+            continue
+        subdirs.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                yield os.path.join(directory, name)
+
+
+def routes_digest(app: FastAPI, root: str = ROOT) -> str:
+    """
+    Digest of everything the document is generated from (cheap: no schema
+    built): the app's metadata and routes, the library versions and the
+    source of the app's modules, so an edited model, Query or docstring
+    makes the cached document stale.
+    """
+    routes = sorted(
+        f"{','.join(sorted(route.methods))} {route.path} {route.endpoint.__qualname__}"
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.include_in_schema
+    )
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (
+        app.title,
+        app.version,
+        app.description,
+        app.openapi_version,
+        fastapi.__version__,
+        pydantic.VERSION,
+        *routes,
+    ):
+        digest.update(part.encode() + b"\0")
+    for path in _source_files(root):
+        with open(path, "rb") as f:
+            source = f.read()
+        digest.update(os.path.relpath(path, root).encode() + b"\0")
+        digest.update(hashlib.blake2b(source, digest_size=16).digest())
+    return digest.hexdigest()
+
+
+def write_schema(app: FastAPI, path: str) -> None:
+    schema = {**app.openapi(), DIGEST_KEY: routes_digest(app)}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(schema, f, separators=(",", ":"))
+
+
+def cached_openapi(app: FastAPI, path: str) -> Callable[[], dict]:
+    """
+    A replacement for app.openapi that reads the schema from `path` on first
+    use, falling back to FastAPI's own if the file is missing or stale.
+    """
+    generate = app.openapi
+
+    def openapi() -> dict:
+        if app.openapi_schema is None:
+            schema = _load(path)
+            if schema is not None and schema.pop(DIGEST_KEY, None) == routes_digest(app):
+                app.openapi_schema = schema
+            else:
+                logger.warning("OpenAPI cache %s is missing or stale; generating", path)
+                return generate()
+        return app.openapi_schema
+
+    return openapi
+
+
+def _load(path: str) -> Optional[dict]:
+    try:
+        with open(path, "rb") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m framework.openapi OUTPUT.json")
+    from main import app
+
+    write_schema(app, sys.argv[1])
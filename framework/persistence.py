@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Type
+from uuid import UUID
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+from pydantic import BaseModel
+
+from resources.memory import MemoryRepository
+
+logger = logging.getLogger(__name__)
+
+WAL_PREFIX = "wal-"
+SNAPSHOT_PREFIX = "snapshot-"
+SUFFIX = ".jsonl"
+
+
+def _file_name(prefix: str, lsn: int) -> str:
+    # Zero-padded so that lexical order is LSN order
+    return f"{prefix}{lsn:020d}{SUFFIX}"
+
+
+def _file_lsn(name: str, prefix: str) -> Optional[int]:
+    if not (name.startswith(prefix) and name.endswith(SUFFIX)):
+        return None
+    digits = name[len(prefix) : -len(SUFFIX)]
+    return int(digits) if digits.isdigit() else None
+
+
+class WriteAheadLog:
+    """
+    Append-only log split into segments named after their first LSN.
+
+    append() only queues an entry; a single writer thread writes everything queued
+    so far and fsyncs once for the whole batch (group commit). wait() blocks until
+    a given LSN is durable.
+
+    If a write or fsync fails (disk full, EIO), what reached the file is unknown
+    and retrying cannot tell, so the log fails for good: the writer thread stops,
+    and wait() and append() raise from then on. Writes then fail (a 500) rather
+    than wait forever; the process must be restarted to recover from disk.
+    """
+
+    def __init__(self, directory: str, next_lsn: int = 1, commit_delay: float = 0.002):
+        self.directory = directory
+        self.commit_delay = commit_delay
+        self._next_lsn = next_lsn
+        self._pending: List[Tuple[int, bytes]] = []
+        self._durable_lsn = next_lsn - 1
+        self._cond = threading.Condition()
+        self._closed = False
+        # The error that failed the log (see _run)
+        self._error: Optional[BaseException] = None
+        # Entries with an LSN above this go to a fresh segment (see rotate_after)
+        self._rotate_after = next_lsn - 1
+        self._segment_base: Optional[int] = None
+        self._file = None
+        self._thread = threading.Thread(target=self._run, name="wal-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def last_lsn(self) -> int:
+        """LSN of the most recently appended entry."""
+        return self._next_lsn - 1
+
+    def append(self, make_entry: Callable[[int], bytes]) -> int:
+        """Assign the next LSN, queue make_entry(lsn) and return the LSN."""
+        with self._cond:
+            self._check()
+            if self._closed:
+                raise RuntimeError("Write-ahead log is closed")
+            lsn = self._next_lsn
+            self._next_lsn += 1
+            self._pending.append((lsn, make_entry(lsn)))
+            self._cond.notify_all()
+            return lsn
+
+    def wait(self, lsn: int) -> None:
+        with self._cond:
+            while self._durable_lsn < lsn:
+                self._check()
+                if self._closed and not self._pending:
+                    raise RuntimeError("Write-ahead log closed before entry was synced")
+                self._cond.wait()
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Write-ahead log failed") from self._error
+
+    def rotate_after(self, lsn: int) -> None:
+        """Start a new segment for the first entry with an LSN above `lsn`."""
+        with self._cond:
+            self._rotate_after = max(self._rotate_after, lsn)
+
+    def _open_segment(self, base: int) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = open(os.path.join(self.directory, _file_name(WAL_PREFIX, base)), "ab")
+        self._segment_base = base
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    break
+            # Let concurrent writers join this batch
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            with self._cond:
+                batch, self._pending = self._pending, []
+                rotate_after = self._rotate_after
+            try:
+                self._write(batch, rotate_after)
+            except Exception as exc:
+                logger.exception("Write-ahead log failed; writes will fail")
+                with self._cond:
+                    self._error = exc
+                    self._pending = []
+                    self._cond.notify_all()
+                break
+            with self._cond:
+                self._durable_lsn = batch[-1][0]
+                self._cond.notify_all()
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass  # failed log: the error is already recorded
+
+    def _write(self, batch: List[Tuple[int, bytes]], rotate_after: int) -> None:
+        for lsn, entry in batch:
+            if self._file is None or (self._segment_base <= rotate_after < lsn):
+                if self._file is not None:
+                    self._sync()
+                self._open_segment(lsn)
+            self._file.write(entry)
+        self._sync()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+class Persistence:
+    """
+    Makes a set of MemoryRepository stores durable: every put/delete is logged
+    to a WriteAheadLog, and a background thread periodically writes a compacted
+    snapshot (the records' JSON bytes, as held) and drops the log segments it
+    covers. Recovery loads the newest
+    snapshot and replays only the log entries written after it.
+
+    Log entries carry full records, so replaying an entry that the snapshot
+    already reflects is harmless. `upgrades` (collection -> callable) bring a
+    recovered record's raw JSON up to the current model before it is validated,
+    e.g. for records logged under an older schema.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        collections: Dict[str, Tuple[MemoryRepository, Type[BaseModel]]],
+        snapshot_interval: float = 60.0,
+        snapshot_min_entries: int = 10_000,
+        commit_delay: float = 0.002,
+        upgrades: Optional[Dict[str, Callable[[dict], None]]] = None,
+    ):
+        self.directory = directory
+        self.collections = collections
+        self.upgrades = upgrades or {}
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_min_entries = snapshot_min_entries
+        self.commit_delay = commit_delay
+        self.wal: Optional[WriteAheadLog] = None
+        self._snapshot_lsn = 0
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._snapshotter: Optional[threading.Thread] = None
+        self._lock_file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _acquire_directory(self) -> None:
+        # Two processes appending to one log would corrupt it (e.g. the server
+        # and the bulk CLI), so the data directory is owned by one process
+        self._lock_file = open(os.path.join(self.directory, "LOCK"), "w")
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"{self.directory} is in use by another process")
+
+    # ------------------------------------------------------------------ files
+    def _list(self, prefix: str) -> List[Tuple[int, str]]:
+        found = []
+        for name in os.listdir(self.directory):
+            lsn = _file_lsn(name, prefix)
+            if lsn is not None:
+                found.append((lsn, os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def _fsync_dir(self) -> None:
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # --------------------------------------------------------------- recovery
+    def _restore(self, collection: str, value: dict) -> None:
+        store, model = self.collections[collection]
+        upgrade = self.upgrades.get(collection)
+        if upgrade is not None:
+            upgrade(value)
+        record = model.model_validate(value)
+        store[record.id] = record
+
+    def _apply(self, entry: dict) -> None:
+        store, _ = self.collections[entry["c"]]
+        if entry["op"] == "put":
+            self._restore(entry["c"], entry["v"])
+        else:
+            store.pop(UUID(entry["id"]), None)
+
+    def recover(self) -> int:
+        """
+        Rebuild the stores from disk and start logging. Must run before the stores
+        take any traffic. Returns the number of log entries replayed.
+        """
+        self._acquire_directory()
+        snapshots = self._list(SNAPSHOT_PREFIX)
+        if snapshots:
+            self._snapshot_lsn, path = snapshots[-1]
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                for line in f:
+                    item = json.loads(line)
+                    self._restore(item["c"], item["v"])
+            if header.get("lsn") != self._snapshot_lsn:
+                raise RuntimeError(f"Snapshot {path} has an inconsistent header")
+
+        last_lsn = self._snapshot_lsn
+        replayed = 0
+        segments = self._list(WAL_PREFIX)
+        for position, (_, path) in enumerate(segments):
+            with open(path, "rb") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated entry")
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn write can only be the tail of the newest segment;
+                        # it was never acknowledged, so cut it off
+                        if position == len(segments) - 1:
+                            logger.warning("Truncating torn WAL tail in %s", path)
+                            os.truncate(path, offset)
+                            break
+                        raise
+                    offset += len(line)
+                    if entry["lsn"] <= self._snapshot_lsn:
+                        continue
+                    self._apply(entry)
+                    last_lsn = entry["lsn"]
+                    replayed += 1
+
+        self.wal = WriteAheadLog(
+            self.directory, next_lsn=last_lsn + 1, commit_delay=self.commit_delay
+        )
+        # New writes never append to a segment that may end in a torn line
+        self.wal.rotate_after(last_lsn)
+        for name, (store, _) in self.collections.items():
+            store.subscribe(_WalListener(self.wal, name, store))
+        logger.info(
+            "Recovered from snapshot LSN %d, replayed %d WAL entries",
+            self._snapshot_lsn,
+            replayed,
+        )
+        return replayed
+
+    # -------------------------------------------------------------- snapshots
+    def snapshot(self) -> int:
+        """Write a compacted snapshot of every store and drop covered WAL segments."""
+        with self._snapshot_lock:
+            lsn = self.wal.last_lsn
+            # Everything logged up to `lsn` is already applied to the stores
+            self.wal.rotate_after(lsn)
+            copies = []
+            for name, (store, _) in self.collections.items():
+                with store.lock:
+                    copies.append((name, [store.get_json(rid) for rid in store]))
+
+            final = os.path.join(self.directory, _file_name(SNAPSHOT_PREFIX, lsn))
+            tmp = final + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(json.dumps({"lsn": lsn}).encode() + b"\n")
+                for name, records in copies:
+                    prefix = f'{{"c":"{name}","v":'.encode()
+                    for body in records:
+                        f.write(prefix + body + b"}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, final)
+            self._fsync_dir()
+
+            # Segments starting at or below `lsn` only hold entries the snapshot covers
+            for base, path in self._list(WAL_PREFIX):
+                if base <= lsn:
+                    os.remove(path)
+            for base, path in self._list(SNAPSHOT_PREFIX):
+                if base < lsn:
+                    os.remove(path)
+            self._snapshot_lsn = lsn
+            return lsn
+
+    def _snapshot_loop(self) -> None:
+        while not self._stop.wait(self.snapshot_interval):
+            if self.wal.last_lsn - self._snapshot_lsn >= self.snapshot_min_entries:
+                try:
+                    self.snapshot()
+                except OSError:
+                    logger.exception("Periodic snapshot failed")
+
+    def start(self) -> None:
+        self._snapshotter = threading.Thread(
+            target=self._snapshot_loop, name="snapshotter", daemon=True
+        )
+        self._snapshotter.start()
+
+    def close(self) -> None:
+        """Stop the snapshot thread, take a final snapshot and close the log."""
+        self._stop.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        if self.wal is not None:
+            if self.wal.last_lsn > self._snapshot_lsn:
+                self.snapshot()
+            self.wal.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class _WalListener:
+    """Logs the writes of one store; the writer then waits for the group fsync."""
+
+    blocks_writers = True
+
+    def __init__(self, wal: WriteAheadLog, collection: str, store: MemoryRepository):
+        self.wal = wal
+        self.collection = collection
+        self.store = store
+
+    def on_put(self, record_id: UUID, new: BaseModel):
+        # Hooks run under the store lock: these are the bytes just stored
+        body = self.store.get_json(record_id)
+        head = f'"op":"put","c":"{self.collection}","v":'.encode()
+        lsn = self.wal.append(
+            lambda n: b'{"lsn":%d,' % n + head + body + b"}\n"
+        )
+        return lambda: self.wal.wait(lsn)
+
+    def on_delete(self, record_id: UUID):
+        entry = {"op": "del", "c": self.collection, "id": str(record_id)}
+        tail = json.dumps(entry)[1:].encode()
+        lsn = self.wal.append(lambda n: b'{"lsn":%d,' % n + tail + b"\n")
+        return lambda: self.wal.wait(lsn)
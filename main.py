@@ -6,46 +6,210 @@ load_dotenv()
 import os
 
 port = int(os.environ.get("FASTAPIPORT", 8000))
+# Worker processes; more than one requires a store all processes can share
+workers = int(os.environ.get("WORKERS", 1))
 
 import os
 import socket
 from datetime import datetime
 
-from typing import Dict
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from uuid import UUID
+from fastapi.responses import PlainTextResponse
+from middleware.metrics import CONTENT_TYPE, Metrics, MetricsMiddleware
+from middleware.profiler import ProfilerMiddleware
 from models.person import PersonRead
 from models.address import AddressRead
 from models.conversion import ConversionRead
 from models.destination import DestinationRead
+from services.persons import PERSON_FUZZY_FIELDS, PERSON_INDEXES, PERSON_SEARCH_FIELDS
+from services.addresses import ADDRESS_FACETS, ADDRESS_INDEXES
+from services.conversions import (
+    CONVERSION_DIMENSIONS,
+    CONVERSION_FUZZY_FIELDS,
+    CONVERSION_INDEXES,
+    CONVERSION_MEASURES,
+    CONVERSION_SEARCH_FIELDS,
+)
+from services.destinations import (
+    DESTINATION_FACETS,
+    DESTINATION_FUZZY_FIELDS,
+    DESTINATION_INDEXES,
+    DESTINATION_SEARCH_FIELDS,
+    recover_embedded_conversions,
+)
+from resources.memory import MemoryRepository
+from resources.repository import Repository, RepositoryFactory
+from utils.columnar import ColumnarMirror
+from utils.facets import FacetCounts
+from utils.profiler import Profiling
+from utils.response_cache import ResponseCache
+from utils.search import SearchIndex
+from utils.views import build_views
+
+
+# Storage backend: "memory" (default) or "sqlite" (default with WORKERS > 1)
+store_backend = os.environ.get("STORE_BACKEND", "sqlite" if workers > 1 else "memory")
+if workers > 1 and store_backend == "memory":
+    raise RuntimeError(
+        "WORKERS > 1 needs a shared store; the memory backend is private to each "
+        "process. Use STORE_BACKEND=sqlite."
+    )
+data_dir = os.environ.get("DATA_DIR")
+sqlite_db = None
+if store_backend == "sqlite":
+    # Imported only for the backend in use, like the persistence layer below
+    from resources.sqlite import SqliteDatabase, SqliteRepository
+
+    sqlite_db = SqliteDatabase(
+        os.environ.get("SQLITE_PATH")
+        or os.path.join(data_dir or ".", "store.sqlite3"),
+        pool_size=int(os.environ.get("SQLITE_POOL_SIZE", 8)),
+    )
+    make_repository: RepositoryFactory = (
+        lambda name, model, indexes: SqliteRepository(sqlite_db, name, model, indexes)
+    )
+elif store_backend == "memory":
+    make_repository = MemoryRepository
+else:
+    raise RuntimeError(f"Unknown STORE_BACKEND {store_backend!r}")
+
+# Databases
+persons: Repository = make_repository("persons", PersonRead, PERSON_INDEXES)
+addresses: Repository = make_repository("addresses", AddressRead, ADDRESS_INDEXES)
+conversions: Repository = make_repository(
+    "conversions", ConversionRead, CONVERSION_INDEXES
+)
+destinations: Repository = make_repository(
+    "destinations", DestinationRead, DESTINATION_INDEXES
+)
+
+# Durability for the memory backend is opt-in: with DATA_DIR set, writes go
+# through a WAL + snapshots there (SQLite is durable on its own)
+persistence = None
+if data_dir and store_backend == "memory":
+    from framework.persistence import Persistence
+
+    persistence = Persistence(
+        data_dir,
+        {
+            "persons": (persons, PersonRead),
+            "addresses": (addresses, AddressRead),
+            "conversions": (conversions, ConversionRead),
+            "destinations": (destinations, DestinationRead),
+        },
+        snapshot_interval=float(os.environ.get("SNAPSHOT_INTERVAL", 60)),
+        # Destinations logged before conversions became references
+        upgrades={"destinations": recover_embedded_conversions},
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if persistence is not None:
+        persistence.recover()
+        persistence.start()
+    destinations_module.migrate_embedded_conversions()
+    build_views(
+        [
+            conversion_columns,
+            destination_facets,
+            address_facets,
+            *search_indexes.values(),
+        ]
+    )
+    yield
+    if persistence is not None:
+        persistence.close()
+    if sqlite_db is not None:
+        sqlite_db.close()
 
 
-# In-memory databases
-persons: Dict[UUID, PersonRead] = {}
-addresses: Dict[UUID, AddressRead] = {}
-conversions: Dict[UUID, ConversionRead] = {}
-destinations: Dict[UUID, DestinationRead] = {}
 # FastAPI app
 app = FastAPI(
     title="Person/Address API",
     description="Demo FastAPI app using Pydantic v2 models for Person and Address",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
+# Request metrics, exposed at /metrics
+metrics = Metrics()
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+for name, store in (
+    ("persons", persons),
+    ("addresses", addresses),
+    ("conversions", conversions),
+    ("destinations", destinations),
+):
+    metrics.add_collection(name, store)
+
+# On-demand sampling profiler behind /admin (needs ADMIN_TOKEN)
+profiling = Profiling()
+app.add_middleware(ProfilerMiddleware, profiling=profiling)
+
+# Serialized list responses, shared by the four collections
+response_cache = ResponseCache(
+    max_bytes=int(os.environ.get("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024))
+)
+
+# Columnar mirror of the conversions for /conversions/stats
+conversion_columns = ColumnarMirror(
+    conversions, CONVERSION_DIMENSIONS, CONVERSION_MEASURES
+)
+
+# Facet counters behind /destinations/facets and /addresses/facets
+destination_facets = FacetCounts(destinations, DESTINATION_FACETS)
+address_facets = FacetCounts(addresses, ADDRESS_FACETS)
+
+# Inverted indexes behind /search
+search_indexes = {
+    "persons": SearchIndex(persons, PERSON_SEARCH_FIELDS, PERSON_FUZZY_FIELDS),
+    "destinations": SearchIndex(
+        destinations, DESTINATION_SEARCH_FIELDS, DESTINATION_FUZZY_FIELDS
+    ),
+    "conversions": SearchIndex(
+        conversions, CONVERSION_SEARCH_FIELDS, CONVERSION_FUZZY_FIELDS
+    ),
+}
+
 # Routers
 from services import persons as persons_module
 from services import addresses as addresses_module
 from services import health as health_module
 from services import conversions as conversions_module
 from services import destinations as destinations_module
+from services import admin as admin_module
+from services import search as search_module
 
 persons_module.persons = persons
 addresses_module.addresses = addresses
+addresses_module.address_facets = address_facets
+conversions_module.conversions = conversions
+conversions_module.conversion_columns = conversion_columns
+destinations_module.destinations = destinations
+destinations_module.conversions = conversions
+destinations_module.destination_facets = destination_facets
+for module in (persons_module, addresses_module, conversions_module, destinations_module):
+    module.response_cache = response_cache
+admin_module.admin_token = os.environ.get("ADMIN_TOKEN")
+admin_module.profiling = profiling
+admin_module.response_cache = response_cache
+search_module.indexes = search_indexes
 app.include_router(persons_module.router)
 app.include_router(addresses_module.router)
 app.include_router(health_module.router)
 app.include_router(conversions_module.router)
 app.include_router(destinations_module.router)
+app.include_router(admin_module.router)
+app.include_router(search_module.router)
+
+# OpenAPI document precomputed at build time (python -m framework.openapi)
+openapi_cache = os.environ.get("OPENAPI_CACHE")
+if openapi_cache:
+    from framework.openapi import cached_openapi
+
+    app.openapi = cached_openapi(app, openapi_cache)
 
 
 # -----------------------------------------------------------------------------
@@ -56,6 +220,12 @@ def root():
     return {"message": "Welcome to the Person/Address API. See /docs for OpenAPI UI."}
 
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus text exposition of the request metrics and store sizes."""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
 # -----------------------------------------------------------------------------
 # Entrypoint for `python main.py`
 # -----------------------------------------------------------------------------
@@ -64,4 +234,9 @@ if __name__ == "__main__":
 
     print(port)
 
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
+    if workers > 1:
+        # Every worker imports main on its own and opens the same SQLite file,
+        # so all of them read and write one store. Reload cannot be combined.
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
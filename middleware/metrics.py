@@ -0,0 +1,199 @@
+"""
+Request metrics in the Prometheus text exposition format.
+
+MetricsMiddleware is a plain ASGI middleware (no BaseHTTPMiddleware), so it adds
+a few dict updates per request and works unchanged for streamed responses.
+Requests are labelled by route template (`/persons/{person_id}`), never by raw
+path, which keeps the number of series bounded; requests that match no route
+share the `<unmatched>` label.
+
+Every worker process keeps its own registry, so with WORKERS > 1 a scrape sees
+the process that happened to answer it.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+UNMATCHED = "<unmatched>"
+
+
+class Histogram:
+    """Per-bucket counts (not cumulative; render() sums them) plus sum and count."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def copy(self) -> "Histogram":
+        copy = Histogram(self.bounds)
+        copy.counts = list(self.counts)
+        copy.sum = self.sum
+        copy.count = self.count
+        return copy
+
+
+def _labels(**labels: str) -> str:
+    inner = ",".join(
+        '%s="%s"' % (k, str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for k, v in labels.items()
+    )
+    return "{" + inner + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Registry for the request metrics and the per-collection record counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (method, route, status) -> count / histograms
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str, int], Histogram] = {}
+        self.response_size: Dict[Tuple[str, str, int], Histogram] = {}
+        # method -> requests currently being handled
+        self.in_flight: Dict[str, int] = {}
+        # collection -> callable returning its current size
+        self.collections: Dict[str, Callable[[], int]] = {}
+
+    def add_collection(self, name: str, store) -> None:
+        """Report len(store) as the record count of `name` on every scrape."""
+        self.collections[name] = store.__len__
+
+    def started(self, method: str) -> None:
+        with self._lock:
+            self.in_flight[method] = self.in_flight.get(method, 0) + 1
+
+    def finished(
+        self, method: str, route: str, status: int, seconds: float, size: int
+    ) -> None:
+        key = (method, route, status)
+        with self._lock:
+            self.in_flight[method] -= 1
+            self.requests[key] = self.requests.get(key, 0) + 1
+            latency = self.latency.get(key)
+            if latency is None:
+                latency = self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.response_size[key] = Histogram(SIZE_BUCKETS)
+            latency.observe(seconds)
+            self.response_size[key].observe(size)
+
+    # --------------------------------------------------------------- exposition
+    @staticmethod
+    def _histogram(lines: List[str], name: str, series: Dict, label_names) -> None:
+        for key, hist in sorted(series.items()):
+            labels = dict(zip(label_names, key))
+            cumulative = 0
+            for bound, count in zip(hist.bounds, hist.counts):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{_labels(**labels, le=_number(bound))} {cumulative}"
+                )
+            lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {hist.count}')
+            lines.append(f"{name}_sum{_labels(**labels)} {_number(hist.sum)}")
+            lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+
+    def render(self) -> str:
+        label_names = ("method", "route", "status")
+        with self._lock:
+            # Copy under the lock, format outside it
+            requests = dict(self.requests)
+            in_flight = dict(self.in_flight)
+            latency = {k: h.copy() for k, h in self.latency.items()}
+            sizes = {k: h.copy() for k, h in self.response_size.items()}
+
+        lines = [
+            "# HELP http_requests_total Requests handled, by route template and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for key, count in sorted(requests.items()):
+            labels = dict(zip(label_names, key))
+            lines.append(f"http_requests_total{_labels(**labels)} {count}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Time to the last response byte.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        self._histogram(lines, "http_request_duration_seconds", latency, label_names)
+
+        lines += [
+            "# HELP http_response_size_bytes Response body size.",
+            "# TYPE http_response_size_bytes histogram",
+        ]
+        self._histogram(lines, "http_response_size_bytes", sizes, label_names)
+
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for method, count in sorted(in_flight.items()):
+            lines.append(f"http_requests_in_flight{_labels(method=method)} {count}")
+
+        lines += [
+            "# HELP store_records Records currently held per collection.",
+            "# TYPE store_records gauge",
+        ]
+        for name, size in self.collections.items():
+            lines.append(f"store_records{_labels(collection=name)} {size()}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.metrics.started(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            self.metrics.finished(
+                method,
+                getattr(route, "path_format", None) or UNMATCHED,
+                status,
+                time.perf_counter() - start,
+                size,
+            )
@@ -0,0 +1,35 @@
+"""
+Tells a route-filtered profiling session when matching requests are in flight.
+
+While no session with a route pattern is running, a request costs one attribute
+read here and nothing else.
+"""
+from __future__ import annotations
+
+from fnmatch import fnmatchcase
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utils.profiler import Profiling
+
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp, profiling: Profiling):
+        self.app = app
+        self.profiling = profiling
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        session = self.profiling.active
+        if (
+            session is None
+            or session.route is None
+            or scope["type"] != "http"
+            or not fnmatchcase(scope["path"], session.route)
+        ):
+            await self.app(scope, receive, send)
+            return
+        session.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.exit()
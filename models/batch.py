@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from typing import Generic, Optional, TypeVar
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+UpdateT = TypeVar("UpdateT", bound=BaseModel)
+
+
+class BatchPatch(BaseModel, Generic[UpdateT]):
+    """One item of a batch PATCH: the record to change and the fields to apply."""
+
+    id: UUID = Field(..., description="ID of the record to update.")
+    update: UpdateT = Field(..., description="Fields to change; same shape as a PATCH body.")
+
+
+class BatchResult(BaseModel):
+    """Per-item outcome of a batch request (None fields are omitted)."""
+
+    index: int = Field(..., description="Position of the item in the request.")
+    id: Optional[UUID] = Field(None, description="ID of the affected record.")
+    status: int = Field(..., description="HTTP-style status for this item.")
+    error: Optional[str] = Field(None, description="Why the item was not applied.")
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {"index": 0, "id": "99999999-9999-4999-8999-999999999999", "status": 201},
+                {"index": 1, "status": 404, "error": "Not found"},
+            ]
+        }
+    }
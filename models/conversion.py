@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import Optional
+from typing import List, Optional, Union
 from uuid import UUID, uuid4
 
 from pydantic import BaseModel, Field
@@ -204,3 +204,104 @@ class ConversionUpdate(BaseModel):
             ]
         }
     }
+
+
+class CreditStats(BaseModel):
+    """Credits of one side (foreign or home course) over a set of conversions."""
+
+    total: int = Field(..., description="Sum of the credits.")
+    average: Optional[float] = Field(
+        None, description="Average over the conversions with credits set."
+    )
+    counted: int = Field(..., description="Conversions with credits set.")
+
+
+class ConversionGroupStats(BaseModel):
+    """Aggregates of the conversions sharing one group key."""
+
+    key: Union[str, int, None] = Field(
+        None, description="Value of the group_by dimension (null for the total)."
+    )
+    conversions: int = Field(..., description="Number of conversions.")
+    foreign_credits: CreditStats
+    home_credits: CreditStats
+
+
+class ConversionStats(BaseModel):
+    """Response of GET /conversions/stats."""
+
+    group_by: Optional[str] = Field(None, description="Dimension grouped by.")
+    total: ConversionGroupStats = Field(
+        ..., description="Aggregates over every matching conversion."
+    )
+    groups: List[ConversionGroupStats] = Field(
+        default_factory=list, description="One entry per group, largest first."
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "group_by": "host_institution",
+                    "total": {
+                        "key": None,
+                        "conversions": 2,
+                        "foreign_credits": {"total": 7, "average": 3.5, "counted": 2},
+                        "home_credits": {"total": 8, "average": 4.0, "counted": 2},
+                    },
+                    "groups": [
+                        {
+                            "key": "University of Oxford",
+                            "conversions": 2,
+                            "foreign_credits": {"total": 7, "average": 3.5, "counted": 2},
+                            "home_credits": {"total": 8, "average": 4.0, "counted": 2},
+                        }
+                    ],
+                }
+            ]
+        }
+    }
+
+
+class TranscriptCourse(BaseModel):
+    """A course on a returning student's transcript, as taken abroad."""
+
+    institution_id: str = Field(
+        ...,
+        description="Institution that offered the course",
+        json_schema_extra={"example": "ABC124"},
+    )
+    course_id: int = Field(
+        ..., description="ID of the course there", json_schema_extra={"example": 123}
+    )
+
+
+class CourseEquivalent(BaseModel):
+    """A home course a transcript course converts to, and the conversion saying so."""
+
+    conversion_id: UUID
+    host_institution: str
+    home_course: Course
+
+
+class ResolvedCourse(TranscriptCourse):
+    """A transcript course with its home-course equivalents (empty if none)."""
+
+    equivalents: List[CourseEquivalent] = Field(default_factory=list)
+
+
+class TranscriptResolution(BaseModel):
+    """Response of POST /conversions:resolve."""
+
+    courses: List[ResolvedCourse] = Field(
+        ..., description="One entry per transcript course, in request order."
+    )
+    unresolved: int = Field(
+        ..., description="Transcript courses without any known equivalent."
+    )
+    home_courses: List[Course] = Field(
+        ..., description="Distinct home courses the transcript converts to."
+    )
+    total_credits: int = Field(
+        ..., description="Credits of the distinct home courses (unset counts as 0)."
+    )
@@ -4,15 +4,27 @@ from typing import Optional, List, Annotated
 from datetime import datetime
 
 from uuid import UUID, uuid4
-from pydantic import BaseModel, Field, StringConstraints
-from models.conversion import (
-    ConversionBase,
-)  # assuming this has foreign_course/home_course/etc.
+from pydantic import BaseModel, BeforeValidator, Field, StringConstraints
+from models.conversion import ConversionRead
 
 # Destination ID: 3 uppercase letters + 3 digits (e.g., ABC123)
 DestIdType = Annotated[str, StringConstraints(pattern=r"^[A-Z]{3}\d{3}$")]
 
 
+def _conversion_ids(value):
+    # Conversions as returned by ?expand=conversions are taken by their IDs
+    if isinstance(value, list):
+        return [
+            item["id"] if isinstance(item, dict) and "id" in item else item
+            for item in value
+        ]
+    return value
+
+
+# References into the conversions store
+ConversionIds = Annotated[List[UUID], BeforeValidator(_conversion_ids)]
+
+
 class DestinationBase(BaseModel):
     """Model for am university destination for an exchange program"""
 
@@ -43,45 +55,17 @@ class DestinationBase(BaseModel):
             "example": "Paul G. Allen School of Computer Science & Engineering"
         },
     )
-    conversions: Optional[List[ConversionBase]] = Field(
+    conversions: Optional[ConversionIds] = Field(
         None,
         description=(
-            "List of course conversions. Each item should map a foreign course to a home course "
-            "(e.g., fields like foreign_course, home_course, host_institution per ConversionBase). "
-            "Optional if no courses have been converted yet."
+            "IDs of the course conversions (see /conversions) offered at this "
+            "destination. GET with ?expand=conversions returns the conversions "
+            "themselves. Optional if no courses have been converted yet."
         ),
         json_schema_extra={
             "example": [
-                {
-                    "foreign_course": {
-                        "id": 123,
-                        "name": "Introduction to Computer Science",
-                        "institution_id": "ABC124",
-                        "credits": 3,
-                    },
-                    "home_course": {
-                        "id": 456,
-                        "name": "Data Structures",
-                        "institution_id": "ABC123",
-                        "credits": 4,
-                    },
-                    "host_institution": "University of Oxford",
-                },
-                {
-                    "foreign_course": {
-                        "id": 789,
-                        "name": "Algorithms",
-                        "institution_id": "ABC124",
-                        "credits": 3,
-                    },
-                    "home_course": {
-                        "id": 101,
-                        "name": "Operating Systems",
-                        "institution_id": "ABC123",
-                        "credits": 4,
-                    },
-                    "host_institution": "University of Cambridge",
-                },
+                "3f0c2a4e-8d1b-4c55-9a0e-1b2c3d4e5f60",
+                "7a1d9b2c-4e3f-4a5b-8c6d-7e8f9a0b1c2d",
             ]
         },
     )
@@ -100,36 +84,8 @@ class DestinationCreate(DestinationBase):
                     "country": "United States",
                     "department": "Paul G. Allen School of Computer Science & Engineering",
                     "conversions": [
-                        {
-                            "foreign_course": {
-                                "id": 123,
-                                "name": "Introduction to Computer Science",
-                                "institution_id": "ABC124",
-                                "credits": 3,
-                            },
-                            "home_course": {
-                                "id": 456,
-                                "name": "Data Structures",
-                                "institution_id": "ABC123",
-                                "credits": 4,
-                            },
-                            "host_institution": "University of Oxford",
-                        },
-                        {
-                            "foreign_course": {
-                                "id": 789,
-                                "name": "Algorithms",
-                                "institution_id": "ABC124",
-                                "credits": 3,
-                            },
-                            "home_course": {
-                                "id": 101,
-                                "name": "Operating Systems",
-                                "institution_id": "ABC123",
-                                "credits": 4,
-                            },
-                            "host_institution": "University of Cambridge",
-                        },
+                        "3f0c2a4e-8d1b-4c55-9a0e-1b2c3d4e5f60",
+                        "7a1d9b2c-4e3f-4a5b-8c6d-7e8f9a0b1c2d",
                     ],
                 }
             ]
@@ -167,31 +123,10 @@ class DestinationUpdate(BaseModel):
             "example": "Paul G. Allen School of Computer Science & Engineering"
         },
     )
-    conversions: Optional[List[ConversionBase]] = Field(
+    conversions: Optional[ConversionIds] = Field(
         None,
-        description=(
-            "List of course conversions. Each item should follow ConversionBase "
-            "(mapping a foreign course to a home course)."
-        ),
-        json_schema_extra={
-            "example": [
-                {
-                    "foreign_course": {
-                        "id": 222,
-                        "name": "Databases",
-                        "institution_id": "ABC124",
-                        "credits": 6,
-                    },
-                    "home_course": {
-                        "id": 333,
-                        "name": "Intro to Databases",
-                        "institution_id": "ABC123",
-                        "credits": 6,
-                    },
-                    "host_institution": "University of Edinburgh",
-                }
-            ]
-        },
+        description="Replace the list of conversion IDs with this one.",
+        json_schema_extra={"example": ["3f0c2a4e-8d1b-4c55-9a0e-1b2c3d4e5f60"]},
     )
 
 
@@ -228,26 +163,22 @@ class DestinationRead(DestinationBase):
                     "continent": "North America",
                     "country": "United States",
                     "department": "Paul G. Allen School of Computer Science & Engineering",
-                    "conversions": [
-                        {
-                            "foreign_course": {
-                                "id": 123,
-                                "name": "Introduction to Computer Science",
-                                "institution_id": "ABC124",
-                                "credits": 3,
-                            },
-                            "home_course": {
-                                "id": 456,
-                                "name": "Data Structures",
-                                "institution_id": "ABC123",
-                                "credits": 4,
-                            },
-                            "host_institution": "University of Oxford",
-                        }
-                    ],
+                    "conversions": ["3f0c2a4e-8d1b-4c55-9a0e-1b2c3d4e5f60"],
                     "created_at": "2025-01-15T10:20:30Z",
                     "updated_at": "2025-01-16T12:00:00Z",
                 }
             ]
         }
     }
+
+
+class DestinationExpanded(DestinationRead):
+    """A destination as returned with ?expand=conversions."""
+
+    conversions: Optional[List[ConversionRead]] = Field(
+        None,
+        description=(
+            "The conversions the destination refers to; references to deleted "
+            "conversions are left out."
+        ),
+    )
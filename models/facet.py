@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Facet(BaseModel):
+    """Number of records with one value of a facet field, broken down further."""
+
+    field: str = Field(..., description="Field counted at this level.")
+    value: Optional[str] = Field(..., description="Value of the field.")
+    count: int = Field(..., description="Records with this value (within the parent).")
+    facets: List[Facet] = Field(
+        default_factory=list, description="Counts per value of the next level down."
+    )
+
+
+class FacetTree(BaseModel):
+    """Facet counts of the records matching a query's filters."""
+
+    total: int = Field(..., description="Records matching the filters.")
+    facets: List[Facet] = Field(
+        default_factory=list, description="Counts per value of the outermost level."
+    )
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from typing import Literal
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+SearchCollection = Literal["persons", "destinations", "conversions"]
+
+
+class SearchHit(BaseModel):
+    """One /search result: the matching record and how well it matched."""
+
+    collection: SearchCollection = Field(..., description="Collection of the record.")
+    id: UUID = Field(..., description="ID of the record.")
+    score: float = Field(
+        ...,
+        description="Relevance (higher is better): per query term 1 for a whole "
+        "word, less for a prefix or a near miss, summed over the terms.",
+    )
+    record: dict = Field(..., description="The record, as its collection returns it.")
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import secrets
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from resources.repository import Page, Repository
+from utils.indexes import IndexedDict
+from utils.pagination import decode_cursor, paginate
+from utils.planner import Filters, plan_query
+
+
+class MemoryRepository(IndexedDict, Repository):
+    """
+    The in-process backend: an IndexedDict queried through the planner.
+    IndexedDict (and dict) provide the mapping half of Repository.
+
+    A record is held only as its JSON bytes, encoded once per write: one bytes
+    object per record instead of a model with its own __dict__, nested models,
+    UUID, datetime and str objects. Reads answer with the bytes as they are;
+    a model is decoded (and validated) only when a caller asks for one, e.g.
+    to apply a PATCH.
+    """
+
+    def __init__(self, name: str, model: Type[BaseModel], indexes: Dict[str, Callable]):
+        super().__init__(indexes)
+        self.name = name
+        self.model = model
+        self._decode = model.model_validate_json
+        # Versions restart from zero with the process (the WAL does not keep them)
+        self.epoch = secrets.token_hex(4)
+
+    def _pack(self, record: BaseModel) -> bytes:
+        return record.model_dump_json().encode()
+
+    def __getitem__(self, record_id: UUID) -> BaseModel:
+        return self._decode(dict.__getitem__(self, record_id))
+
+    def get(self, record_id: UUID, default=None):
+        row = dict.get(self, record_id)
+        return default if row is None else self._decode(row)
+
+    def values(self) -> Iterator[BaseModel]:
+        return map(self._decode, dict.values(self))
+
+    def items(self) -> Iterator[Tuple[UUID, BaseModel]]:
+        return ((rid, self._decode(row)) for rid, row in dict.items(self))
+
+    @property
+    def blocking(self) -> bool:
+        # Lookups never wait, but a subscribed WAL makes writers wait for fsync
+        return any(listener.blocks_writers for listener in self.listeners)
+
+    def changes(self, since: int, limit: int) -> Optional[List[UUID]]:
+        # Every write in this process reaches the listeners; a gap can only be
+        # a clear(), which leaves nothing to name
+        return None
+
+    def get_json(self, record_id: UUID) -> Optional[bytes]:
+        return dict.get(self, record_id)
+
+    def find(
+        self,
+        filters: Filters,
+        cursor: Optional[str],
+        limit: int,
+        explain: bool = False,
+        raw: bool = False,
+    ) -> Page:
+        plan = plan_query(self, filters, collection=self.name)
+        ids, next_cursor = paginate(self.order, plan.ids, cursor, limit)
+        lookup = self.get_json if raw else self.get
+        records = [lookup(rid) for rid in ids]
+        # A record deleted between paging and lookup is simply left out
+        return Page(
+            records=[r for r in records if r is not None],
+            next_cursor=next_cursor,
+            plan=plan.explain() if explain else {},
+        )
+
+    def scan(
+        self,
+        filters: Filters,
+        cursor: Optional[str],
+        chunk_size: int,
+        raw: bool = False,
+    ) -> Iterator[List[BaseModel]]:
+        after = decode_cursor(cursor)
+        plan = plan_query(self, filters, collection=self.name)
+        lookup = self.get_json if raw else self.get
+        return self._scan(plan.ids, after, chunk_size, lookup)
+
+    def _scan(
+        self, ids, after: int, chunk_size: int, lookup: Callable
+    ) -> Iterator[List[BaseModel]]:
+        order = self.order
+        if ids is None:
+            # Walk the insertion order one chunk at a time; only a chunk is ever held
+            while True:
+                page, resume = order.page(after, chunk_size)
+                records = [r for r in map(lookup, page) if r is not None]
+                if records:
+                    yield records
+                if resume is None:
+                    return
+                after = resume
+        keyed = sorted(
+            (s, rid)
+            for s, rid in ((order.seq(rid), rid) for rid in ids)
+            if s is not None and s > after
+        )
+        for start in range(0, len(keyed), chunk_size):
+            window = keyed[start : start + chunk_size]
+            records = [r for r in (lookup(rid) for _, rid in window) if r is not None]
+            if records:
+                yield records
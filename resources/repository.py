@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from utils.indexes import StoreListener
+from utils.planner import Filters
+
+
+@dataclass
+class Page:
+    """One page of a filtered query."""
+
+    # Models, or each record's JSON bytes when the query ran with raw=True
+    records: List[BaseModel]
+    next_cursor: Optional[str] = None
+    # Backend-specific description of how the query ran (see ?explain=true)
+    plan: Dict[str, object] = field(default_factory=dict)
+
+    def explain_header(self) -> str:
+        """Compact JSON form of `plan`, for the X-Query-Plan response header."""
+        return json.dumps(self.plan, separators=(",", ":"))
+
+
+@dataclass
+class Write:
+    """One version-checked write of Repository.compare_and_set_many."""
+
+    record_id: UUID
+    # Version the record must still have; None: it must not exist
+    expected_version: Optional[int]
+    # The record to store, or None to delete it
+    record: Optional[BaseModel]
+    # The record as read at expected_version, if the caller has it decoded
+    current: Optional[BaseModel] = None
+
+
+class Repository(ABC):
+    """
+    Storage interface the service modules program against: a mapping of
+    record ID -> Read model, plus filtered, cursor-paged queries over the
+    fields named in the collection's index spec (index name -> key function).
+
+    Writes are serialized by `lock` and reported to subscribed listeners.
+    Every write also bumps `generation`; a record's version is the generation
+    of its last write, which is what the ETags are built from.
+    """
+
+    name: str
+    model: Type[BaseModel]
+    # Identifies the lifetime of the version counters: a store whose counters
+    # restart (the memory backend after a restart) gets a new epoch, so ETags
+    # handed out before can never match again
+    epoch: str
+    # True if calls may wait for I/O (disk reads, fsync); async handlers then
+    # run them in the threadpool instead of on the event loop
+    blocking: bool
+
+    # ---------------------------------------------------------------- mapping
+    @abstractmethod
+    def get(self, record_id: UUID, default=None): ...
+
+    @abstractmethod
+    def __getitem__(self, record_id: UUID): ...
+
+    @abstractmethod
+    def __setitem__(self, record_id: UUID, record: BaseModel) -> None: ...
+
+    @abstractmethod
+    def __delitem__(self, record_id: UUID) -> None: ...
+
+    @abstractmethod
+    def __contains__(self, record_id: object) -> bool: ...
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    @abstractmethod
+    def values(self) -> Iterator[BaseModel]: ...
+
+    @abstractmethod
+    def get_json(self, record_id: UUID) -> Optional[bytes]:
+        """The record's canonical JSON (model_dump_json) without re-serializing it."""
+
+    @abstractmethod
+    def subscribe(self, listener: StoreListener) -> None: ...
+
+    @abstractmethod
+    def put_many(self, items: Iterable[Tuple[UUID, BaseModel]]) -> None:
+        """Write several records atomically (all or none become visible)."""
+
+    @abstractmethod
+    def delete_many(self, record_ids: Iterable[UUID]) -> None:
+        """Delete several records atomically; KeyError if any is missing."""
+
+    # --------------------------------------------------------------- versions
+    @property
+    @abstractmethod
+    def generation(self) -> int:
+        """Store-wide counter, increased by every write (put or delete)."""
+
+    @abstractmethod
+    def version(self, record_id: UUID) -> Optional[int]:
+        """Generation of the record's last write; None if it does not exist."""
+
+    @abstractmethod
+    def compare_and_set(
+        self,
+        record_id: UUID,
+        expected_version: int,
+        record: Optional[BaseModel],
+        current: Optional[BaseModel] = None,
+    ) -> Optional[int]:
+        """
+        Write `record` (or delete the record when it is None) only if the stored
+        version is still `expected_version`. Returns the generation of the write,
+        or None, changing nothing, if the record has moved on or is gone.
+        `current` is the record as read at `expected_version`, when the caller
+        has it: the backend need not read and decode it again.
+        """
+
+    @abstractmethod
+    def changes(self, since: int, limit: int) -> Optional[List[UUID]]:
+        """
+        IDs of the records written or deleted after generation `since` (by any
+        process), or None when there are more than `limit` or the store cannot
+        tell; derived views use it to catch up without a full rebuild.
+        """
+
+    @abstractmethod
+    def compare_and_set_many(
+        self, writes: Sequence[Write], atomic: bool = True
+    ) -> List[int]:
+        """
+        compare_and_set for several records (one write each) in one transaction.
+        Returns the positions of the writes whose record was not at its expected
+        version. With `atomic`, any such write means nothing was written;
+        otherwise every other write was applied.
+        """
+
+    # ---------------------------------------------------------------- queries
+    @abstractmethod
+    def find(
+        self,
+        filters: Filters,
+        cursor: Optional[str],
+        limit: int,
+        explain: bool = False,
+        raw: bool = False,
+    ) -> Page:
+        """
+        Up to `limit` records matching every equality filter, in insertion order,
+        starting after `cursor`. With `explain`, Page.plan describes how the query
+        ran; with `raw`, records are JSON bytes (see get_json). Raises ValueError
+        on a malformed cursor.
+        """
+
+    @abstractmethod
+    def scan(
+        self,
+        filters: Filters,
+        cursor: Optional[str],
+        chunk_size: int,
+        raw: bool = False,
+    ) -> Iterator[List[BaseModel]]:
+        """
+        Like find() without a limit, yielding lists of at most `chunk_size`
+        records so callers can stream the result in bounded memory. The cursor
+        is validated before this returns.
+        """
+
+
+# Builds a repository for one collection: (name, model, index spec) -> Repository
+RepositoryFactory = Callable[[str, Type[BaseModel], Dict[str, Callable]], Repository]
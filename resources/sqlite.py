@@ -0,0 +1,497 @@
+from __future__ import annotations
+
+import queue
+import secrets
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from resources.repository import Page, Repository, Write
+from utils.indexes import StoreListener, run_deferred
+from utils.pagination import decode_cursor, encode_cursor
+from utils.planner import Filters
+
+# Generations for which deletions are remembered for changes(); a reader that
+# fell further behind than this rebuilds instead
+TOMBSTONE_WINDOW = 100_000
+
+
+class SqliteDatabase:
+    """
+    One SQLite file shared by several repositories, opened in WAL mode behind a
+    small pool of connections (readers never block the single writer).
+    """
+
+    def __init__(self, path: str, pool_size: int = 8, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        with self.connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: transactions are opened explicitly with BEGIN
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+        )
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class SqliteRepository(Repository):
+    """
+    SQLite backend. Each record is one row holding its canonical JSON (nested
+    addresses/conversions included) plus an insertion sequence number used for
+    cursors. Every index in the spec gets a (value, id) side table with a real
+    B-tree index, filled from the same key functions the memory backend uses,
+    so multi-valued keys such as address cities work the same way.
+
+    Record versions live in the row and the collection's generation in the
+    shared `_generations` table, so every worker process sees the same values.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        db: SqliteDatabase,
+        name: str,
+        model: Type[BaseModel],
+        indexes: Dict[str, Callable],
+    ):
+        self.db = db
+        self.name = name
+        self.model = model
+        self.keys = dict(indexes)
+        self.listeners: List[StoreListener] = []
+        self.lock = threading.RLock()
+
+        table = _quote(name)
+        self._side = {field: _quote(f"{name}__{field}") for field in self.keys}
+        deleted = _quote(f"{name}__deleted")
+        with db.transaction() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "id TEXT NOT NULL UNIQUE, "
+                "data TEXT NOT NULL, "
+                "version INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if "version" not in columns:
+                # Files created before records were versioned
+                conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+                )
+            # What changes() reads: records by the generation that wrote them,
+            # and the IDs deleted within the last TOMBSTONE_WINDOW generations
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {_quote(f'{name}__by_version')} "
+                f"ON {table} (version)"
+            )
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {deleted} ("
+                "id TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {_quote(f'{name}__deleted__version')} "
+                f"ON {deleted} (version)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS _generations ("
+                "name TEXT PRIMARY KEY, epoch TEXT NOT NULL, generation INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO _generations VALUES (?, ?, 0)",
+                (name, secrets.token_hex(4)),
+            )
+            self.epoch = conn.execute(
+                "SELECT epoch FROM _generations WHERE name = ?", (name,)
+            ).fetchone()[0]
+            tables = {
+                row[0]
+                for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            }
+            added = [field for field in self.keys if f"{name}__{field}" not in tables]
+            for field, side in self._side.items():
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {side} ("
+                    "value, id TEXT NOT NULL, PRIMARY KEY (value, id)) WITHOUT ROWID"
+                )
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote(f'{name}__{field}__id')} "
+                    f"ON {side} (id)"
+                )
+            # An index added after the file was created starts out with the
+            # records already stored
+            if added:
+                for rid, data in conn.execute(f"SELECT id, data FROM {table}"):
+                    record = model.model_validate_json(data)
+                    for field in added:
+                        values = set(self.keys[field](record)) - {None}
+                        conn.executemany(
+                            f"INSERT INTO {self._side[field]} (value, id) VALUES (?, ?)",
+                            [(v, rid) for v in values],
+                        )
+
+        # Fixed statement texts, so sqlite3's per-connection cache keeps them prepared
+        self._sql_get = f"SELECT data FROM {table} WHERE id = ?"
+        self._sql_exists = f"SELECT 1 FROM {table} WHERE id = ?"
+        self._sql_count = f"SELECT COUNT(*) FROM {table}"
+        self._sql_version = f"SELECT version FROM {table} WHERE id = ?"
+        self._sql_generation = "SELECT generation FROM _generations WHERE name = ?"
+        self._sql_bump = (
+            "UPDATE _generations SET generation = generation + ? WHERE name = ? "
+            "RETURNING generation"
+        )
+        self._sql_upsert = (
+            f"INSERT INTO {table} (id, data, version) VALUES (?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET data = excluded.data, "
+            "version = excluded.version"
+        )
+        self._sql_delete = f"DELETE FROM {table} WHERE id = ?"
+        self._sql_side_delete = {
+            field: f"DELETE FROM {side} WHERE id = ?" for field, side in self._side.items()
+        }
+        self._sql_tombstone = f"INSERT OR REPLACE INTO {deleted} VALUES (?, ?)"
+        self._sql_prune = f"DELETE FROM {deleted} WHERE version <= ?"
+        self._sql_changes = (
+            f"SELECT id FROM {table} WHERE version > ? "
+            f"UNION SELECT id FROM {deleted} WHERE version > ? LIMIT ?"
+        )
+        self._sql_side_insert = {
+            field: f"INSERT OR IGNORE INTO {side} (value, id) VALUES (?, ?)"
+            for field, side in self._side.items()
+        }
+        self._sql_find: Dict[Tuple[str, ...], str] = {}
+
+    # ---------------------------------------------------------------- mapping
+    def _load(self, data: str) -> BaseModel:
+        return self.model.model_validate_json(data)
+
+    def get(self, record_id: UUID, default=None):
+        with self.db.connection() as conn:
+            row = conn.execute(self._sql_get, (str(record_id),)).fetchone()
+        return default if row is None else self._load(row[0])
+
+    def __getitem__(self, record_id: UUID):
+        record = self.get(record_id)
+        if record is None:
+            raise KeyError(record_id)
+        return record
+
+    def __contains__(self, record_id: object) -> bool:
+        with self.db.connection() as conn:
+            return conn.execute(self._sql_exists, (str(record_id),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self.db.connection() as conn:
+            return conn.execute(self._sql_count).fetchone()[0]
+
+    def values(self) -> Iterator[BaseModel]:
+        for chunk in self.scan((), None, 1000):
+            yield from chunk
+
+    def get_json(self, record_id: UUID) -> Optional[bytes]:
+        # The stored text is the record's model_dump_json() output
+        with self.db.connection() as conn:
+            row = conn.execute(self._sql_get, (str(record_id),)).fetchone()
+        return None if row is None else row[0].encode()
+
+    def subscribe(self, listener: StoreListener) -> None:
+        self.listeners.append(listener)
+
+    @property
+    def generation(self) -> int:
+        with self.db.connection() as conn:
+            return conn.execute(self._sql_generation, (self.name,)).fetchone()[0]
+
+    def version(self, record_id: UUID) -> Optional[int]:
+        with self.db.connection() as conn:
+            row = conn.execute(self._sql_version, (str(record_id),)).fetchone()
+        return None if row is None else row[0]
+
+    def _bump(self, conn: sqlite3.Connection, writes: int) -> int:
+        """Advance the generation by `writes`; returns the first new value."""
+        generation = conn.execute(self._sql_bump, (writes, self.name)).fetchone()[0]
+        return generation - writes + 1
+
+    def _write_side_tables(self, conn: sqlite3.Connection, rid: str, record) -> None:
+        for field, key in self.keys.items():
+            conn.execute(self._sql_side_delete[field], (rid,))
+            conn.executemany(
+                self._sql_side_insert[field],
+                # NULLs are never filtered on (and may not be part of a primary key)
+                [(v, rid) for v in set(key(record)) if v is not None],
+            )
+
+    def _delete_row(self, conn: sqlite3.Connection, rid: str, version: int) -> bool:
+        """Delete a record (at generation `version`); False if there is none."""
+        if conn.execute(self._sql_delete, (rid,)).rowcount == 0:
+            return False
+        for sql in self._sql_side_delete.values():
+            conn.execute(sql, (rid,))
+        conn.execute(self._sql_tombstone, (rid, version))
+        conn.execute(self._sql_prune, (version - TOMBSTONE_WINDOW,))
+        return True
+
+    def changes(self, since: int, limit: int) -> Optional[List[UUID]]:
+        with self.db.connection() as conn:
+            generation = conn.execute(self._sql_generation, (self.name,)).fetchone()[0]
+            if since < generation - TOMBSTONE_WINDOW:
+                return None  # its tombstones may be pruned
+            rows = conn.execute(self._sql_changes, (since, since, limit + 1)).fetchall()
+        return None if len(rows) > limit else [UUID(row[0]) for row in rows]
+
+    def __setitem__(self, record_id: UUID, record: BaseModel) -> None:
+        self.put_many([(record_id, record)])
+
+    def __delitem__(self, record_id: UUID) -> None:
+        self.delete_many([record_id])
+
+    def put_many(self, items: Iterable[Tuple[UUID, BaseModel]]) -> None:
+        items = list(items)
+        with self.lock:
+            with self.db.transaction() as conn:
+                version = self._bump(conn, len(items)) if items else 0
+                for offset, (record_id, record) in enumerate(items):
+                    rid = str(record_id)
+                    conn.execute(
+                        self._sql_upsert,
+                        (rid, record.model_dump_json(), version + offset),
+                    )
+                    self._write_side_tables(conn, rid, record)
+            deferred = [
+                l.on_put(record_id, record)
+                for record_id, record in items
+                for l in self.listeners
+            ]
+        run_deferred(deferred)
+
+    def delete_many(self, record_ids: Iterable[UUID]) -> None:
+        record_ids = list(record_ids)
+        with self.lock:
+            with self.db.transaction() as conn:
+                # One generation per record written, as in the memory backend
+                version = self._bump(conn, len(record_ids)) if record_ids else 0
+                for offset, record_id in enumerate(record_ids):
+                    if not self._delete_row(conn, str(record_id), version + offset):
+                        raise KeyError(record_id)
+            deferred = [
+                l.on_delete(record_id) for record_id in record_ids for l in self.listeners
+            ]
+        run_deferred(deferred)
+
+    def compare_and_set(
+        self,
+        record_id: UUID,
+        expected_version: int,
+        record: Optional[BaseModel],
+        current: Optional[BaseModel] = None,
+    ) -> Optional[int]:
+        rid = str(record_id)
+        with self.lock:
+            # BEGIN IMMEDIATE holds the write lock from the check to the write,
+            # which makes this atomic across worker processes too
+            with self.db.transaction() as conn:
+                row = conn.execute(self._sql_version, (rid,)).fetchone()
+                if row is None or row[0] != expected_version:
+                    return None
+                generation = self._bump(conn, 1)
+                if record is None:
+                    self._delete_row(conn, rid, generation)
+                else:
+                    conn.execute(
+                        self._sql_upsert, (rid, record.model_dump_json(), generation)
+                    )
+                    self._write_side_tables(conn, rid, record)
+            if record is None:
+                deferred = [l.on_delete(record_id) for l in self.listeners]
+            else:
+                deferred = [l.on_put(record_id, record) for l in self.listeners]
+        run_deferred(deferred)
+        return generation
+
+    def compare_and_set_many(
+        self, writes: Sequence[Write], atomic: bool = True
+    ) -> List[int]:
+        with self.lock:
+            # One BEGIN IMMEDIATE transaction: no other worker writes between
+            # the version checks and the writes
+            with self.db.transaction() as conn:
+                failed = []
+                for position, write in enumerate(writes):
+                    rid = str(write.record_id)
+                    row = conn.execute(self._sql_version, (rid,)).fetchone()
+                    if (None if row is None else row[0]) != write.expected_version:
+                        failed.append(position)
+                if failed and atomic:
+                    return failed
+                skip = set(failed)
+                applied = [w for p, w in enumerate(writes) if p not in skip]
+                version = self._bump(conn, len(applied)) if applied else 0
+                for offset, write in enumerate(applied):
+                    rid = str(write.record_id)
+                    if write.record is None:
+                        self._delete_row(conn, rid, version + offset)
+                    else:
+                        conn.execute(
+                            self._sql_upsert,
+                            (rid, write.record.model_dump_json(), version + offset),
+                        )
+                        self._write_side_tables(conn, rid, write.record)
+            deferred = [
+                l.on_delete(w.record_id)
+                if w.record is None
+                else l.on_put(w.record_id, w.record)
+                for w in applied
+                for l in self.listeners
+            ]
+        run_deferred(deferred)
+        return failed
+
+    def pop(self, record_id: UUID, *default):
+        with self.lock:
+            record = self.get(record_id)
+            if record is None:
+                if default:
+                    return default[0]
+                raise KeyError(record_id)
+            del self[record_id]
+            return record
+
+    # ---------------------------------------------------------------- queries
+    def _find_sql(self, fields: Tuple[str, ...]) -> str:
+        sql = self._sql_find.get(fields)
+        if sql is None:
+            sql = f"SELECT seq, data FROM {_quote(self.name)} WHERE seq > ?"
+            for field in fields:
+                sql += f" AND id IN (SELECT id FROM {self._side[field]} WHERE value = ?)"
+            sql += " ORDER BY seq LIMIT ?"
+            self._sql_find[fields] = sql
+        return sql
+
+    def _query(
+        self, filters: Filters, after: int, limit: int, explain: bool = False
+    ) -> Tuple[List[Tuple[int, str]], Dict[str, object]]:
+        if isinstance(filters, dict):
+            filters = filters.items()
+        active = [(f, v) for f, v in filters if v is not None]
+        sql = self._find_sql(tuple(f for f, _ in active))
+        params = [after, *(v for _, v in active), limit]
+        plan: Dict[str, object] = {}
+        with self.db.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+            if explain:
+                steps = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+                plan = {
+                    "collection": self.name,
+                    "backend": "sqlite",
+                    "steps": [detail for *_, detail in steps],
+                    "rows": len(rows),
+                }
+        return rows, plan
+
+    def _decode(self, raw: bool) -> Callable[[str], object]:
+        return str.encode if raw else self._load
+
+    def find(
+        self,
+        filters: Filters,
+        cursor: Optional[str],
+        limit: int,
+        explain: bool = False,
+        raw: bool = False,
+    ) -> Page:
+        rows, plan = self._query(filters, decode_cursor(cursor), limit + 1, explain)
+        next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+        decode = self._decode(raw)
+        return Page(
+            records=[decode(data) for _, data in rows[:limit]],
+            next_cursor=next_cursor,
+            plan=plan,
+        )
+
+    def scan(
+        self,
+        filters: Filters,
+        cursor: Optional[str],
+        chunk_size: int,
+        raw: bool = False,
+    ) -> Iterator[List[BaseModel]]:
+        after = decode_cursor(cursor)
+        filters = list(filters.items() if isinstance(filters, dict) else filters)
+        return self._scan(filters, after, chunk_size, self._decode(raw))
+
+    def _scan(
+        self, filters, after: int, chunk_size: int, decode: Callable[[str], object]
+    ) -> Iterator[List[BaseModel]]:
+        # Keyset pagination: every chunk is a fresh indexed range query on seq
+        while True:
+            rows, _ = self._query(filters, after, chunk_size)
+            if not rows:
+                return
+            yield [decode(data) for _, data in rows]
+            if len(rows) < chunk_size:
+                return
+            after = rows[-1][0]
@@ -1,65 +1,262 @@
-from fastapi import APIRouter, HTTPException, Query
+import json
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
 from typing import List, Optional
 from uuid import UUID
+from models.batch import BatchPatch, BatchResult
 from models.address import AddressCreate, AddressRead, AddressUpdate
+from models.facet import FacetTree
+from resources.repository import Repository
+from utils.batch import batch_create, batch_delete, batch_update
+from utils.concurrency import KeyedLocks, conditional_write, run_store
+from utils.etag import (
+    NOT_MODIFIED_RESPONSES,
+    PRECONDITION_FAILED_RESPONSES,
+    etag_matches,
+    list_etag,
+    not_modified,
+    record_etag,
+)
+from utils.facets import FacetCounts
+from utils.ndjson import (
+    NDJSON_RESPONSES,
+    STREAM_CHUNK_SIZE,
+    ndjson_response,
+    streams_all,
+    wants_ndjson,
+)
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.patch import apply_patch
+from utils.rawjson import json_array, json_response, response_headers
+from utils.response_cache import ResponseCache
 
-from typing import Dict
+# Secondary indexes kept on the addresses store (index name -> values to index under)
+ADDRESS_INDEXES = {
+    "street": lambda a: (a.street,),
+    "city": lambda a: (a.city,),
+    "state": lambda a: (a.state,),
+    "postal_code": lambda a: (a.postal_code,),
+    "country": lambda a: (a.country,),
+}
+
+# Facet levels counted for /addresses/facets, outermost first
+ADDRESS_FACETS = {
+    "country": lambda a: a.country,
+    "city": lambda a: a.city,
+}
 
 # In-memory database (to be imported from main)
-addresses: Dict[UUID, AddressRead] = None
+addresses: Repository = None
+# Serialized list responses (shared cache, set from main)
+response_cache: ResponseCache = None
+# Per-record write locks for PATCH/DELETE in this process
+record_locks = KeyedLocks()
+# Country -> city counts behind /addresses/facets (set from main)
+address_facets: FacetCounts = None
 
 router = APIRouter()
 
 
+def _build(address: AddressCreate) -> AddressRead:
+    return AddressRead(**address.model_dump())
+
+
+def _apply_update(existing: AddressRead, update: AddressUpdate) -> AddressRead:
+    return apply_patch(existing, update)
+
+
 @router.post("/addresses", response_model=AddressRead, status_code=201)
-def create_address(address: AddressCreate) -> AddressRead:
+async def create_address(address: AddressCreate) -> AddressRead:
     """Create a new address and add to the in-memory database."""
-    if address.id in addresses:
-        raise HTTPException(
-            status_code=400, detail="Address with this ID already exists"
-        )
-    addresses[address.id] = AddressRead(**address.model_dump())
-    return addresses[address.id]
+    async with record_locks.hold(address.id):
+        if await run_store(addresses, addresses.__contains__, address.id):
+            raise HTTPException(
+                status_code=400, detail="Address with this ID already exists"
+            )
+        created = _build(address)
+        await run_store(addresses, addresses.__setitem__, created.id, created)
+    return created
 
 
-@router.get("/addresses", response_model=List[AddressRead])
-def list_addresses(
+@router.get(
+    "/addresses",
+    response_model=List[AddressRead],
+    responses={**NDJSON_RESPONSES, **NOT_MODIFIED_RESPONSES},
+)
+async def list_addresses(
+    request: Request,
+    response: Response,
     street: Optional[str] = Query(None, description="Filter by street"),
     city: Optional[str] = Query(None, description="Filter by city"),
     state: Optional[str] = Query(None, description="Filter by state/region"),
     postal_code: Optional[str] = Query(None, description="Filter by postal code"),
     country: Optional[str] = Query(None, description="Filter by country"),
+    limit: Optional[int] = Query(
+        None,
+        ge=1,
+        le=MAX_PAGE_SIZE,
+        description=f"Maximum records per page (default {DEFAULT_PAGE_SIZE}; "
+        "NDJSON streams every record unless set)",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from a previous page's X-Next-Cursor header"
+    ),
+    explain: bool = Query(False, description="Return the query plan in X-Query-Plan"),
 ) -> List[AddressRead]:
-    results = list(addresses.values())
+    filters = {
+        "street": street,
+        "city": city,
+        "state": state,
+        "postal_code": postal_code,
+        "country": country,
+    }
+    generation = await run_store(addresses, lambda: addresses.generation)
+    etag = list_etag(addresses, request, generation)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cacheable = not explain and not wants_ndjson(request)
+    if cacheable:
+        cached = response_cache.get("addresses", request, generation)
+        if cached is not None:
+            return cached
+    try:
+        if streams_all(request, limit, explain):
+            chunks = await run_store(
+                addresses, addresses.scan, filters, cursor, STREAM_CHUNK_SIZE, raw=True
+            )
+            return ndjson_response(chunks, headers={"ETag": etag})
+        page = await run_store(
+            addresses,
+            addresses.find,
+            filters,
+            cursor,
+            limit or DEFAULT_PAGE_SIZE,
+            explain=explain,
+            raw=True,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if explain:
+        response.headers["X-Query-Plan"] = page.explain_header()
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    response.headers["ETag"] = etag
+    if wants_ndjson(request):
+        return ndjson_response([page.records], response_headers(response))
+    body = json_array(page.records)
+    if cacheable:
+        return response_cache.put("addresses", request, generation, body, response)
+    return json_response(body, response_headers(response))
 
-    if street is not None:
-        results = [a for a in results if a.street == street]
-    if city is not None:
-        results = [a for a in results if a.city == city]
-    if state is not None:
-        results = [a for a in results if a.state == state]
-    if postal_code is not None:
-        results = [a for a in results if a.postal_code == postal_code]
-    if country is not None:
-        results = [a for a in results if a.country == country]
 
-    return results
+@router.get("/addresses/facets", response_model=FacetTree)
+async def address_facet_counts(
+    street: Optional[str] = Query(None, description="Filter by street"),
+    city: Optional[str] = Query(None, description="Filter by city"),
+    state: Optional[str] = Query(None, description="Filter by state/region"),
+    postal_code: Optional[str] = Query(None, description="Filter by postal code"),
+    country: Optional[str] = Query(None, description="Filter by country"),
+) -> FacetTree:
+    """
+    Address counts per country and, within each, per city, for the addresses
+    matching the same filters as GET /addresses.
+    """
+    filters = {
+        "street": street,
+        "city": city,
+        "state": state,
+        "postal_code": postal_code,
+        "country": country,
+    }
+    tree = await run_store(addresses, address_facets.count, filters)
+    return json_response(json.dumps(tree, separators=(",", ":")).encode())
 
 
-@router.get("/addresses/{address_id}", response_model=AddressRead)
-def get_address(address_id: UUID) -> AddressRead:
+@router.get(
+    "/addresses/{address_id}",
+    response_model=AddressRead,
+    responses=NOT_MODIFIED_RESPONSES,
+)
+async def get_address(request: Request, address_id: UUID) -> AddressRead:
     """Retrieve an address by its UUID."""
-    if address_id not in addresses:
+    version = await run_store(addresses, addresses.version, address_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Address not found")
+    etag = record_etag(addresses, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    body = await run_store(addresses, addresses.get_json, address_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Address not found")
-    return addresses[address_id]
+    return json_response(body, {"ETag": etag})
 
 
-@router.patch("/addresses/{address_id}", response_model=AddressRead)
-def update_address(address_id: UUID, update: AddressUpdate) -> AddressRead:
-    """Update an existing address by its UUID."""
-    if address_id not in addresses:
-        raise HTTPException(status_code=404, detail="Address not found")
-    stored = addresses[address_id].model_dump()
-    stored.update(update.model_dump(exclude_unset=True))
-    addresses[address_id] = AddressRead(**stored)
-    return addresses[address_id]
+@router.patch(
+    "/addresses/{address_id}",
+    response_model=AddressRead,
+    responses=PRECONDITION_FAILED_RESPONSES,
+)
+async def update_address(
+    request: Request, address_id: UUID, update: AddressUpdate
+) -> AddressRead:
+    """Update an existing address by its UUID (conditional with If-Match)."""
+    updated, version = await conditional_write(
+        addresses,
+        record_locks,
+        address_id,
+        request,
+        lambda existing: _apply_update(existing, update),
+        "Address not found",
+    )
+    return json_response(
+        updated.model_dump_json().encode(), {"ETag": record_etag(addresses, version)}
+    )
+
+
+# -----------------------------------------------------------------------------
+# Batch endpoints
+# -----------------------------------------------------------------------------
+ATOMIC_QUERY = Query(
+    True, description="Apply all items or none (409 if any item fails)"
+)
+
+
+@router.post(
+    "/addresses:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def create_addresses_batch(
+    response: Response,
+    items: List[AddressCreate],
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Create many addresses in one request; returns one result per item."""
+    return batch_create(addresses, items, _build, response, atomic, check_existing=True)
+
+
+@router.patch(
+    "/addresses:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def update_addresses_batch(
+    response: Response,
+    items: List[BatchPatch[AddressUpdate]],
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Apply many partial updates in one request; returns one result per item."""
+    return batch_update(addresses, items, _apply_update, response, atomic)
+
+
+@router.delete(
+    "/addresses:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def delete_addresses_batch(
+    response: Response,
+    ids: List[UUID] = Body(..., description="IDs of the addresses to delete"),
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Delete many addresses in one request; returns one result per item."""
+    return batch_delete(addresses, ids, response, atomic)
@@ -0,0 +1,105 @@
+import secrets
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from utils.profiler import DEFAULT_INTERVAL, MAX_DURATION, Profiling
+from utils.response_cache import ResponseCache
+
+# Set from main: the ADMIN_TOKEN value (admin routes are disabled without one),
+# the profiler sessions and the list response cache
+admin_token: Optional[str] = None
+profiling: Profiling = None
+response_cache: ResponseCache = None
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not admin_token:
+        # Don't advertise the admin surface when it is switched off
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(
+    prefix="/admin", dependencies=[Depends(require_admin)], include_in_schema=False
+)
+
+
+@router.post("/profiler/start")
+def start_profiler(
+    seconds: float = Query(
+        ..., gt=0, le=MAX_DURATION, description="How long to sample for"
+    ),
+    route: Optional[str] = Query(
+        None,
+        description="Only sample while requests whose path matches this glob "
+        "(e.g. /persons*) are in flight",
+    ),
+    interval_ms: float = Query(
+        DEFAULT_INTERVAL * 1000, ge=1, le=1000, description="Sampling interval"
+    ),
+):
+    """Start a sampling profiler session in this worker process."""
+    try:
+        session = profiling.start(seconds, interval_ms / 1000, route)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return session.status()
+
+
+@router.post("/profiler/stop")
+def stop_profiler():
+    """Stop the running session early."""
+    session = profiling.stop()
+    if session is None:
+        raise HTTPException(status_code=409, detail="No profiling session is running")
+    return session.status()
+
+
+@router.get("/profiler")
+def get_profiler_status():
+    """The running session, if any, and the last finished one."""
+    return {
+        "active": profiling.active.status() if profiling.active else None,
+        "last": profiling.last.status() if profiling.last else None,
+    }
+
+
+@router.get("/profiler/profile")
+def download_profile(
+    format: Literal["collapsed", "speedscope"] = Query(
+        "speedscope", description="collapsed stacks or a speedscope JSON file"
+    ),
+):
+    """Download the last finished session."""
+    session = profiling.last
+    if session is None:
+        raise HTTPException(status_code=404, detail="No finished profiling session")
+    stamp = int(session.started_at)
+    if format == "collapsed":
+        return PlainTextResponse(
+            session.collapsed(),
+            headers={
+                "Content-Disposition": f'attachment; filename="profile-{stamp}.collapsed.txt"'
+            },
+        )
+    return JSONResponse(
+        session.speedscope(),
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{stamp}.speedscope.json"'
+        },
+    )
+
+
+@router.get("/cache")
+def get_cache_stats():
+    """Hit rate, evictions, invalidations and size of the list response cache."""
+    return response_cache.stats()
+
+
+@router.delete("/cache", status_code=204)
+def clear_cache() -> None:
+    """Drop every cached response (statistics are kept)."""
+    response_cache.clear()
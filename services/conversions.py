@@ -1,34 +1,125 @@
+import json
 from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException, Query
-from typing import Dict, List, Optional
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from models.conversion import ConversionCreate, ConversionRead, ConversionUpdate
+from models.batch import BatchPatch, BatchResult
+from models.conversion import (
+    ConversionCreate,
+    ConversionRead,
+    ConversionStats,
+    ConversionUpdate,
+    TranscriptCourse,
+    TranscriptResolution,
+)
+from resources.memory import MemoryRepository
+from resources.repository import Repository
+from utils.batch import batch_create, batch_delete, batch_update
+from utils.columnar import ColumnarMirror, Group, combine
+from utils.concurrency import KeyedLocks, conditional_write, run_store
+from utils.etag import (
+    NOT_MODIFIED_RESPONSES,
+    PRECONDITION_FAILED_RESPONSES,
+    etag_matches,
+    list_etag,
+    not_modified,
+    record_etag,
+)
+from utils.ndjson import (
+    NDJSON_RESPONSES,
+    STREAM_CHUNK_SIZE,
+    ndjson_response,
+    streams_all,
+    wants_ndjson,
+)
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.patch import apply_patch
+from utils.rawjson import json_array, json_response, response_headers
+from utils.response_cache import ResponseCache
 
 router = APIRouter()
 
+
+def foreign_course_key(institution_id: str, course_id: int) -> str:
+    """Index value of a foreign course: its institution and course ID together."""
+    return f"{institution_id}:{course_id}"
+
+
+# Secondary indexes kept on the conversions store (index name -> values to index under).
+# foreign_course and home_course_id are the two ends of the course-equivalence graph.
+CONVERSION_INDEXES = {
+    "home_course_name": lambda c: (c.home_course.name,),
+    "home_course_id": lambda c: (c.home_course.id,),
+    "host_institution": lambda c: (c.host_institution,),
+    "foreign_course": lambda c: (
+        foreign_course_key(c.foreign_course.institution_id, c.foreign_course.id),
+    ),
+}
+
+# Text searched by /search (field -> text), and the fields also matched fuzzily
+CONVERSION_SEARCH_FIELDS = {
+    "foreign_course_name": lambda c: c.foreign_course.name,
+    "home_course_name": lambda c: c.home_course.name,
+}
+CONVERSION_FUZZY_FIELDS = ("foreign_course_name", "home_course_name")
+
+# Columns mirrored for /conversions/stats: dimensions to filter and group on,
+# and measures to aggregate
+CONVERSION_DIMENSIONS = {
+    "host_institution": lambda c: c.host_institution,
+    "foreign_institution_id": lambda c: c.foreign_course.institution_id,
+    "home_course_id": lambda c: c.home_course.id,
+}
+CONVERSION_MEASURES = {
+    "foreign_credits": lambda c: c.foreign_course.credits,
+    "home_credits": lambda c: c.home_course.credits,
+}
+
 # In-memory "DB"
-conversions: Dict[UUID, ConversionRead] = {}
+conversions: Repository = MemoryRepository(
+    "conversions", ConversionRead, CONVERSION_INDEXES
+)
+# Serialized list responses (shared cache, set from main)
+response_cache: ResponseCache = ResponseCache()
+# Per-record write locks for PATCH/DELETE in this process
+record_locks = KeyedLocks()
+# Columnar mirror of the store behind /conversions/stats (set from main)
+conversion_columns: ColumnarMirror = None
+
+
+def _build(conversion: ConversionCreate) -> ConversionRead:
+    return ConversionRead(**conversion.model_dump())
+
+
+def _apply_update(existing: ConversionRead, update: ConversionUpdate) -> ConversionRead:
+    return apply_patch(existing, update, updated_at=datetime.now(timezone.utc))
 
 
 @router.post("/conversions", response_model=ConversionRead, status_code=201)
-def create_conversion(conversion: ConversionCreate) -> ConversionRead:
+async def create_conversion(conversion: ConversionCreate) -> ConversionRead:
     """Create a new conversion."""
     # Build the server-side model (generates id/created_at/updated_at)
-    created = ConversionRead(**conversion.model_dump())
+    created = _build(conversion)
 
     # Prevent accidental collisions (extremely unlikely with UUID4, but cheap to check)
-    if created.id in conversions:
+    if await run_store(conversions, conversions.__contains__, created.id):
         raise HTTPException(
             status_code=400, detail="Generated ID collision; retry the request"
         )
 
-    conversions[created.id] = created
+    await run_store(conversions, conversions.__setitem__, created.id, created)
     return created
 
 
-@router.get("/conversions", response_model=List[ConversionRead])
-def list_conversions(
+@router.get(
+    "/conversions",
+    response_model=List[ConversionRead],
+    responses={**NDJSON_RESPONSES, **NOT_MODIFIED_RESPONSES},
+)
+async def list_conversions(
+    request: Request,
+    response: Response,
     home_course_name: Optional[str] = Query(
         None, description="Filter by home course name"
     ),
@@ -36,53 +127,275 @@ def list_conversions(
     host_institution: Optional[str] = Query(
         None, description="Filter by host institution"
     ),
+    limit: Optional[int] = Query(
+        None,
+        ge=1,
+        le=MAX_PAGE_SIZE,
+        description=f"Maximum records per page (default {DEFAULT_PAGE_SIZE}; "
+        "NDJSON streams every record unless set)",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from a previous page's X-Next-Cursor header"
+    ),
+    explain: bool = Query(False, description="Return the query plan in X-Query-Plan"),
 ) -> List[ConversionRead]:
     """List all conversions."""
-    results = list(conversions.values())
+    filters = {
+        "home_course_name": home_course_name,
+        "home_course_id": home_course_id,
+        "host_institution": host_institution,
+    }
+    generation = await run_store(conversions, lambda: conversions.generation)
+    etag = list_etag(conversions, request, generation)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cacheable = not explain and not wants_ndjson(request)
+    if cacheable:
+        cached = response_cache.get("conversions", request, generation)
+        if cached is not None:
+            return cached
+    try:
+        if streams_all(request, limit, explain):
+            chunks = await run_store(
+                conversions,
+                conversions.scan,
+                filters,
+                cursor,
+                STREAM_CHUNK_SIZE,
+                raw=True,
+            )
+            return ndjson_response(chunks, headers={"ETag": etag})
+        page = await run_store(
+            conversions,
+            conversions.find,
+            filters,
+            cursor,
+            limit or DEFAULT_PAGE_SIZE,
+            explain=explain,
+            raw=True,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if explain:
+        response.headers["X-Query-Plan"] = page.explain_header()
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    response.headers["ETag"] = etag
+    if wants_ndjson(request):
+        return ndjson_response([page.records], response_headers(response))
+    body = json_array(page.records)
+    if cacheable:
+        return response_cache.put("conversions", request, generation, body, response)
+    return json_response(body, response_headers(response))
 
-    if home_course_name is not None:
-        results = [c for c in results if c.home_course.name == home_course_name]
 
-    if home_course_id is not None:
-        results = [c for c in results if c.home_course.id == home_course_id]
+def _credit_stats(group: Group, measure: str) -> dict:
+    counted = group.counts.get(measure, 0)
+    total = group.sums.get(measure, 0.0)
+    return {
+        "total": round(total),
+        "average": total / counted if counted else None,
+        "counted": counted,
+    }
 
-    if host_institution is not None:
-        results = [c for c in results if c.host_institution == host_institution]
 
-    return results
+def _group_stats(group: Group) -> dict:
+    return {
+        "key": group.key,
+        "conversions": group.rows,
+        "foreign_credits": _credit_stats(group, "foreign_credits"),
+        "home_credits": _credit_stats(group, "home_credits"),
+    }
+
+
+@router.get("/conversions/stats", response_model=ConversionStats)
+async def conversion_stats(
+    group_by: Optional[
+        Literal["host_institution", "foreign_institution_id", "home_course_id"]
+    ] = Query(None, description="Group by this dimension (omit for totals only)"),
+    host_institution: Optional[str] = Query(
+        None, description="Filter by host institution"
+    ),
+    foreign_institution_id: Optional[str] = Query(
+        None, description="Filter by the foreign course's institution ID"
+    ),
+    home_course_id: Optional[int] = Query(None, description="Filter by home course ID"),
+) -> ConversionStats:
+    """Conversion counts and total/average credits, optionally grouped."""
+    filters = {
+        name: value
+        for name, value in (
+            ("host_institution", host_institution),
+            ("foreign_institution_id", foreign_institution_id),
+            ("home_course_id", home_course_id),
+        )
+        if value is not None
+    }
+    groups = await run_store(
+        conversions, conversion_columns.aggregate, filters, group_by
+    )
+    # Plain dicts, encoded once: a model per group would be validated and
+    # serialized again, which dominates once there are thousands of groups
+    stats = {
+        "group_by": group_by,
+        "total": _group_stats(combine(groups)),
+        "groups": [_group_stats(g) for g in groups] if group_by is not None else [],
+    }
+    return json_response(json.dumps(stats, separators=(",", ":")).encode())
 
 
-@router.get("/conversions/{conversion_id}", response_model=ConversionRead)
-def get_conversion(conversion_id: UUID) -> ConversionRead:
+@router.get(
+    "/conversions/{conversion_id}",
+    response_model=ConversionRead,
+    responses=NOT_MODIFIED_RESPONSES,
+)
+async def get_conversion(request: Request, conversion_id: UUID) -> ConversionRead:
     """Retrieve a conversion by its UUID."""
-    conv = conversions.get(conversion_id)
-    if conv is None:
+    version = await run_store(conversions, conversions.version, conversion_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Conversion not found")
+    etag = record_etag(conversions, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    body = await run_store(conversions, conversions.get_json, conversion_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Conversion not found")
-    return conv
+    return json_response(body, {"ETag": etag})
 
 
-@router.patch("/conversions/{conversion_id}", response_model=ConversionRead)
-def update_conversion(conversion_id: UUID, update: ConversionUpdate) -> ConversionRead:
-    """Update an existing conversion."""
-    existing = conversions.get(conversion_id)
-    if existing is None:
-        raise HTTPException(status_code=404, detail="Conversion not found")
+@router.patch(
+    "/conversions/{conversion_id}",
+    response_model=ConversionRead,
+    responses=PRECONDITION_FAILED_RESPONSES,
+)
+async def update_conversion(
+    request: Request, conversion_id: UUID, update: ConversionUpdate
+) -> ConversionRead:
+    """Update an existing conversion by its UUID (conditional with If-Match)."""
+    updated, version = await conditional_write(
+        conversions,
+        record_locks,
+        conversion_id,
+        request,
+        lambda existing: _apply_update(existing, update),
+        "Conversion not found",
+    )
+    return json_response(
+        updated.model_dump_json().encode(), {"ETag": record_etag(conversions, version)}
+    )
+
 
-    # Start from stored dict, then apply only provided fields
-    stored = existing.model_dump()
-    stored.update(update.model_dump(exclude_unset=True))
+@router.delete(
+    "/conversions/{conversion_id}",
+    status_code=204,
+    responses=PRECONDITION_FAILED_RESPONSES,
+)
+async def delete_conversion(request: Request, conversion_id: UUID) -> None:
+    """Delete a conversion by its ID (conditional with If-Match)."""
+    await conditional_write(
+        conversions,
+        record_locks,
+        conversion_id,
+        request,
+        lambda existing: None,
+        "Conversion not found",
+    )
 
-    # Refresh updated_at
-    stored["updated_at"] = datetime.now(timezone.utc)
 
-    updated = ConversionRead(**stored)
-    conversions[conversion_id] = updated
-    return updated
+def _resolve(courses: List[TranscriptCourse]) -> TranscriptResolution:
+    resolved, home_courses = [], {}
+    for course in courses:
+        key = foreign_course_key(course.institution_id, course.course_id)
+        # Every equivalent, however many: scan is not capped at a page
+        matches = [
+            match
+            for records in conversions.scan(
+                {"foreign_course": key}, None, STREAM_CHUNK_SIZE
+            )
+            for match in records
+        ]
+        for match in matches:
+            home = match.home_course
+            home_courses.setdefault((home.institution_id, home.id), home)
+        resolved.append(
+            {
+                **course.model_dump(),
+                "equivalents": [
+                    {
+                        "conversion_id": match.id,
+                        "host_institution": match.host_institution,
+                        "home_course": match.home_course,
+                    }
+                    for match in matches
+                ],
+            }
+        )
+    return TranscriptResolution(
+        courses=resolved,
+        unresolved=sum(1 for r in resolved if not r["equivalents"]),
+        home_courses=list(home_courses.values()),
+        total_credits=sum(c.credits or 0 for c in home_courses.values()),
+    )
 
 
-@router.delete("/conversions/{conversion_id}", status_code=204)
-def delete_conversion(conversion_id: str) -> None:
-    """Delete a conversion by its ID."""
-    if conversion_id not in conversions:
-        raise HTTPException(status_code=404, detail="Conversion not found")
-    del conversions[conversion_id]
+@router.post("/conversions:resolve", response_model=TranscriptResolution)
+async def resolve_transcript(
+    courses: List[TranscriptCourse] = Body(
+        ..., description="Courses taken abroad, as (institution_id, course_id)"
+    ),
+) -> TranscriptResolution:
+    """
+    Resolve a whole transcript to home-course equivalents in one request: one
+    index lookup per course, plus the total credits of the home courses.
+    """
+    return await run_store(conversions, _resolve, courses)
+
+
+# -----------------------------------------------------------------------------
+# Batch endpoints
+# -----------------------------------------------------------------------------
+ATOMIC_QUERY = Query(
+    True, description="Apply all items or none (409 if any item fails)"
+)
+
+
+@router.post(
+    "/conversions:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def create_conversions_batch(
+    response: Response,
+    items: List[ConversionCreate],
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Create many conversions in one request; returns one result per item."""
+    return batch_create(conversions, items, _build, response, atomic)
+
+
+@router.patch(
+    "/conversions:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def update_conversions_batch(
+    response: Response,
+    items: List[BatchPatch[ConversionUpdate]],
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Apply many partial updates in one request; returns one result per item."""
+    return batch_update(conversions, items, _apply_update, response, atomic)
+
+
+@router.delete(
+    "/conversions:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def delete_conversions_batch(
+    response: Response,
+    ids: List[UUID] = Body(..., description="IDs of the conversions to delete"),
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Delete many conversions in one request; returns one result per item."""
+    return batch_delete(conversions, ids, response, atomic)
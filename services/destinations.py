@@ -1,97 +1,457 @@
+import json
+import logging
 from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException, Query
-from typing import Dict, List, Optional
-from uuid import UUID
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from typing import Dict, List, Literal, Optional, Union
+from uuid import UUID, uuid4, uuid5
 
-from models.destination import DestinationRead, DestinationCreate, DestinationUpdate
+from models.batch import BatchPatch, BatchResult
+from models.conversion import ConversionRead
+from models.destination import (
+    DestinationCreate,
+    DestinationExpanded,
+    DestinationRead,
+    DestinationUpdate,
+)
+from models.facet import FacetTree
+from resources.memory import MemoryRepository
+from resources.repository import Repository, Write
+from utils.batch import batch_create, batch_delete, batch_update
+from utils.concurrency import (
+    MAX_WRITE_ATTEMPTS,
+    KeyedLocks,
+    conditional_write,
+    run_store,
+)
+from utils.etag import (
+    NOT_MODIFIED_RESPONSES,
+    PRECONDITION_FAILED_RESPONSES,
+    etag_matches,
+    joined_generation,
+    list_etag,
+    not_modified,
+    record_etag,
+)
+from utils.facets import FacetCounts
+from utils.ndjson import (
+    NDJSON_RESPONSES,
+    STREAM_CHUNK_SIZE,
+    ndjson_response,
+    streams_all,
+    wants_ndjson,
+)
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.patch import apply_patch
+from utils.rawjson import json_array, json_response, response_headers
+from utils.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Secondary indexes kept on the destinations store (index name -> values to index under)
+DESTINATION_INDEXES = {
+    "name": lambda d: (d.name,),
+    "country": lambda d: (d.country,),
+    "continent": lambda d: (d.continent,),
+}
+
+# Text searched by /search (field -> text), and the fields also matched fuzzily
+DESTINATION_SEARCH_FIELDS = {
+    "name": lambda d: d.name,
+    "department": lambda d: d.department,
+}
+DESTINATION_FUZZY_FIELDS = ("name", "department")
+
+# Facet levels counted for /destinations/facets, outermost first
+DESTINATION_FACETS = {
+    "continent": lambda d: d.continent,
+    "country": lambda d: d.country,
+}
+
 # In-memory "DB"
-destinations: Dict[UUID, DestinationRead] = {}
+destinations: Repository = MemoryRepository(
+    "destinations", DestinationRead, DESTINATION_INDEXES
+)
+# Serialized list responses (shared cache, set from main)
+response_cache: ResponseCache = ResponseCache()
+# Per-record write locks for PATCH/DELETE in this process
+record_locks = KeyedLocks()
+# The conversions store that destinations refer to (set from main)
+conversions: Repository = None
+# Continent -> country counts behind /destinations/facets (set from main)
+destination_facets: FacetCounts = None
+
+EXPAND_QUERY = Query(
+    None,
+    description="Return the referenced conversions in place of their IDs "
+    "(references to deleted conversions are left out)",
+)
+
+
+def check_conversions(conversion_ids: Optional[List[UUID]]) -> None:
+    """422 unless every referenced conversion exists (bulk.py imports check too)."""
+    errors = [
+        {
+            "type": "value_error",
+            "loc": ("body", "conversions", i),
+            "msg": "Unknown conversion ID",
+            "input": str(conversion_id),
+        }
+        for i, conversion_id in enumerate(conversion_ids or ())
+        if conversion_id not in conversions
+    ]
+    if errors:
+        raise RequestValidationError(errors)
+
+
+def split_embedded_conversions(data: dict) -> List[ConversionRead]:
+    """
+    Destinations stored before conversions became references embed copies of
+    them (ConversionBase objects, without IDs). Replace each copy in `data`, a
+    destination's raw JSON, by a reference and return the conversions to store.
+
+    A copy's ID derives from the destination's ID and the copy's position, so
+    splitting the same record twice (two workers migrating, a log replayed
+    after a crash) names the same conversion. Returns [] for a current record.
+    """
+    items = data.get("conversions")
+    if not isinstance(items, list) or not any(isinstance(i, dict) for i in items):
+        return []
+    destination_id = UUID(str(data.setdefault("id", str(uuid4()))))
+    split = []
+    for position, item in enumerate(items):
+        if isinstance(item, dict):
+            derived = uuid5(destination_id, f"conversions/{position}")
+            conversion = ConversionRead.model_validate({"id": derived, **item})
+            items[position] = str(conversion.id)
+            split.append(conversion)
+    return split
+
+
+def adopt_conversions(split: List[ConversionRead]) -> None:
+    """Store split-off conversions, except those already stored (by ID)."""
+    conversions.compare_and_set_many(
+        [Write(conversion.id, None, conversion) for conversion in split], atomic=False
+    )
+
+
+def recover_embedded_conversions(data: dict) -> None:
+    """
+    Persistence upgrade hook for a recovered destination: replay runs in log
+    order, so the newest copy of a conversion is the one kept.
+    """
+    conversions.put_many((c.id, c) for c in split_embedded_conversions(data))
+
+
+def migrate_embedded_conversions() -> int:
+    """
+    Rewrite the stored destinations that still embed their conversions, storing
+    the conversions first; returns how many were rewritten. Runs at startup,
+    from the raw JSON: such records do not validate as DestinationRead.
+    """
+    legacy = [
+        json.loads(data)["id"]
+        for chunk in destinations.scan((), None, STREAM_CHUNK_SIZE, raw=True)
+        for data in chunk
+        if b'"foreign_course"' in data
+    ]
+    migrated = 0
+    for record_id in map(UUID, legacy):
+        for _ in range(MAX_WRITE_ATTEMPTS):
+            version = destinations.version(record_id)
+            raw = destinations.get_json(record_id)
+            if raw is None:
+                break
+            data = json.loads(raw)
+            try:
+                split = split_embedded_conversions(data)
+                record = DestinationRead.model_validate(data)
+            except ValidationError:
+                logger.exception("Cannot migrate destination %s", record_id)
+                break
+            if not split:
+                break  # rewritten meanwhile
+            adopt_conversions(split)
+            if destinations.compare_and_set(record_id, version, record):
+                migrated += 1
+                break
+    return migrated
+
+
+def _build(destination: DestinationCreate) -> DestinationRead:
+    check_conversions(destination.conversions)
+    return DestinationRead(**destination.model_dump())
+
+
+def _apply_update(existing: DestinationRead, update: DestinationUpdate) -> DestinationRead:
+    if "conversions" in update.model_fields_set:
+        check_conversions(update.conversions)
+    return apply_patch(existing, update, updated_at=datetime.now(timezone.utc))
+
+
+def _expand(bodies: List[bytes]) -> List[bytes]:
+    """Replace the conversion IDs in encoded destinations with the conversions."""
+    found: Dict[str, Optional[dict]] = {}
+    expanded = []
+    for body in bodies:
+        record = json.loads(body)
+        for conversion_id in record.get("conversions") or ():
+            if conversion_id not in found:
+                raw = conversions.get_json(UUID(conversion_id))
+                found[conversion_id] = None if raw is None else json.loads(raw)
+        if record.get("conversions") is not None:
+            record["conversions"] = [
+                found[c] for c in record["conversions"] if found[c] is not None
+            ]
+        expanded.append(
+            json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode()
+        )
+    return expanded
 
 
 @router.post("/destinations", response_model=DestinationRead, status_code=201)
-def create_destination(destination: DestinationCreate) -> DestinationRead:
+async def create_destination(destination: DestinationCreate) -> DestinationRead:
     """
     Create a new destination and add it to the in-memory database.
     ID/timestamps are generated by the server (DestinationRead defaults).
     """
     # Build the server-side model (generates id/created_at/updated_at)
-    created = DestinationRead(**destination.model_dump())
+    created = await run_store(conversions, _build, destination)
 
     # Prevent accidental collisions (extremely unlikely with UUID4, but cheap to check)
-    if created.id in destinations:
+    if await run_store(destinations, destinations.__contains__, created.id):
         raise HTTPException(
             status_code=400, detail="Generated ID collision; retry the request"
         )
 
-    destinations[created.id] = created
+    await run_store(destinations, destinations.__setitem__, created.id, created)
     return created
 
 
-@router.get("/destinations", response_model=List[DestinationRead])
-def list_destinations(
+@router.get(
+    "/destinations",
+    response_model=List[Union[DestinationRead, DestinationExpanded]],
+    responses={**NDJSON_RESPONSES, **NOT_MODIFIED_RESPONSES},
+)
+async def list_destinations(
+    request: Request,
+    response: Response,
     name: Optional[str] = Query(None, description="Filter by destination name"),
     country: Optional[str] = Query(None, description="Filter by country"),
     institution: Optional[str] = Query(None, description="Filter by institution"),
     continent: Optional[str] = Query(None, description="Filter by continent"),
+    limit: Optional[int] = Query(
+        None,
+        ge=1,
+        le=MAX_PAGE_SIZE,
+        description=f"Maximum records per page (default {DEFAULT_PAGE_SIZE}; "
+        "NDJSON streams every record unless set)",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from a previous page's X-Next-Cursor header"
+    ),
+    explain: bool = Query(False, description="Return the query plan in X-Query-Plan"),
+    expand: Optional[Literal["conversions"]] = EXPAND_QUERY,
 ) -> List[DestinationRead]:
     """
     List destinations, with optional filters.
-    (Adjust filters to match your DestinationRead fields.)
+    (`institution` matches the destination name.)
     """
-    results = list(destinations.values())
-
-    if name is not None:
-        # Assumes DestinationRead has a 'name' field
-        results = [d for d in results if getattr(d, "name", None) == name]
-
-    if country is not None:
-        results = [d for d in results if getattr(d, "country", None) == country]
-
-    if institution is not None:
-        results = [d for d in results if getattr(d, "name", None) == institution]
+    filters = [
+        ("name", name),
+        ("country", country),
+        ("name", institution),
+        ("continent", continent),
+    ]
+    generation = await run_store(destinations, lambda: destinations.generation)
+    if expand:
+        # Expanded bodies also change whenever a conversion does
+        generation = await run_store(
+            conversions, joined_generation, generation, conversions
+        )
+    etag = list_etag(destinations, request, generation)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cacheable = not explain and not wants_ndjson(request)
+    if cacheable:
+        cached = response_cache.get("destinations", request, generation)
+        if cached is not None:
+            return cached
+    try:
+        if streams_all(request, limit, explain):
+            chunks = await run_store(
+                destinations,
+                destinations.scan,
+                filters,
+                cursor,
+                STREAM_CHUNK_SIZE,
+                raw=True,
+            )
+            if expand:
+                chunks = map(_expand, chunks)
+            return ndjson_response(chunks, headers={"ETag": etag})
+        page = await run_store(
+            destinations,
+            destinations.find,
+            filters,
+            cursor,
+            limit or DEFAULT_PAGE_SIZE,
+            explain=explain,
+            raw=True,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if explain:
+        response.headers["X-Query-Plan"] = page.explain_header()
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    response.headers["ETag"] = etag
+    records = page.records
+    if expand:
+        records = await run_store(conversions, _expand, records)
+    if wants_ndjson(request):
+        return ndjson_response([records], response_headers(response))
+    body = json_array(records)
+    if cacheable:
+        return response_cache.put("destinations", request, generation, body, response)
+    return json_response(body, response_headers(response))
 
-    if continent is not None:
-        results = [d for d in results if getattr(d, "continent", None) == continent]
 
-    return results
+@router.get("/destinations/facets", response_model=FacetTree)
+async def destination_facet_counts(
+    name: Optional[str] = Query(None, description="Filter by destination name"),
+    country: Optional[str] = Query(None, description="Filter by country"),
+    institution: Optional[str] = Query(None, description="Filter by institution"),
+    continent: Optional[str] = Query(None, description="Filter by continent"),
+) -> FacetTree:
+    """
+    Destination counts per continent and, within each, per country, for the
+    destinations matching the same filters as GET /destinations.
+    """
+    filters = [
+        ("name", name),
+        ("country", country),
+        ("name", institution),
+        ("continent", continent),
+    ]
+    tree = await run_store(destinations, destination_facets.count, filters)
+    return json_response(json.dumps(tree, separators=(",", ":")).encode())
 
 
-@router.get("/destinations/{destination_id}", response_model=DestinationRead)
-def get_destination(destination_id: UUID) -> DestinationRead:
+@router.get(
+    "/destinations/{destination_id}",
+    response_model=Union[DestinationRead, DestinationExpanded],
+    responses=NOT_MODIFIED_RESPONSES,
+)
+async def get_destination(
+    request: Request,
+    destination_id: UUID,
+    expand: Optional[Literal["conversions"]] = EXPAND_QUERY,
+) -> DestinationRead:
     """Retrieve a destination by its UUID."""
-    dest = destinations.get(destination_id)
-    if dest is None:
+    version = await run_store(destinations, destinations.version, destination_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Destination not found")
+    if expand:
+        version = await run_store(conversions, joined_generation, version, conversions)
+    etag = record_etag(destinations, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    body = await run_store(destinations, destinations.get_json, destination_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Destination not found")
-    return dest
+    if expand:
+        [body] = await run_store(conversions, _expand, [body])
+    return json_response(body, {"ETag": etag})
 
 
-@router.patch("/destinations/{destination_id}", response_model=DestinationRead)
-def update_destination(
-    destination_id: UUID, update: DestinationUpdate
+@router.patch(
+    "/destinations/{destination_id}",
+    response_model=DestinationRead,
+    responses=PRECONDITION_FAILED_RESPONSES,
+)
+async def update_destination(
+    request: Request, destination_id: UUID, update: DestinationUpdate
 ) -> DestinationRead:
-    """Update an existing destination by its UUID."""
-    existing = destinations.get(destination_id)
-    if existing is None:
-        raise HTTPException(status_code=404, detail="Destination not found")
+    """Update an existing destination by its UUID (conditional with If-Match)."""
+    updated, version = await conditional_write(
+        destinations,
+        record_locks,
+        destination_id,
+        request,
+        lambda existing: _apply_update(existing, update),
+        "Destination not found",
+    )
+    return json_response(
+        updated.model_dump_json().encode(), {"ETag": record_etag(destinations, version)}
+    )
 
-    # Start from stored dict, then apply only provided fields
-    stored = existing.model_dump()
-    stored.update(update.model_dump(exclude_unset=True))
 
-    # Refresh updated_at
-    stored["updated_at"] = datetime.now(timezone.utc)
+@router.delete(
+    "/destinations/{destination_id}",
+    status_code=204,
+    responses=PRECONDITION_FAILED_RESPONSES,
+)
+async def delete_destination(request: Request, destination_id: UUID) -> None:
+    """Delete a destination by its ID (conditional with If-Match)."""
+    await conditional_write(
+        destinations,
+        record_locks,
+        destination_id,
+        request,
+        lambda existing: None,
+        "Destination not found",
+    )
 
-    updated = DestinationRead(**stored)
-    destinations[destination_id] = updated
-    return updated
 
+# -----------------------------------------------------------------------------
+# Batch endpoints
+# -----------------------------------------------------------------------------
+ATOMIC_QUERY = Query(
+    True, description="Apply all items or none (409 if any item fails)"
+)
 
-@router.delete("/destinations/{dest_id}", status_code=204)
-def delete_destination(dest_id: str) -> None:
-    """Delete a destination by its ID."""
-    if dest_id not in destinations:
-        raise HTTPException(status_code=404, detail="Destination not found")
-    del destinations[dest_id]
+
+@router.post(
+    "/destinations:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def create_destinations_batch(
+    response: Response,
+    items: List[DestinationCreate],
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Create many destinations in one request; returns one result per item."""
+    return batch_create(destinations, items, _build, response, atomic)
+
+
+@router.patch(
+    "/destinations:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def update_destinations_batch(
+    response: Response,
+    items: List[BatchPatch[DestinationUpdate]],
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Apply many partial updates in one request; returns one result per item."""
+    return batch_update(destinations, items, _apply_update, response, atomic)
+
+
+@router.delete(
+    "/destinations:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def delete_destinations_batch(
+    response: Response,
+    ids: List[UUID] = Body(..., description="IDs of the destinations to delete"),
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Delete many destinations in one request; returns one result per item."""
+    return batch_delete(destinations, ids, response, atomic)
@@ -1,26 +1,86 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
 from typing import List, Optional
 from uuid import UUID
+from models.batch import BatchPatch, BatchResult
 from models.person import PersonCreate, PersonRead, PersonUpdate
+from resources.repository import Repository
+from utils.batch import batch_create, batch_delete, batch_update
+from utils.concurrency import KeyedLocks, conditional_write, run_store
+from utils.etag import (
+    NOT_MODIFIED_RESPONSES,
+    PRECONDITION_FAILED_RESPONSES,
+    etag_matches,
+    list_etag,
+    not_modified,
+    record_etag,
+)
+from utils.ndjson import (
+    NDJSON_RESPONSES,
+    STREAM_CHUNK_SIZE,
+    ndjson_response,
+    streams_all,
+    wants_ndjson,
+)
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.patch import apply_patch
+from utils.rawjson import json_array, json_response, response_headers
+from utils.response_cache import ResponseCache
 
-from typing import Dict
+# Secondary indexes kept on the persons store (index name -> values to index under)
+PERSON_INDEXES = {
+    "uni": lambda p: (p.uni,),
+    "first_name": lambda p: (p.first_name,),
+    "last_name": lambda p: (p.last_name,),
+    "email": lambda p: (p.email,),
+    "phone": lambda p: (p.phone,),
+    "birth_date": lambda p: (str(p.birth_date),),
+    "city": lambda p: [addr.city for addr in p.addresses],
+    "country": lambda p: [addr.country for addr in p.addresses],
+}
+
+# Text searched by /search (field -> text), and the fields also matched fuzzily;
+# email local parts are matched whole or by prefix only
+PERSON_SEARCH_FIELDS = {
+    "first_name": lambda p: p.first_name,
+    "last_name": lambda p: p.last_name,
+    "email": lambda p: p.email.partition("@")[0],
+}
+PERSON_FUZZY_FIELDS = ("first_name", "last_name")
 
 # In-memory database (to be imported from main)
-persons: Dict[UUID, PersonRead] = None
+persons: Repository = None
+# Serialized list responses (shared cache, set from main)
+response_cache: ResponseCache = None
+# Per-record write locks for PATCH/DELETE in this process
+record_locks = KeyedLocks()
 
 router = APIRouter()
 
 
+def _build(person: PersonCreate) -> PersonRead:
+    return PersonRead(**person.model_dump())
+
+
+def _apply_update(existing: PersonRead, update: PersonUpdate) -> PersonRead:
+    return apply_patch(existing, update)
+
+
 @router.post("/persons", response_model=PersonRead, status_code=201)
-def create_person(person: PersonCreate) -> PersonRead:
+async def create_person(person: PersonCreate) -> PersonRead:
     """Create a new person and add to the in-memory database."""
-    person_read = PersonRead(**person.model_dump())
-    persons[person_read.id] = person_read
+    person_read = _build(person)
+    await run_store(persons, persons.__setitem__, person_read.id, person_read)
     return person_read
 
 
-@router.get("/persons", response_model=List[PersonRead])
-def list_persons(
+@router.get(
+    "/persons",
+    response_model=List[PersonRead],
+    responses={**NDJSON_RESPONSES, **NOT_MODIFIED_RESPONSES},
+)
+async def list_persons(
+    request: Request,
+    response: Response,
     uni: Optional[str] = Query(None, description="Filter by Columbia UNI"),
     first_name: Optional[str] = Query(None, description="Filter by first name"),
     last_name: Optional[str] = Query(None, description="Filter by last name"),
@@ -35,44 +95,153 @@ def list_persons(
     country: Optional[str] = Query(
         None, description="Filter by country of at least one address"
     ),
+    limit: Optional[int] = Query(
+        None,
+        ge=1,
+        le=MAX_PAGE_SIZE,
+        description=f"Maximum records per page (default {DEFAULT_PAGE_SIZE}; "
+        "NDJSON streams every record unless set)",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from a previous page's X-Next-Cursor header"
+    ),
+    explain: bool = Query(False, description="Return the query plan in X-Query-Plan"),
 ) -> List[PersonRead]:
-    results = list(persons.values())
-
-    if uni is not None:
-        results = [p for p in results if p.uni == uni]
-    if first_name is not None:
-        results = [p for p in results if p.first_name == first_name]
-    if last_name is not None:
-        results = [p for p in results if p.last_name == last_name]
-    if email is not None:
-        results = [p for p in results if p.email == email]
-    if phone is not None:
-        results = [p for p in results if p.phone == phone]
-    if birth_date is not None:
-        results = [p for p in results if str(p.birth_date) == birth_date]
-    if city is not None:
-        results = [p for p in results if any(addr.city == city for addr in p.addresses)]
-    if country is not None:
-        results = [
-            p for p in results if any(addr.country == country for addr in p.addresses)
-        ]
-    return results
-
-
-@router.get("/persons/{person_id}", response_model=PersonRead)
-def get_person(person_id: UUID) -> PersonRead:
+    filters = {
+        "uni": uni,
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email,
+        "phone": phone,
+        "birth_date": birth_date,
+        "city": city,
+        "country": country,
+    }
+    generation = await run_store(persons, lambda: persons.generation)
+    etag = list_etag(persons, request, generation)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cacheable = not explain and not wants_ndjson(request)
+    if cacheable:
+        cached = response_cache.get("persons", request, generation)
+        if cached is not None:
+            return cached
+    try:
+        if streams_all(request, limit, explain):
+            chunks = await run_store(
+                persons, persons.scan, filters, cursor, STREAM_CHUNK_SIZE, raw=True
+            )
+            return ndjson_response(chunks, headers={"ETag": etag})
+        page = await run_store(
+            persons,
+            persons.find,
+            filters,
+            cursor,
+            limit or DEFAULT_PAGE_SIZE,
+            explain=explain,
+            raw=True,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if explain:
+        response.headers["X-Query-Plan"] = page.explain_header()
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    response.headers["ETag"] = etag
+    if wants_ndjson(request):
+        return ndjson_response([page.records], response_headers(response))
+    body = json_array(page.records)
+    if cacheable:
+        return response_cache.put("persons", request, generation, body, response)
+    return json_response(body, response_headers(response))
+
+
+@router.get(
+    "/persons/{person_id}",
+    response_model=PersonRead,
+    responses=NOT_MODIFIED_RESPONSES,
+)
+async def get_person(request: Request, person_id: UUID) -> PersonRead:
     """Retrieve a person by their UUID."""
-    if person_id not in persons:
+    version = await run_store(persons, persons.version, person_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Person not found")
+    etag = record_etag(persons, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    body = await run_store(persons, persons.get_json, person_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Person not found")
-    return persons[person_id]
+    return json_response(body, {"ETag": etag})
 
 
-@router.patch("/persons/{person_id}", response_model=PersonRead)
-def update_person(person_id: UUID, update: PersonUpdate) -> PersonRead:
-    """Update an existing person by their UUID."""
-    if person_id not in persons:
-        raise HTTPException(status_code=404, detail="Person not found")
-    stored = persons[person_id].model_dump()
-    stored.update(update.model_dump(exclude_unset=True))
-    persons[person_id] = PersonRead(**stored)
-    return persons[person_id]
+@router.patch(
+    "/persons/{person_id}",
+    response_model=PersonRead,
+    responses=PRECONDITION_FAILED_RESPONSES,
+)
+async def update_person(
+    request: Request, person_id: UUID, update: PersonUpdate
+) -> PersonRead:
+    """Update an existing person by its UUID (conditional with If-Match)."""
+    updated, version = await conditional_write(
+        persons,
+        record_locks,
+        person_id,
+        request,
+        lambda existing: _apply_update(existing, update),
+        "Person not found",
+    )
+    return json_response(
+        updated.model_dump_json().encode(), {"ETag": record_etag(persons, version)}
+    )
+
+
+# -----------------------------------------------------------------------------
+# Batch endpoints
+# -----------------------------------------------------------------------------
+ATOMIC_QUERY = Query(
+    True, description="Apply all items or none (409 if any item fails)"
+)
+
+
+@router.post(
+    "/persons:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def create_persons_batch(
+    response: Response,
+    items: List[PersonCreate],
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Create many persons in one request; returns one result per item."""
+    return batch_create(persons, items, _build, response, atomic)
+
+
+@router.patch(
+    "/persons:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def update_persons_batch(
+    response: Response,
+    items: List[BatchPatch[PersonUpdate]],
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Apply many partial updates in one request; returns one result per item."""
+    return batch_update(persons, items, _apply_update, response, atomic)
+
+
+@router.delete(
+    "/persons:batch",
+    response_model=List[BatchResult],
+    response_model_exclude_none=True,
+)
+def delete_persons_batch(
+    response: Response,
+    ids: List[UUID] = Body(..., description="IDs of the persons to delete"),
+    atomic: bool = ATOMIC_QUERY,
+) -> List[BatchResult]:
+    """Delete many persons in one request; returns one result per item."""
+    return batch_delete(persons, ids, response, atomic)
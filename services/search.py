@@ -0,0 +1,66 @@
+import json
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from models.search import SearchCollection, SearchHit
+from utils.concurrency import run_store
+from utils.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from utils.rawjson import json_array, json_response, response_headers
+from utils.search import SearchIndex
+
+router = APIRouter()
+
+DEFAULT_SEARCH_LIMIT = 20
+
+# Search index per collection (set from main)
+indexes: Dict[str, SearchIndex] = {}
+
+
+def _hit(collection: str, record_id: UUID, score: float, record: bytes) -> bytes:
+    head = json.dumps(
+        {"collection": collection, "id": str(record_id), "score": score},
+        separators=(",", ":"),
+    )
+    return head[:-1].encode() + b',"record":' + record + b"}"
+
+
+@router.get("/search", response_model=List[SearchHit])
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1, description="Words to look for"),
+    collections: Optional[List[SearchCollection]] = Query(
+        None, description="Collections to search (default: all)"
+    ),
+    fuzzy: bool = Query(
+        True, description="Also match near misses of words that match nothing"
+    ),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from a previous page's X-Next-Cursor header"
+    ),
+) -> List[SearchHit]:
+    """
+    Ranked search over person names and email local parts, destination names
+    and departments, and conversion course names. Every word of `q` has to
+    match (whole, as a prefix, or fuzzily); best matches come first.
+    """
+    try:
+        offset = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    ranked = []
+    for collection in collections or list(indexes):
+        index = indexes[collection]
+        matches = await run_store(index.store, index.search, q, offset + limit + 1, fuzzy)
+        ranked.extend((score, collection, record_id) for score, record_id in matches)
+    ranked.sort(key=lambda hit: -hit[0])
+    if len(ranked) > offset + limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(offset + limit)
+    hits = []
+    for score, collection, record_id in ranked[offset : offset + limit]:
+        store = indexes[collection].store
+        record = await run_store(store, store.get_json, record_id)
+        if record is not None:  # deleted since the lookup
+            hits.append(_hit(collection, record_id, score, record))
+    return json_response(json_array(hits), response_headers(response))
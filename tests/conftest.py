@@ -0,0 +1,32 @@
+"""Shared fixtures: the app's packages on sys.path and stores of both backends."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from resources.memory import MemoryRepository  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    from resources.sqlite import SqliteDatabase
+
+    db = SqliteDatabase(str(tmp_path / "store.sqlite3"))
+    yield db
+    db.close()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    """Build repositories, (name, model, indexes) -> Repository, of each backend."""
+    if request.param == "memory":
+        yield MemoryRepository
+        return
+    from resources.sqlite import SqliteDatabase, SqliteRepository
+
+    db = SqliteDatabase(str(tmp_path / "store.sqlite3"))
+    yield lambda name, model, indexes: SqliteRepository(db, name, model, indexes)
+    db.close()
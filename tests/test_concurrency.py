@@ -0,0 +1,127 @@
+"""Version-checked writes: If-Match, lost compare-and-set races and batches."""
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import app
+from utils.concurrency import MAX_WRITE_ATTEMPTS
+
+
+def person(n: int) -> dict:
+    return {
+        "uni": f"cc{n:04d}",
+        "first_name": "Con",
+        "last_name": "Current",
+        "email": f"cc{n}@example.com",
+    }
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def created(client):
+    return client.post("/persons", json=person(1)).json()["id"]
+
+
+def statuses(response):
+    return [item["status"] for item in response.json()]
+
+
+def test_if_match_with_a_stale_etag_is_412(client, created):
+    etag = client.get(f"/persons/{created}").headers["etag"]
+    updated = client.patch(
+        f"/persons/{created}", json={"phone": "1"}, headers={"If-Match": etag}
+    )
+    assert updated.status_code == 200
+    assert updated.headers["etag"] != etag
+    stale = client.patch(
+        f"/persons/{created}", json={"phone": "2"}, headers={"If-Match": etag}
+    )
+    assert stale.status_code == 412
+    assert client.get(f"/persons/{created}").json()["phone"] == "1"
+    current = client.patch(
+        f"/persons/{created}",
+        json={"phone": "3"},
+        headers={"If-Match": updated.headers["etag"]},
+    )
+    assert current.status_code == 200
+
+
+def test_write_that_keeps_losing_races_is_409(client, created, monkeypatch):
+    attempts = []
+
+    def lost(*args, **kwargs):
+        attempts.append(args)
+        return None
+
+    monkeypatch.setattr(main.persons, "compare_and_set", lost)
+    response = client.patch(f"/persons/{created}", json={"phone": "1"})
+    assert response.status_code == 409
+    assert len(attempts) == MAX_WRITE_ATTEMPTS
+    monkeypatch.undo()
+    assert client.get(f"/persons/{created}").json()["phone"] is None
+
+
+def test_atomic_batch_fails_as_a_whole(client, created):
+    missing = str(uuid4())
+    response = client.patch(
+        "/persons:batch",
+        json=[
+            {"id": created, "update": {"phone": "1"}},
+            {"id": missing, "update": {"phone": "2"}},
+        ],
+    )
+    assert response.status_code == 409
+    assert statuses(response) == [424, 404]
+    assert client.get(f"/persons/{created}").json()["phone"] is None
+
+
+def test_non_atomic_batch_applies_the_valid_items(client, created):
+    missing = str(uuid4())
+    response = client.request(
+        "DELETE", "/persons:batch?atomic=false", json=[created, missing, created]
+    )
+    assert response.status_code == 200
+    assert statuses(response) == [204, 404, 404]
+    assert client.get(f"/persons/{created}").status_code == 404
+
+
+def test_batch_retries_items_that_lose_a_race(client, created, monkeypatch):
+    store = main.persons
+    write_many = store.compare_and_set_many
+    raced = []
+
+    def racing(writes, atomic=True):
+        if not raced:
+            # Another writer gets in between the batch's read and its write
+            raced.append(client.patch(f"/persons/{created}", json={"phone": "9"}))
+        return write_many(writes, atomic)
+
+    monkeypatch.setattr(store, "compare_and_set_many", racing)
+    response = client.patch(
+        "/persons:batch", json=[{"id": created, "update": {"last_name": "Z"}}]
+    )
+    assert statuses(response) == [200]
+    record = client.get(f"/persons/{created}").json()
+    assert (record["phone"], record["last_name"]) == ("9", "Z")
+
+
+def test_batch_item_that_keeps_losing_races_is_409(client, created, monkeypatch):
+    monkeypatch.setattr(
+        main.persons,
+        "compare_and_set_many",
+        lambda writes, atomic=True: list(range(len(writes))),
+    )
+    for atomic in ("true", "false"):
+        response = client.patch(
+            f"/persons:batch?atomic={atomic}",
+            json=[{"id": created, "update": {"phone": "1"}}],
+        )
+        assert statuses(response) == [409]
+        assert "too fast" in response.json()[0]["error"]
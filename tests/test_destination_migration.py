@@ -0,0 +1,187 @@
+"""Destinations stored before conversions became references (user-020)."""
+import copy
+import io
+import json
+from uuid import UUID
+
+import pytest
+
+import services.destinations as destinations_service
+from bulk import CHECKS, UPGRADES, Progress, import_file
+from framework.persistence import Persistence, _file_name, WAL_PREFIX
+from models.conversion import ConversionRead
+from models.destination import DestinationRead
+from resources.memory import MemoryRepository
+from services.conversions import CONVERSION_INDEXES
+from services.destinations import (
+    DESTINATION_INDEXES,
+    migrate_embedded_conversions,
+    recover_embedded_conversions,
+    split_embedded_conversions,
+)
+
+# A destination as the old DestinationRead.model_dump_json() wrote it: the
+# conversions are embedded ConversionBase objects, which have no ID
+LEGACY = {
+    "dest_id": "ABC123",
+    "name": "University of Washington",
+    "continent": "North America",
+    "country": "United States",
+    "department": "Paul G. Allen School of Computer Science & Engineering",
+    "conversions": [
+        {
+            "foreign_course": {
+                "id": 123,
+                "name": "Introduction to Computer Science",
+                "institution_id": "ABC124",
+                "credits": 3,
+            },
+            "home_course": {
+                "id": 456,
+                "name": "Data Structures",
+                "institution_id": "ABC123",
+                "credits": 4,
+            },
+            "host_institution": "University of Oxford",
+        },
+        {
+            "foreign_course": {
+                "id": 124,
+                "name": "Linear Algebra",
+                "institution_id": "ABC124",
+                "credits": None,
+            },
+            "home_course": {
+                "id": 457,
+                "name": "Linear Algebra",
+                "institution_id": "ABC123",
+                "credits": 3,
+            },
+            "host_institution": "University of Oxford",
+        },
+    ],
+    "id": "550e8400-e29b-41d4-a716-446655440000",
+    "created_at": "2025-01-15T10:20:30",
+    "updated_at": "2025-01-16T12:00:00",
+}
+
+
+def legacy() -> dict:
+    return copy.deepcopy(LEGACY)
+
+
+@pytest.fixture
+def stores(make_store, monkeypatch):
+    conversions = make_store("conversions", ConversionRead, CONVERSION_INDEXES)
+    destinations = make_store("destinations", DestinationRead, DESTINATION_INDEXES)
+    monkeypatch.setattr(destinations_service, "conversions", conversions)
+    monkeypatch.setattr(destinations_service, "destinations", destinations)
+    return destinations, conversions
+
+
+def test_legacy_record_does_not_validate_as_is():
+    with pytest.raises(ValueError):
+        DestinationRead.model_validate_json(json.dumps(LEGACY))
+
+
+def test_split_replaces_copies_with_stable_references():
+    data = legacy()
+    split = split_embedded_conversions(data)
+    record = DestinationRead.model_validate(data)
+    assert record.conversions == [c.id for c in split]
+    assert [c.host_institution for c in split] == ["University of Oxford"] * 2
+    assert split[0].foreign_course.id == 123
+    # The same record split again (another worker, a replayed log) names the
+    # same conversions
+    assert [c.id for c in split_embedded_conversions(legacy())] == record.conversions
+    # A current record has nothing to split
+    assert split_embedded_conversions(data) == []
+
+
+def test_startup_migration(sqlite_db, monkeypatch):
+    from resources.sqlite import SqliteRepository
+
+    conversions = SqliteRepository(
+        sqlite_db, "conversions", ConversionRead, CONVERSION_INDEXES
+    )
+    destinations = SqliteRepository(
+        sqlite_db, "destinations", DestinationRead, DESTINATION_INDEXES
+    )
+    monkeypatch.setattr(destinations_service, "conversions", conversions)
+    monkeypatch.setattr(destinations_service, "destinations", destinations)
+    record_id = UUID(LEGACY["id"])
+    destinations[record_id] = DestinationRead.model_validate(
+        {**LEGACY, "conversions": []}
+    )
+    # The row as an older version of the app stored it
+    with sqlite_db.transaction() as conn:
+        conn.execute(
+            "UPDATE destinations SET data = ? WHERE id = ?",
+            (json.dumps(LEGACY), str(record_id)),
+        )
+
+    assert migrate_embedded_conversions() == 1
+    migrated = destinations[record_id]
+    assert len(migrated.conversions) == 2
+    assert all(conversions.get(cid) is not None for cid in migrated.conversions)
+    assert b"foreign_course" not in destinations.get_json(record_id)
+    # Nothing left to migrate, and nothing stored twice
+    assert migrate_embedded_conversions() == 0
+    assert len(conversions) == 2
+
+
+def test_recovery_of_a_legacy_log(tmp_path, monkeypatch):
+    def open_stores():
+        conversions = MemoryRepository(
+            "conversions", ConversionRead, CONVERSION_INDEXES
+        )
+        destinations = MemoryRepository(
+            "destinations", DestinationRead, DESTINATION_INDEXES
+        )
+        monkeypatch.setattr(destinations_service, "conversions", conversions)
+        persistence = Persistence(
+            str(tmp_path),
+            {
+                "conversions": (conversions, ConversionRead),
+                "destinations": (destinations, DestinationRead),
+            },
+            upgrades={"destinations": recover_embedded_conversions},
+        )
+        return persistence, destinations, conversions
+
+    entry = {"lsn": 1, "op": "put", "c": "destinations", "v": LEGACY}
+    (tmp_path / _file_name(WAL_PREFIX, 1)).write_text(json.dumps(entry) + "\n")
+
+    persistence, destinations, conversions = open_stores()
+    persistence.recover()
+    record = destinations[UUID(LEGACY["id"])]
+    assert sorted(conversions) == sorted(record.conversions)
+    persistence.close()  # snapshots the migrated records
+
+    persistence, destinations, conversions = open_stores()
+    persistence.recover()
+    assert destinations[UUID(LEGACY["id"])].conversions == record.conversions
+    assert len(conversions) == 2
+    persistence.close()
+
+
+def test_bulk_import_of_a_legacy_row(stores):
+    destinations, conversions = stores
+    errors = io.StringIO()
+    import_file(
+        destinations,
+        DestinationRead,
+        io.StringIO(json.dumps(LEGACY) + "\n"),
+        "jsonl",
+        100,
+        errors,
+        Progress("import", quiet=True),
+        CHECKS["destinations"],
+        UPGRADES["destinations"],
+    )
+    assert errors.getvalue() == ""
+    record = destinations[UUID(LEGACY["id"])]
+    assert [conversions[cid].foreign_course.id for cid in record.conversions] == [
+        123,
+        124,
+    ]
@@ -0,0 +1,29 @@
+"""ETags of list responses and their cached bodies."""
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+def test_parameter_order_does_not_change_the_etag():
+    with TestClient(app) as client:
+        client.post(
+            "/persons",
+            json={
+                "uni": "et1234",
+                "first_name": "E",
+                "last_name": "Tag",
+                "email": "e@t.io",
+            },
+        )
+        first = client.get("/persons?limit=5&last_name=Tag")
+        # Served from the response cache, filled by the other order
+        second = client.get("/persons?last_name=Tag&limit=5")
+        assert second.headers["etag"] == first.headers["etag"]
+        assert second.content == first.content
+        again = client.get(
+            "/persons?last_name=Tag&limit=5",
+            headers={"If-None-Match": first.headers["etag"]},
+        )
+        assert again.status_code == 304
+        other = client.get("/persons?last_name=Tag&limit=6")
+        assert other.headers["etag"] != first.headers["etag"]
@@ -0,0 +1,61 @@
+"""NDJSON list responses: full streams and single pages."""
+import json
+
+from fastapi.testclient import TestClient
+
+from main import app
+
+NDJSON = {"Accept": "application/x-ndjson"}
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def _add_people(client, count):
+    for n in range(count):
+        client.post(
+            "/persons",
+            json={
+                "uni": f"nd{n:04d}",
+                "first_name": "Nd",
+                "last_name": "Json",
+                "email": f"nd{n}@json.io",
+            },
+        )
+
+
+def test_limit_pages_the_stream_with_a_resume_cursor():
+    with TestClient(app) as client:
+        _add_people(client, 5)
+        unis, cursor, pages = [], None, 0
+        while True:
+            url = "/persons?last_name=Json&limit=2"
+            if cursor:
+                url += f"&cursor={cursor}"
+            page = client.get(url, headers=NDJSON)
+            assert page.status_code == 200
+            assert page.headers["content-type"].startswith("application/x-ndjson")
+            unis += [record["uni"] for record in _lines(page)]
+            pages += 1
+            cursor = page.headers.get("x-next-cursor")
+            if cursor is None:
+                break
+        assert pages == 3
+        assert sorted(unis) == [f"nd{n:04d}" for n in range(5)]
+        everything = client.get("/persons?last_name=Json", headers=NDJSON)
+        assert "x-next-cursor" not in everything.headers
+        assert [record["uni"] for record in _lines(everything)] == unis
+
+
+def test_explain_needs_a_limit_when_streaming():
+    with TestClient(app) as client:
+        _add_people(client, 1)
+        streamed = client.get("/persons?last_name=Json&explain=true", headers=NDJSON)
+        assert streamed.status_code == 400
+        page = client.get(
+            "/persons?last_name=Json&explain=true&limit=1", headers=NDJSON
+        )
+        assert page.status_code == 200
+        assert "x-query-plan" in page.headers
+        assert len(_lines(page)) == 1
@@ -0,0 +1,77 @@
+"""The precomputed OpenAPI document (framework/openapi.py)."""
+import json
+import logging
+
+import pytest
+from fastapi.openapi.utils import get_openapi
+
+from framework.openapi import DIGEST_KEY, cached_openapi, routes_digest, write_schema
+from main import app
+
+
+def generated() -> dict:
+    """The document FastAPI itself builds for the app (as FastAPI.openapi does)."""
+    return get_openapi(
+        title=app.title,
+        version=app.version,
+        openapi_version=app.openapi_version,
+        summary=app.summary,
+        description=app.description,
+        terms_of_service=app.terms_of_service,
+        contact=app.contact,
+        license_info=app.license_info,
+        routes=app.routes,
+        webhooks=app.webhooks.routes,
+        tags=app.openapi_tags,
+        servers=app.servers,
+        separate_input_output_schemas=app.separate_input_output_schemas,
+    )
+
+
+@pytest.fixture
+def schema_file(tmp_path):
+    path = str(tmp_path / "openapi.json")
+    write_schema(app, path)
+    app.openapi_schema = None
+    yield path
+    app.openapi_schema = None
+
+
+def test_cached_document_is_the_generated_one(schema_file, caplog):
+    with caplog.at_level(logging.WARNING, logger="framework.openapi"):
+        schema = cached_openapi(app, schema_file)()
+    assert not caplog.records  # served from the file
+    assert DIGEST_KEY not in schema
+    assert schema == generated()
+
+
+def test_stale_file_is_ignored(schema_file, caplog):
+    with open(schema_file, encoding="utf-8") as f:
+        stale = json.load(f)
+    stale["info"]["title"] = "Stale"
+    stale[DIGEST_KEY] = "0" * 32
+    with open(schema_file, "w", encoding="utf-8") as f:
+        json.dump(stale, f)
+    with caplog.at_level(logging.WARNING, logger="framework.openapi"):
+        schema = cached_openapi(app, schema_file)()
+    assert "stale" in caplog.text
+    assert schema == generated()
+
+
+def test_digest_follows_the_source(tmp_path):
+    (tmp_path / "main.py").write_text("app = None\n")
+    models = tmp_path / "models"
+    models.mkdir()
+    (models / "__init__.py").write_text("")
+    model = models / "person.py"
+    model.write_text('class Person:\n    """A person."""\n')
+    digest = routes_digest(app, root=str(tmp_path))
+
+    # Files outside the app's packages do not count
+    (tmp_path / "venv").mkdir()
+    (tmp_path / "venv" / "site.py").write_text("x = 1\n")
+    assert routes_digest(app, root=str(tmp_path)) == digest
+
+    # An edited docstring (or example, Query, ...) makes the document stale
+    model.write_text('class Person:\n    """Someone."""\n')
+    assert routes_digest(app, root=str(tmp_path)) != digest
@@ -0,0 +1,162 @@
+"""WAL + snapshot durability of the memory backend (framework/persistence.py)."""
+import os
+
+import pytest
+
+from framework.persistence import (
+    SNAPSHOT_PREFIX,
+    WAL_PREFIX,
+    Persistence,
+    WriteAheadLog,
+)
+from models.address import AddressRead
+from resources.memory import MemoryRepository
+from services.addresses import ADDRESS_INDEXES
+
+
+def address(city: str) -> AddressRead:
+    return AddressRead(street="1 Main St", city=city, country="US")
+
+
+def open_store(directory):
+    store = MemoryRepository("addresses", AddressRead, ADDRESS_INDEXES)
+    persistence = Persistence(
+        str(directory), {"addresses": (store, AddressRead)}, commit_delay=0
+    )
+    return persistence, store
+
+
+def crash(persistence: Persistence) -> None:
+    """Stop like a killed process would: no final snapshot."""
+    persistence.wal.close()
+    persistence._lock_file.close()
+
+
+def files(directory, prefix):
+    return sorted(name for name in os.listdir(directory) if name.startswith(prefix))
+
+
+def contents(store):
+    return {rid: store.get_json(rid) for rid in store}
+
+
+def test_snapshot_then_replay(tmp_path):
+    persistence, store = open_store(tmp_path)
+    persistence.recover()
+    before = [address(f"city{i}") for i in range(5)]
+    for record in before:
+        store[record.id] = record
+    persistence.snapshot()
+    after = address("later")
+    store[after.id] = after
+    del store[before[0].id]
+    store[before[1].id] = before[1].model_copy(update={"city": "moved"})
+    expected = contents(store)
+    crash(persistence)
+
+    persistence, store = open_store(tmp_path)
+    assert persistence.recover() == 3  # only the entries after the snapshot
+    assert contents(store) == expected
+    assert store[before[1].id].city == "moved"
+    persistence.close()
+
+
+def test_torn_last_entry_is_cut_off(tmp_path):
+    persistence, store = open_store(tmp_path)
+    persistence.recover()
+    kept = address("kept")
+    store[kept.id] = kept
+    crash(persistence)
+    (segment,) = files(tmp_path, WAL_PREFIX)
+    with open(tmp_path / segment, "ab") as f:
+        f.write(b'{"lsn":2,"op":"put","c":"addresses","v":{"id"')  # no newline
+
+    persistence, store = open_store(tmp_path)
+    assert persistence.recover() == 1
+    assert list(store) == [kept.id]
+    # New writes go to a fresh segment, never after the cut
+    more = address("more")
+    store[more.id] = more
+    crash(persistence)
+    assert len(files(tmp_path, WAL_PREFIX)) == 2
+
+    persistence, store = open_store(tmp_path)
+    assert persistence.recover() == 2
+    assert sorted(store) == sorted([kept.id, more.id])
+    persistence.close()
+
+
+def test_torn_entry_before_the_last_segment_fails(tmp_path):
+    persistence, store = open_store(tmp_path)
+    persistence.recover()
+    store[address("a").id] = address("a")
+    crash(persistence)
+    (segment,) = files(tmp_path, WAL_PREFIX)
+    with open(tmp_path / segment, "ab") as f:
+        f.write(b'{"lsn":2,')
+    persistence, store = open_store(tmp_path)
+    persistence.recover()  # cuts the tail and opens a new segment
+    store[address("b").id] = address("b")
+    crash(persistence)
+    with open(tmp_path / segment, "ab") as f:
+        f.write(b'{"lsn":3,')  # damage in a segment that is no longer last
+
+    persistence, _ = open_store(tmp_path)
+    with pytest.raises(ValueError):
+        persistence.recover()
+
+
+def test_snapshot_rotates_and_drops_covered_segments(tmp_path):
+    persistence, store = open_store(tmp_path)
+    persistence.recover()
+    for i in range(3):
+        record = address(f"a{i}")
+        store[record.id] = record
+    lsn = persistence.snapshot()
+    assert files(tmp_path, SNAPSHOT_PREFIX) == [f"{SNAPSHOT_PREFIX}{lsn:020d}.jsonl"]
+    assert files(tmp_path, WAL_PREFIX) == []
+    record = address("b")
+    store[record.id] = record
+    # The entry after the snapshot starts its own segment
+    assert files(tmp_path, WAL_PREFIX) == [f"{WAL_PREFIX}{lsn + 1:020d}.jsonl"]
+    persistence.snapshot()
+    assert len(files(tmp_path, SNAPSHOT_PREFIX)) == 1
+    expected = contents(store)
+    crash(persistence)
+
+    persistence, store = open_store(tmp_path)
+    assert persistence.recover() == 0
+    assert contents(store) == expected
+    persistence.close()
+
+
+def test_failed_fsync_fails_writes_instead_of_hanging(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), commit_delay=0)
+
+    def fail():
+        raise OSError(5, "Input/output error")
+
+    wal._sync = fail
+    lsn = wal.append(lambda n: b"entry\n")
+    with pytest.raises(RuntimeError) as failed:
+        wal.wait(lsn)
+    assert isinstance(failed.value.__cause__, OSError)
+    with pytest.raises(RuntimeError):
+        wal.append(lambda n: b"entry\n")
+    wal.close()
+
+
+def test_store_write_fails_when_the_log_does(tmp_path):
+    persistence, store = open_store(tmp_path)
+    persistence.recover()
+
+    def fail():
+        raise OSError(28, "No space left on device")
+
+    persistence.wal._sync = fail
+    for _ in range(2):  # the failing write, then every one after it
+        record = address("x")
+        with pytest.raises(RuntimeError):
+            store[record.id] = record
+    persistence.wal.close()
+    persistence._lock_file.close()
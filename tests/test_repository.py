@@ -0,0 +1,106 @@
+"""The memory and SQLite backends behave the same behind the Repository API."""
+import pytest
+
+from models.address import AddressRead
+from resources.memory import MemoryRepository
+from resources.repository import Write
+from services.addresses import ADDRESS_INDEXES
+
+
+def address(city: str, country: str = "NO") -> AddressRead:
+    return AddressRead(street="1 Main St", city=city, country=country)
+
+
+@pytest.fixture
+def store(make_store):
+    return make_store("addresses", AddressRead, ADDRESS_INDEXES)
+
+
+def fill(store, *cities):
+    records = [address(city) for city in cities]
+    for record in records:
+        store[record.id] = record
+    return records
+
+
+def ids(page):
+    return [record.id for record in page.records]
+
+
+def test_find_pages_matches_in_insertion_order(store):
+    oslo1, _, oslo2, _, oslo3 = fill(store, "Oslo", "Bergen", "Oslo", "Rome", "Oslo")
+    first = store.find({"city": "Oslo"}, None, 2)
+    assert ids(first) == [oslo1.id, oslo2.id]
+    assert first.next_cursor is not None
+    second = store.find([("city", "Oslo")], first.next_cursor, 2)
+    assert ids(second) == [oslo3.id]
+    assert second.next_cursor is None
+    assert ids(store.find({"city": "Oslo", "country": "IT"}, None, 10)) == []
+    assert len(store.find({}, None, 10).records) == 5
+    with pytest.raises(ValueError):
+        store.find({"city": "Oslo"}, "not-a-cursor", 2)
+
+
+def test_find_follows_updates_and_deletes(store):
+    oslo, bergen = fill(store, "Oslo", "Bergen")
+    store[bergen.id] = bergen.model_copy(update={"city": "Oslo"})
+    del store[oslo.id]
+    assert ids(store.find({"city": "Oslo"}, None, 10)) == [bergen.id]
+    assert ids(store.find({"city": "Bergen"}, None, 10)) == []
+    raw = store.find({"city": "Oslo"}, None, 10, raw=True)
+    assert raw.records == [store.get_json(bergen.id)]
+
+
+def test_compare_and_set_many_atomic_writes_nothing_on_a_conflict(store):
+    oslo, bergen = fill(store, "Oslo", "Bergen")
+    stale = store.version(bergen.id)
+    store[bergen.id] = bergen.model_copy(update={"city": "Rome"})
+    created = address("Paris")
+    writes = [
+        Write(oslo.id, store.version(oslo.id), oslo.model_copy(update={"city": "X"})),
+        Write(bergen.id, stale, None),
+        Write(created.id, None, created),
+    ]
+    before = store.generation
+    assert store.compare_and_set_many(writes) == [1]
+    assert store.generation == before
+    assert store[oslo.id].city == "Oslo"
+    assert store[bergen.id].city == "Rome"
+    assert created.id not in store
+
+
+def test_compare_and_set_many_non_atomic_applies_the_rest(store):
+    oslo, bergen = fill(store, "Oslo", "Bergen")
+    existing = address("Paris")
+    store[existing.id] = existing
+    writes = [
+        Write(oslo.id, store.version(oslo.id), None),
+        Write(bergen.id, store.version(bergen.id) - 1, None),
+        # Creating a record that already exists is a conflict too
+        Write(existing.id, None, existing),
+        Write(
+            bergen.id,
+            store.version(bergen.id),
+            bergen.model_copy(update={"city": "Y"}),
+        ),
+    ]
+    assert store.compare_and_set_many(writes, atomic=False) == [1, 2]
+    assert oslo.id not in store
+    assert store[bergen.id].city == "Y"
+    assert store.find({"city": "Y"}, None, 10).records[0].id == bergen.id
+
+
+def test_changes_names_the_records_written_since_a_generation(store):
+    kept, deleted = fill(store, "Oslo", "Bergen")
+    since = store.generation
+    changed = address("Rome")
+    store[changed.id] = changed
+    del store[deleted.id]
+    found = store.changes(since, 10)
+    if isinstance(store, MemoryRepository):
+        # Its listeners see every write in the process: views never catch up
+        assert found is None
+        return
+    assert set(found) == {changed.id, deleted.id}
+    assert store.changes(store.generation, 10) == []
+    assert store.changes(since, 1) is None
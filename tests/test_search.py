@@ -0,0 +1,93 @@
+"""Ranked name search: SearchIndex and GET /search."""
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.person import PersonRead
+from services.persons import PERSON_FUZZY_FIELDS, PERSON_INDEXES, PERSON_SEARCH_FIELDS
+from utils.search import SearchIndex
+
+
+@pytest.fixture
+def people(make_store):
+    store = make_store("persons", PersonRead, PERSON_INDEXES)
+    index = SearchIndex(store, PERSON_SEARCH_FIELDS, PERSON_FUZZY_FIELDS)
+
+    def add(first_name, last_name, email=None):
+        record = PersonRead(
+            uni=f"se{len(store) + 1}",
+            first_name=first_name,
+            last_name=last_name,
+            email=email or f"{first_name.lower()}@example.com",
+        )
+        store[record.id] = record
+        return record.id
+
+    return store, index, add
+
+
+def found(index, query, fuzzy=True):
+    return [record_id for _, record_id in index.search(query, 10, fuzzy)]
+
+
+def test_whole_words_rank_above_prefixes_above_near_misses(people):
+    store, index, add = people
+    jon = add("Jon", "Smith")
+    johnson = add("Johnson", "Smith")
+    john = add("John", "Smith")
+    assert found(index, "john") == [john, johnson]
+    # A word nothing holds is matched fuzzily, and only then
+    assert set(found(index, "jhon")) == {john, jon}
+    assert found(index, "jhon", fuzzy=False) == []
+    # Prefixes rank by how much of the word is typed
+    assert found(index, "jo") == [jon, john, johnson]
+    assert found(index, "jo smith") == [jon, john, johnson]
+
+
+def test_every_word_has_to_match(people):
+    store, index, add = people
+    ada = add("Ada", "Lovelace")
+    add("Ada", "Byron")
+    add("Grace", "Lovelace")
+    assert found(index, "ada love") == [ada]
+    assert found(index, "ada hopper") == []
+
+
+def test_writes_reach_the_index(people):
+    store, index, add = people
+    ada = add("Ada", "Lovelace")
+    assert found(index, "ada") == [ada]
+    store[ada] = store[ada].model_copy(
+        update={"first_name": "Augusta", "email": "augusta@example.com"}
+    )
+    assert found(index, "ada") == []
+    assert found(index, "augusta") == [ada]
+    del store[ada]
+    assert found(index, "augusta") == []
+
+
+def test_cursor_pages_through_the_ranking():
+    with TestClient(app) as client:
+        for n in range(5):
+            client.post(
+                "/persons",
+                json={
+                    "uni": f"pg{n + 1}",
+                    "first_name": "Zebulon",
+                    "last_name": f"Pager{'x' * n}",
+                    "email": f"pg{n}@example.com",
+                },
+            )
+        whole = client.get("/search?q=zebulon pager&collections=persons").json()
+        assert len(whole) == 5
+        paged, cursor = [], None
+        while True:
+            url = "/search?q=zebulon pager&collections=persons&limit=2"
+            response = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+            paged += response.json()
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                break
+        assert [hit["id"] for hit in paged] == [hit["id"] for hit in whole]
+        assert whole[0]["record"]["last_name"] == "Pager"
+        assert client.get("/search?q=zebulon&cursor=bad").status_code == 400
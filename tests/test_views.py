@@ -0,0 +1,103 @@
+"""Derived views kept in step with their store (utils/views.py)."""
+import random
+import threading
+
+import pytest
+
+import utils.views as views
+from models.destination import DestinationRead
+from resources.sqlite import SqliteDatabase, SqliteRepository
+from services.destinations import DESTINATION_FACETS, DESTINATION_INDEXES
+from utils.facets import FacetCounts
+
+
+def destination(continent: str, country: str) -> DestinationRead:
+    return DestinationRead(
+        dest_id="ABC123",
+        name="Somewhere",
+        continent=continent,
+        country=country,
+        department="d",
+    )
+
+
+def fill(store, count, seed=0):
+    rng = random.Random(seed)
+    records = [destination(rng.choice("AB"), rng.choice("xyz")) for _ in range(count)]
+    store.put_many((record.id, record) for record in records)
+    return [record.id for record in records]
+
+
+def expected(store):
+    """Facet counts of a view built from scratch, with nothing writing."""
+    return FacetCounts(store, DESTINATION_FACETS).count({})
+
+
+@pytest.fixture
+def store(make_store):
+    return make_store("destinations", DestinationRead, DESTINATION_INDEXES)
+
+
+def test_rebuild_while_writes_run(store, monkeypatch):
+    ids = fill(store, 3000)
+    monkeypatch.setattr(views, "REBUILD_CHUNK_SIZE", 50)
+    view = FacetCounts(store, DESTINATION_FACETS)
+    stop = threading.Event()
+
+    def write(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            record_id = rng.choice(ids)
+            roll = rng.random()
+            if roll < 0.4:
+                store[record_id] = destination("C", "w").model_copy(
+                    update={"id": record_id}
+                )
+            elif roll < 0.6:
+                try:
+                    del store[record_id]
+                except KeyError:
+                    pass  # another writer deleted it first
+            else:
+                record = destination("D", "v")
+                store[record.id] = record
+
+    writers = [threading.Thread(target=write, args=(seed,)) for seed in range(3)]
+    for writer in writers:
+        writer.start()
+    try:
+        view.count({})  # the first read builds the view under the writes
+    finally:
+        stop.set()
+        for writer in writers:
+            writer.join()
+    assert view.count({}) == expected(store)
+
+
+def test_catch_up_on_another_connection_s_writes(tmp_path, monkeypatch):
+    path = str(tmp_path / "store.sqlite3")
+    db, other_db = SqliteDatabase(path), SqliteDatabase(path)
+    try:
+        store, other = (
+            SqliteRepository(d, "destinations", DestinationRead, DESTINATION_INDEXES)
+            for d in (db, other_db)
+        )
+        ids = fill(store, 500)
+        view = FacetCounts(store, DESTINATION_FACETS)
+        view.count({})
+        rebuilds = view.rebuilds
+        # Writes this process's listeners never see, as from another worker
+        other.delete_many(ids[:50])
+        for record_id in ids[50:100]:
+            other[record_id] = other[record_id].model_copy(update={"continent": "Z"})
+        fill(other, 20, seed=1)
+        assert view.count({}) == expected(store)
+        assert view.rebuilds == rebuilds
+        # Past CATCH_UP_LIMIT the view rebuilds instead
+        monkeypatch.setattr(views, "CATCH_UP_LIMIT", 10)
+        other.delete_many(ids[100:150])
+        assert view.count({}) == expected(store)
+        assert view.rebuilds == rebuilds + 1
+    finally:
+        db.close()
+        other_db.close()
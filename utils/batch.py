@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Sequence
+from uuid import UUID
+
+from fastapi import HTTPException, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel
+
+from models.batch import BatchPatch, BatchResult
+from resources.repository import Repository, Write
+from utils.concurrency import MAX_WRITE_ATTEMPTS
+
+# Upper bound on the items accepted by one batch request
+MAX_BATCH_SIZE = 10_000
+
+# Status given to valid items of an atomic batch that failed as a whole
+FAILED_DEPENDENCY = 424
+
+
+def check_batch_size(items: Sequence) -> None:
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large; at most {MAX_BATCH_SIZE} items per request",
+        )
+
+
+def _validation_error(exc: RequestValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, e['loc'][1:]))}: {e['msg']}" for e in exc.errors()
+    )
+
+
+def _reject(response: Response, results: List[BatchResult]) -> List[BatchResult]:
+    """Fail an atomic batch as a whole: its valid items get 424, the batch 409."""
+    for r in results:
+        if r.status < 400:
+            r.status = FAILED_DEPENDENCY
+            r.error = "Not applied: another item in the atomic batch failed"
+    response.status_code = 409
+    return results
+
+
+def _failed(results: Iterable[BatchResult]) -> bool:
+    return any(r.status >= 400 for r in results)
+
+
+def _too_fast(result: BatchResult) -> None:
+    result.status = 409
+    result.error = "The record is changing too fast; retry the item"
+
+
+def _retry(writes: List[Write], conflicts: List[int], atomic: bool) -> List[UUID]:
+    """IDs to read again after a conflict: all of them if nothing was written."""
+    if atomic:
+        return [w.record_id for w in writes]
+    return [writes[position].record_id for position in conflicts]
+
+
+def batch_create(
+    store: Repository,
+    items: Sequence[BaseModel],
+    build: Callable[[BaseModel], BaseModel],
+    response: Response,
+    atomic: bool,
+    check_existing: bool = False,
+) -> List[BatchResult]:
+    """
+    Build a Read record for every create payload and insert them in one store
+    transaction, each only if its ID is not taken. `check_existing` says the IDs
+    are client-supplied (a taken ID is the client's error); server-generated IDs
+    that collide are reported as a retryable fluke.
+    """
+    check_batch_size(items)
+    results: List[BatchResult] = []
+    writes: List[Write] = []
+    positions: List[BatchResult] = []
+    seen = set()
+    for i, item in enumerate(items):
+        try:
+            record = build(item)
+        except RequestValidationError as exc:
+            results.append(
+                BatchResult(index=i, status=422, error=_validation_error(exc))
+            )
+            continue
+        if record.id in seen:
+            results.append(
+                BatchResult(index=i, id=record.id, status=400, error="ID already exists")
+            )
+            continue
+        seen.add(record.id)
+        result = BatchResult(index=i, id=record.id, status=201)
+        results.append(result)
+        writes.append(Write(record.id, None, record))
+        positions.append(result)
+    if _failed(results) and atomic:
+        return _reject(response, results)
+    error = "ID already exists"
+    if not check_existing:
+        error = "Generated ID collision; retry the item"
+    for position in store.compare_and_set_many(writes, atomic):
+        positions[position].status, positions[position].error = 400, error
+    if _failed(results) and atomic:
+        return _reject(response, results)
+    return results
+
+
+def batch_update(
+    store: Repository,
+    items: Sequence[BatchPatch],
+    apply_update: Callable[[BaseModel, BaseModel], BaseModel],
+    response: Response,
+    atomic: bool,
+) -> List[BatchResult]:
+    """
+    Apply every patch on top of the current record (or on top of an earlier
+    patch to the same record in this batch) and write the results in one store
+    transaction, each record only at the version its patches were applied to.
+    Records written by someone else meanwhile are re-read and patched again.
+    """
+    check_batch_size(items)
+    results = [
+        BatchResult(index=i, id=item.id, status=200) for i, item in enumerate(items)
+    ]
+    by_id: Dict[UUID, List[int]] = {}
+    for i, item in enumerate(items):
+        by_id.setdefault(item.id, []).append(i)
+    todo = list(by_id)
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        writes: List[Write] = []
+        for record_id in todo:
+            version = store.version(record_id)
+            existing = None if version is None else store.get(record_id)
+            record = existing
+            for i in by_id[record_id]:
+                result = results[i]
+                if existing is None:
+                    result.status, result.error = 404, "Not found"
+                    continue
+                try:
+                    record = apply_update(record, items[i].update)
+                except RequestValidationError as exc:
+                    result.status, result.error = 422, _validation_error(exc)
+                    continue
+                result.status, result.error = 200, None
+            if record is not existing:
+                writes.append(Write(record_id, version, record, existing))
+        if _failed(results) and atomic:
+            return _reject(response, results)
+        conflicts = store.compare_and_set_many(writes, atomic)
+        if not conflicts:
+            return results
+        # Atomic batches wrote nothing, so every record is read again
+        todo = _retry(writes, conflicts, atomic)
+    for record_id in todo:
+        for i in by_id[record_id]:
+            if results[i].status < 400:
+                _too_fast(results[i])
+    if atomic:
+        return _reject(response, results)
+    return results
+
+
+def batch_delete(
+    store: Repository, ids: Sequence[UUID], response: Response, atomic: bool
+) -> List[BatchResult]:
+    """Delete the records in one store transaction, each at the version found."""
+    check_batch_size(ids)
+    results = [
+        BatchResult(index=i, id=record_id, status=204)
+        for i, record_id in enumerate(ids)
+    ]
+    first: Dict[UUID, int] = {}
+    for i, record_id in enumerate(ids):
+        if record_id in first:
+            results[i].status, results[i].error = 404, "Not found"
+        else:
+            first[record_id] = i
+    todo = list(first)
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        writes: List[Write] = []
+        for record_id in todo:
+            version = store.version(record_id)
+            if version is None:
+                results[first[record_id]].status = 404
+                results[first[record_id]].error = "Not found"
+            else:
+                writes.append(Write(record_id, version, None))
+        if _failed(results) and atomic:
+            return _reject(response, results)
+        conflicts = store.compare_and_set_many(writes, atomic)
+        if not conflicts:
+            return results
+        todo = _retry(writes, conflicts, atomic)
+    for record_id in todo:
+        _too_fast(results[first[record_id]])
+    if atomic:
+        return _reject(response, results)
+    return results
@@ -0,0 +1,238 @@
+"""
+Columnar mirror of a store for aggregate queries.
+
+A collection declares dimensions (values to filter and group on) and measures
+(numbers to sum), each as a key function, like its index spec. The mirror keeps
+one compact array per column, one row per record: dimensions dictionary-encoded
+to int codes, measures as floats (NaN when the field is None). Rows of deleted
+records are reused by later inserts.
+
+With NumPy installed, aggregations are vectorized over the arrays (zero-copy
+views); without it they fall back to a Python loop over the same arrays.
+NumPy is imported by the first aggregation rather than with this module: it is
+the largest import of the app and nothing else needs it.
+"""
+from __future__ import annotations
+
+import math
+from array import array
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from resources.repository import Repository
+from utils.symbols import SymbolTable, shared_symbols
+from utils.views import StoreView
+
+Dimension = Callable[[BaseModel], Hashable]
+Measure = Callable[[BaseModel], Optional[float]]
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    try:
+        import numpy
+    except ImportError:  # optional: aggregations then run as a Python loop
+        return None
+    return numpy
+
+
+class Dictionary:
+    """Dictionary encoding of one dimension: each distinct value gets a dense code."""
+
+    def __init__(self, symbols: Optional[SymbolTable] = None):
+        self.codes: Dict[Hashable, int] = {}
+        self.values: List[Hashable] = []
+        self.symbols = symbols
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: Hashable) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            if self.symbols is not None:
+                value = self.symbols.intern(value)
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+@dataclass
+class Group:
+    """Aggregates of the rows sharing one dimension value (key None: all rows)."""
+
+    key: Optional[Hashable]
+    rows: int = 0
+    # measure -> sum of its non-null values, and how many there were
+    sums: Dict[str, float] = field(default_factory=dict)
+    counts: Dict[str, int] = field(default_factory=dict)
+
+
+def combine(groups: List[Group]) -> Group:
+    """The aggregates of several groups taken together (keyed None)."""
+    total = Group(key=None)
+    for group in groups:
+        total.rows += group.rows
+        for name, value in group.sums.items():
+            total.sums[name] = total.sums.get(name, 0.0) + value
+        for name, value in group.counts.items():
+            total.counts[name] = total.counts.get(name, 0) + value
+    return total
+
+
+class ColumnarMirror(StoreView):
+    def __init__(
+        self,
+        store: Repository,
+        dimensions: Dict[str, Dimension],
+        measures: Dict[str, Measure],
+    ):
+        self.dimensions = dimensions
+        self.measures = measures
+        self.reset()
+        super().__init__(store)
+
+    def reset(self) -> None:
+        self.rows: Dict[UUID, int] = {}
+        self.free: List[int] = []
+        self.live = array("b")
+        self.dictionaries = {
+            name: Dictionary(shared_symbols(name)) for name in self.dimensions
+        }
+        self.codes = {name: array("i") for name in self.dimensions}
+        self.values = {name: array("d") for name in self.measures}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, record_id: UUID, record: BaseModel) -> None:
+        codes = {
+            name: self.dictionaries[name].encode(key(record))
+            for name, key in self.dimensions.items()
+        }
+        values = {}
+        for name, key in self.measures.items():
+            value = key(record)
+            values[name] = math.nan if value is None else float(value)
+        if self.free:
+            row = self.free.pop()
+            self.live[row] = 1
+            for name, code in codes.items():
+                self.codes[name][row] = code
+            for name, value in values.items():
+                self.values[name][row] = value
+        else:
+            row = len(self.live)
+            self.live.append(1)
+            for name, code in codes.items():
+                self.codes[name].append(code)
+            for name, value in values.items():
+                self.values[name].append(value)
+        self.rows[record_id] = row
+
+    def remove(self, record_id: UUID) -> None:
+        row = self.rows.pop(record_id, None)
+        if row is not None:
+            self.live[row] = 0
+            self.free.append(row)
+
+    # ----------------------------------------------------------------- query
+    def aggregate(
+        self, filters: Dict[str, Hashable], group_by: Optional[str] = None
+    ) -> List[Group]:
+        """
+        Row counts and measure sums over the rows matching every (dimension ==
+        value) filter, per value of `group_by` (one group keyed None if not
+        grouped). Groups come largest first.
+        """
+        with self.current():
+            wanted = {}
+            for name, value in filters.items():
+                code = self.dictionaries[name].codes.get(value)
+                if code is None:
+                    return []
+                wanted[name] = code
+            np = _numpy()
+            if np is not None:
+                groups = self._aggregate_numpy(np, wanted, group_by)
+            else:
+                groups = self._aggregate_python(wanted, group_by)
+            if group_by is not None:
+                keys = self.dictionaries[group_by].values
+                for group in groups:
+                    group.key = keys[group.key]
+        groups.sort(key=lambda g: (-g.rows, str(g.key)))
+        return groups
+
+    def _aggregate_numpy(
+        self, np, wanted: Dict[str, int], group_by: Optional[str]
+    ) -> List[Group]:
+        # frombuffer views share the arrays' memory; only copies outlive the lock
+        mask = np.frombuffer(self.live, dtype=np.int8) == 1
+        for name, code in wanted.items():
+            mask &= np.frombuffer(self.codes[name], dtype=np.intc) == code
+        # Selecting every row would only copy the columns
+        select = slice(None) if mask.all() else mask
+        if group_by is None:
+            rows = np.count_nonzero(mask)
+            if not rows:
+                return []
+            group = Group(key=None, rows=int(rows))
+            for name in self.measures:
+                values = np.frombuffer(self.values[name], dtype=np.float64)[select]
+                group.sums[name] = float(np.nansum(values))
+                group.counts[name] = int(rows - np.count_nonzero(np.isnan(values)))
+            return [group]
+        codes = np.frombuffer(self.codes[group_by], dtype=np.intc)[select]
+        codes = codes.astype(np.intp)
+        size = len(self.dictionaries[group_by])
+        rows = np.bincount(codes, minlength=size)
+        sums, counts = {}, {}
+        for name in self.measures:
+            values = np.frombuffer(self.values[name], dtype=np.float64)[select]
+            missing = np.isnan(values)
+            if missing.any():
+                values = np.where(missing, 0.0, values)
+                counts[name] = rows - np.bincount(codes[missing], minlength=size)
+            else:
+                counts[name] = rows
+            sums[name] = np.bincount(codes, weights=values, minlength=size)
+        return [
+            Group(
+                key=int(code),
+                rows=int(rows[code]),
+                sums={name: float(sums[name][code]) for name in self.measures},
+                counts={name: int(counts[name][code]) for name in self.measures},
+            )
+            for code in np.flatnonzero(rows)
+        ]
+
+    def _aggregate_python(
+        self, wanted: Dict[str, int], group_by: Optional[str]
+    ) -> List[Group]:
+        filters = [(self.codes[name], code) for name, code in wanted.items()]
+        group_codes = None if group_by is None else self.codes[group_by]
+        measures = [(name, self.values[name]) for name in self.measures]
+        groups: Dict[Optional[int], Group] = {}
+        for row, alive in enumerate(self.live):
+            if not alive or any(column[row] != code for column, code in filters):
+                continue
+            key = None if group_codes is None else group_codes[row]
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = Group(
+                    key=key,
+                    sums={name: 0.0 for name in self.measures},
+                    counts={name: 0 for name in self.measures},
+                )
+            group.rows += 1
+            for name, column in measures:
+                value = column[row]
+                if value == value:  # not NaN
+                    group.sums[name] += value
+                    group.counts[name] += 1
+        return list(groups.values())
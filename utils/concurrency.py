@@ -0,0 +1,91 @@
+"""
+Helpers for the async CRUD handlers: running store calls without blocking the
+event loop, per-record locks, and version-checked (If-Match) writes.
+"""
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+from uuid import UUID
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from resources.repository import Repository
+from utils.etag import if_match_allows, record_etag
+
+T = TypeVar("T")
+
+# Compare-and-set rounds before a write that keeps losing races gives up
+MAX_WRITE_ATTEMPTS = 10
+
+
+async def run_store(store: Repository, func: Callable[..., T], *args, **kwargs) -> T:
+    """Call a store method inline, or in the threadpool if the store may block."""
+    if store.blocking:
+        return await run_in_threadpool(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+class KeyedLocks:
+    """asyncio locks created per key on demand and dropped once nobody uses them."""
+
+    def __init__(self):
+        # key -> (lock, holders + waiters)
+        self._locks: Dict[Hashable, Tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        lock, users = self._locks.get(key) or (asyncio.Lock(), 0)
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+
+async def conditional_write(
+    store: Repository,
+    locks: KeyedLocks,
+    record_id: UUID,
+    request: Request,
+    change: Callable[[BaseModel], Optional[BaseModel]],
+    not_found: str,
+) -> Tuple[Optional[BaseModel], int]:
+    """
+    Read-modify-write one record: `change(existing)` returns the new record, or
+    None to delete it. Returns (new record, version written).
+
+    Writers in this process queue on the record's lock; the write itself is a
+    compare-and-set on the version read, so a concurrent write from a batch
+    request or another worker is never overwritten: the change is recomputed
+    on the newer record, or, when the client sent If-Match, the request fails
+    with 412 because the tag it named is no longer current.
+    """
+    async with locks.hold(record_id):
+        for _ in range(MAX_WRITE_ATTEMPTS):
+            version = await run_store(store, store.version, record_id)
+            etag = None if version is None else record_etag(store, version)
+            if not if_match_allows(request, etag):
+                raise HTTPException(status_code=412, detail="Precondition failed")
+            if version is None:
+                raise HTTPException(status_code=404, detail=not_found)
+            existing = await run_store(store, store.get, record_id)
+            if existing is None:
+                continue  # deleted since the version was read
+            record = await run_store(store, change, existing)
+            written = await run_store(
+                store, store.compare_and_set, record_id, version, record, existing
+            )
+            if written is not None:
+                return record, written
+    raise HTTPException(
+        status_code=409, detail="The record is changing too fast; retry the request"
+    )
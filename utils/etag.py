@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Optional, Tuple, Union
+
+from fastapi import Request, Response
+
+from resources.repository import Repository
+from utils.ndjson import wants_ndjson
+
+# A store generation, or a joined_generation() over two stores
+Generation = Union[int, str]
+
+# OpenAPI documentation for the conditional GET endpoints
+NOT_MODIFIED_RESPONSES: Dict[int, dict] = {
+    304: {"description": "Not modified: the If-None-Match ETag is still current"}
+}
+
+# ... and for the writes that honour If-Match
+PRECONDITION_FAILED_RESPONSES: Dict[int, dict] = {
+    412: {"description": "Precondition failed: the If-Match ETag is no longer current"}
+}
+
+
+def normalized_query(request: Request) -> Tuple[Tuple[str, str], ...]:
+    """
+    The query parameters in a canonical order: requests that differ only in
+    parameter order get the same list ETag and response cache entry.
+    """
+    return tuple(sorted(request.query_params.multi_items()))
+
+
+def record_etag(store: Repository, version: Generation) -> str:
+    """
+    Strong ETag of one record at `version`. Look the version up before the
+    record itself, for the same reason as in list_etag().
+    """
+    return f'"{store.epoch}.{version}"'
+
+
+def list_etag(
+    store: Repository, request: Request, generation: Optional[Generation] = None
+) -> str:
+    """
+    Strong ETag of a list response. The body only depends on the store's
+    contents, the query (normalized_query) and the negotiated media type, so it
+    is the same for as long as the generation does not move. Read this before
+    running the query: a write in between then yields a stale tag (one extra
+    200 later), never a stale 304. Pass `generation` if it has been read already (see
+    joined_generation for responses that read a second store).
+    """
+    if generation is None:
+        generation = store.generation
+    variant = repr(normalized_query(request))
+    if wants_ndjson(request):
+        variant += "|ndjson"
+    digest = hashlib.blake2b(variant.encode(), digest_size=8).hexdigest()
+    return f'"{store.epoch}.g{generation}.{digest}"'
+
+
+def joined_generation(generation: int, joined: Repository) -> str:
+    """
+    Generation of a response built from two stores (e.g. records with their
+    references expanded): it moves whenever either store is written.
+    """
+    return f"{generation}+{joined.epoch}.{joined.generation}"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match names `etag` (weak comparison, as RFC 9110 asks)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag for candidate in header.split(",")
+    )
+
+
+def if_match_allows(request: Request, etag: Optional[str]) -> bool:
+    """
+    Whether a write may go ahead under If-Match. `etag` is the record's current
+    tag, None if it does not exist. Comparison is strong: W/ tags never match.
+    """
+    header = request.headers.get("if-match")
+    if header is None:
+        return True
+    if etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip() == etag for candidate in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,120 @@
+"""
+Hierarchical facet counts of a store (e.g. continent -> country).
+
+A collection declares its facet levels, outermost first, as key functions
+named after the store indexes they match. The view counts records per full
+path of level values and remembers each record's path (one shared tuple per
+distinct path); each write moves one path's count, whatever the size of the
+store. A query restricts the paths to the filtered level values and
+rolls them up into a tree, so it costs the number of distinct paths, not
+the number of records.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from typing import Callable, Dict, Hashable, Iterable, List, Tuple
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from resources.repository import Repository
+from utils.planner import Filters
+from utils.symbols import SymbolTable, shared_symbols
+from utils.views import StoreView
+
+Level = Callable[[BaseModel], Hashable]
+Path = Tuple[Hashable, ...]
+
+# Records read per chunk when a filter outside the hierarchy is counted
+COUNT_CHUNK_SIZE = 1000
+
+
+def facet_tree(names: List[str], counts: Iterable[Tuple[Path, int]]) -> dict:
+    """Roll (path, count) pairs up into nested facets, largest first."""
+    root = {"total": 0, "facets": {}}
+    for path, count in counts:
+        root["total"] += count
+        node = root
+        for name, value in zip(names, path):
+            facets = node["facets"]
+            node = facets.get(value)
+            if node is None:
+                node = facets[value] = {
+                    "field": name,
+                    "value": value,
+                    "count": 0,
+                    "facets": {},
+                }
+            node["count"] += count
+
+    def finish(facets: Dict[Hashable, dict]) -> List[dict]:
+        ordered = sorted(facets.values(), key=lambda f: (-f["count"], str(f["value"])))
+        for facet in ordered:
+            facet["facets"] = finish(facet["facets"])
+        return ordered
+
+    root["facets"] = finish(root["facets"])
+    return root
+
+
+class FacetCounts(StoreView):
+    def __init__(self, store: Repository, levels: Dict[str, Level]):
+        self.levels = levels
+        self.names = list(levels)
+        self.symbols = [shared_symbols(name) for name in self.names]
+        self.reset()
+        super().__init__(store)
+
+    def reset(self) -> None:
+        self.counts: Counter = Counter()
+        # record ID -> its path, the tuple object also keying `counts`
+        self.paths: Dict[UUID, Path] = {}
+        self.path_symbols = SymbolTable()
+
+    def path(self, record: BaseModel) -> Path:
+        return tuple(key(record) for key in self.levels.values())
+
+    def add(self, record_id: UUID, record: BaseModel) -> None:
+        path = self.path(record)
+        if path not in self.counts:
+            path = tuple(
+                value if symbols is None else symbols.intern(value)
+                for symbols, value in zip(self.symbols, path)
+            )
+        path = self.path_symbols.intern(path)
+        self.counts[path] += 1
+        self.paths[record_id] = path
+
+    def remove(self, record_id: UUID) -> None:
+        path = self.paths.pop(record_id, None)
+        if path is None:
+            return
+        count = self.counts[path] - 1
+        if count > 0:
+            self.counts[path] = count
+        else:
+            del self.counts[path]
+            self.path_symbols.discard(path)
+
+    def count(self, filters: Filters) -> dict:
+        """
+        Facet tree of the records matching `filters` (as for Repository.find).
+        Filters on facet levels are answered from the counts; any other filter
+        means counting the records the store's indexes select.
+        """
+        if isinstance(filters, dict):
+            filters = filters.items()
+        filters = [(name, value) for name, value in filters if value is not None]
+        if any(name not in self.levels for name, _ in filters):
+            counts = Counter()
+            for records in self.store.scan(filters, None, COUNT_CHUNK_SIZE):
+                counts.update(self.path(record) for record in records)
+            return facet_tree(self.names, counts.items())
+        wanted = [(self.names.index(name), value) for name, value in filters]
+        with self.current():
+            selected = [
+                (path, count)
+                for path, count in self.counts.items()
+                if all(path[level] == value for level, value in wanted)
+            ]
+        return facet_tree(self.names, selected)
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import threading
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+)
+from uuid import UUID
+
+from utils.pagination import InsertionOrder
+
+# A key function returns every value a record should be indexed under
+# (one value for plain fields, several for fields inside embedded lists).
+KeyFunc = Callable[[object], Iterable[Hashable]]
+
+
+class HashIndex:
+    """Secondary index mapping a field value to the IDs of the records holding it."""
+
+    def __init__(self, key: KeyFunc):
+        self.key = key
+        # value -> {record_id: None}; a dict keeps the IDs in insertion order
+        self._buckets: Dict[Hashable, Dict[UUID, None]] = {}
+
+    def __len__(self) -> int:
+        """Number of distinct indexed values."""
+        return len(self._buckets)
+
+    def _bucket(self, value: Hashable) -> Dict[UUID, None]:
+        bucket = self._buckets.get(value)
+        if bucket is None:
+            bucket = self._buckets[value] = {}
+        return bucket
+
+    def add(self, record_id: UUID, record: object) -> None:
+        for value in set(self.key(record)):
+            self._bucket(value)[record_id] = None
+
+    def discard(self, record_id: UUID, record: object) -> None:
+        for value in set(self.key(record)):
+            bucket = self._buckets.get(value)
+            if bucket is None:
+                continue
+            bucket.pop(record_id, None)
+            if not bucket:
+                del self._buckets[value]
+
+    def replace(self, record_id: UUID, old: object, new: object) -> None:
+        """Move a record between buckets, touching only the values that changed."""
+        old_values = set(self.key(old))
+        new_values = set(self.key(new))
+        if old_values == new_values:
+            return
+        for value in old_values - new_values:
+            bucket = self._buckets[value]
+            del bucket[record_id]
+            if not bucket:
+                del self._buckets[value]
+        for value in new_values - old_values:
+            self._bucket(value)[record_id] = None
+
+    def lookup(self, value: Hashable) -> Mapping[UUID, None]:
+        """IDs of the records indexed under `value` (empty if none)."""
+        return self._buckets.get(value, {})
+
+    def estimate(self, value: Hashable) -> int:
+        """Cardinality estimate for an equality predicate (exact for a hash index)."""
+        bucket = self._buckets.get(value)
+        return 0 if bucket is None else len(bucket)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+class StoreListener(Protocol):
+    """
+    Observer of the writes made to an IndexedDict. Hooks run under the store lock
+    and may return a callable that the writer runs once the lock is released
+    (e.g. to wait for a log flush without blocking other writers).
+    """
+
+    # True if that callable waits for I/O (a WAL fsync): writers then block
+    blocks_writers: bool
+
+    def on_put(self, record_id: UUID, new: object) -> Optional[Callable[[], None]]: ...
+
+    def on_delete(self, record_id: UUID) -> Optional[Callable[[], None]]: ...
+
+
+def run_deferred(deferred: List[Optional[Callable[[], None]]]) -> None:
+    for callback in deferred:
+        if callback is not None:
+            callback()
+
+
+class IndexedDict(dict):
+    """
+    A dict of records that keeps a set of HashIndex objects and the insertion
+    order used for paging in sync on every write, and notifies its listeners.
+    Reads are plain dict reads; writes go through __setitem__/__delitem__ and are
+    serialized by `lock`. Every write bumps `generation`, and `versions` maps each
+    record to the generation of its last write.
+    """
+
+    def __init__(self, indexes: Dict[str, KeyFunc]):
+        super().__init__()
+        self.indexes: Dict[str, HashIndex] = {
+            name: HashIndex(key) for name, key in indexes.items()
+        }
+        self.order = InsertionOrder()
+        self.listeners: List[StoreListener] = []
+        self.lock = threading.RLock()
+        self.versions: Dict[UUID, int] = {}
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def version(self, record_id: UUID) -> Optional[int]:
+        return self.versions.get(record_id)
+
+    def subscribe(self, listener: StoreListener) -> None:
+        self.listeners.append(listener)
+
+    def _pack(self, record: object) -> object:
+        """
+        The value actually held for `record`. Records are held as they are; a
+        subclass may hold a compact form instead, decoding it again in
+        __getitem__/get/values/items.
+        """
+        return record
+
+    def _put(self, record_id: UUID, record: object, old: Optional[object] = None) -> List:
+        # Caller holds self.lock; returns the listeners' deferred callbacks. `old`
+        # is the stored record if the caller has it already (saves decoding it)
+        if old is None:
+            old = self.get(record_id)
+        super().__setitem__(record_id, self._pack(record))
+        if old is None:
+            self.order.add(record_id)
+        self._generation += 1
+        self.versions[record_id] = self._generation
+        for index in self.indexes.values():
+            if old is None:
+                index.add(record_id, record)
+            else:
+                index.replace(record_id, old, record)
+        return [l.on_put(record_id, record) for l in self.listeners]
+
+    def _delete(self, record_id: UUID, old: Optional[object] = None) -> List:
+        if old is None:
+            old = self[record_id]
+        super().__delitem__(record_id)
+        self.order.discard(record_id)
+        self._generation += 1
+        del self.versions[record_id]
+        for index in self.indexes.values():
+            index.discard(record_id, old)
+        return [l.on_delete(record_id) for l in self.listeners]
+
+    def __setitem__(self, record_id: UUID, record: object) -> None:
+        with self.lock:
+            deferred = self._put(record_id, record)
+        run_deferred(deferred)
+
+    def __delitem__(self, record_id: UUID) -> None:
+        with self.lock:
+            deferred = self._delete(record_id)
+        run_deferred(deferred)
+
+    def put_many(self, items: Iterable[Tuple[UUID, object]]) -> None:
+        """Write several records under one lock hold; other writers see all or none."""
+        deferred: List = []
+        with self.lock:
+            for record_id, record in items:
+                deferred.extend(self._put(record_id, record))
+        run_deferred(deferred)
+
+    def compare_and_set(
+        self,
+        record_id: UUID,
+        expected_version: int,
+        record: Optional[object],
+        current: Optional[object] = None,
+    ) -> Optional[int]:
+        """Put (or delete, if `record` is None) only at `expected_version`."""
+        with self.lock:
+            if self.versions.get(record_id) != expected_version:
+                return None
+            # The version matched, so `current` (if given) is what is stored
+            if record is None:
+                deferred = self._delete(record_id, current)
+            else:
+                deferred = self._put(record_id, record, current)
+            generation = self._generation
+        run_deferred(deferred)
+        return generation
+
+    def compare_and_set_many(
+        self, writes: Sequence, atomic: bool = True
+    ) -> List[int]:
+        """
+        compare_and_set for several records under one lock hold (writes as in
+        resources.repository.Write); returns the positions that failed the check.
+        """
+        deferred: List = []
+        with self.lock:
+            failed = [
+                position
+                for position, write in enumerate(writes)
+                if self.versions.get(write.record_id) != write.expected_version
+            ]
+            if not (failed and atomic):
+                skip = set(failed)
+                for position, write in enumerate(writes):
+                    if position in skip:
+                        continue
+                    if write.record is None:
+                        deferred.extend(self._delete(write.record_id, write.current))
+                    else:
+                        deferred.extend(
+                            self._put(write.record_id, write.record, write.current)
+                        )
+        run_deferred(deferred)
+        return failed
+
+    def delete_many(self, record_ids: Iterable[UUID]) -> None:
+        """Delete several records under one lock hold (all must exist)."""
+        deferred: List = []
+        with self.lock:
+            record_ids = list(record_ids)
+            missing = [rid for rid in record_ids if rid not in self]
+            if missing:
+                raise KeyError(missing[0])
+            for record_id in record_ids:
+                deferred.extend(self._delete(record_id))
+        run_deferred(deferred)
+
+    def pop(self, record_id: UUID, *default):
+        with self.lock:
+            if record_id not in self:
+                if default:
+                    return default[0]
+                raise KeyError(record_id)
+            record = self[record_id]
+            del self[record_id]
+            return record
+
+    def setdefault(self, record_id: UUID, default=None):
+        with self.lock:
+            if record_id not in self:
+                self[record_id] = default
+            return self[record_id]
+
+    def update(self, *args, **kwargs) -> None:
+        self.put_many(dict(*args, **kwargs).items())
+
+    def popitem(self):
+        record_id = next(reversed(self))
+        return record_id, self.pop(record_id)
+
+    def clear(self) -> None:
+        """Drop every record (without notifying listeners)."""
+        with self.lock:
+            super().clear()
+            self.order.clear()
+            self.versions.clear()
+            self._generation += 1
+            for index in self.indexes.values():
+                index.clear()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# OpenAPI `responses=` entry advertising the streaming representation
+NDJSON_RESPONSES = {
+    200: {
+        "content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}},
+        "description": "One JSON record per line when requested via Accept.",
+    }
+}
+
+# Records serialized per yielded chunk
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_ndjson(request: Request) -> bool:
+    """True if the client asked for newline-delimited JSON in its Accept header."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def streams_all(request: Request, limit: Optional[int], explain: bool) -> bool:
+    """
+    True if a list request asks for every matching record as one NDJSON stream.
+
+    With an explicit `limit` the handler serves a single page instead, so the
+    response can carry X-Next-Cursor and X-Query-Plan like the JSON one does.
+    """
+    if not wants_ndjson(request) or limit is not None:
+        return False
+    if explain:
+        raise HTTPException(
+            status_code=400, detail="explain requires limit when streaming NDJSON"
+        )
+    return True
+
+
+def iter_ndjson(chunks: Iterable[List[bytes]]) -> Iterable[bytes]:
+    """Join chunks of encoded records (scan(raw=True)) into NDJSON lines."""
+    for chunk in chunks:
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+
+
+def ndjson_response(
+    chunks: Iterable[List[bytes]], headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """Stream chunks of encoded records, e.g. those of Repository.scan(raw=True)."""
+    return StreamingResponse(
+        iter_ndjson(chunks), media_type=NDJSON_MEDIA_TYPE, headers=headers
+    )
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import base64
+import heapq
+from bisect import bisect_right
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+# Defaults shared by every collection GET
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InsertionOrder:
+    """
+    Gives every record a sequence number at insert time and keeps the live records
+    in that order. Deletes leave tombstones that are compacted away in bulk, so a
+    position (sequence number) never shifts under a paging client.
+    """
+
+    def __init__(self):
+        self._counter = count(1)
+        # Parallel append-only lists, sorted by sequence number
+        self._seqs: List[int] = []
+        self._ids: List[UUID] = []
+        self._seq_of: Dict[UUID, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._seq_of)
+
+    def add(self, record_id: UUID) -> int:
+        seq = next(self._counter)
+        self._seq_of[record_id] = seq
+        self._seqs.append(seq)
+        self._ids.append(record_id)
+        return seq
+
+    def discard(self, record_id: UUID) -> None:
+        if self._seq_of.pop(record_id, None) is None:
+            return
+        if len(self._seqs) > 2 * len(self._seq_of) + 1024:
+            self._compact()
+
+    def clear(self) -> None:
+        self._seqs, self._ids = [], []
+        self._seq_of.clear()
+
+    def seq(self, record_id: UUID) -> Optional[int]:
+        return self._seq_of.get(record_id)
+
+    def _compact(self) -> None:
+        # Build new lists and swap them in, so a concurrent walk keeps its old view
+        live = [(s, rid) for s, rid in zip(self._seqs, self._ids) if self._seq_of.get(rid) == s]
+        self._seqs = [s for s, _ in live]
+        self._ids = [rid for _, rid in live]
+
+    def page(self, after: int, limit: int) -> Tuple[List[UUID], Optional[int]]:
+        """
+        Up to `limit` live IDs with a sequence number greater than `after`, and the
+        sequence number to resume from (None when the walk reached the end).
+        """
+        seqs, ids, seq_of = self._seqs, self._ids, self._seq_of
+        out: List[UUID] = []
+        last = after
+        for i in range(bisect_right(seqs, after), len(seqs)):
+            rid = ids[i]
+            if seq_of.get(rid) == seqs[i]:
+                if len(out) == limit:
+                    return out, last
+                out.append(rid)
+                last = seqs[i]
+        return out, None
+
+
+def encode_cursor(seq: int) -> str:
+    return base64.urlsafe_b64encode(f"s:{seq}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Sequence number encoded in `cursor`; raises ValueError on a malformed cursor."""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    prefix, _, seq = raw.partition(":")
+    if prefix != "s" or not seq.isdigit():
+        raise ValueError("Invalid cursor")
+    return int(seq)
+
+
+def paginate(
+    order: InsertionOrder, ids: Optional[List[UUID]], cursor: Optional[str], limit: int
+) -> Tuple[List[UUID], Optional[str]]:
+    """
+    One page of record IDs in insertion order, plus the cursor for the next page.
+    `ids` is the planner's candidate list, or None to walk the whole collection.
+    """
+    after = decode_cursor(cursor)
+    if ids is None:
+        page, resume = order.page(after, limit)
+        return page, None if resume is None else encode_cursor(resume)
+
+    keyed = ((order.seq(rid), rid) for rid in ids)
+    window = heapq.nsmallest(
+        limit + 1, ((s, rid) for s, rid in keyed if s is not None and s > after)
+    )
+    if len(window) > limit:
+        return [rid for _, rid in window[:limit]], encode_cursor(window[limit - 1][0])
+    return [rid for _, rid in window], None
+
@@ -0,0 +1,43 @@
+"""
+Field-level PATCH engine shared by the update handlers.
+
+Instead of dumping the stored record to a dict, merging and validating a whole
+new Read model (every nested address and embedded conversion included), a
+patch makes a shallow copy of the stored record and validates and assigns only
+the fields present in the update. Unchanged nested objects are shared with the
+stored record, which is never modified in place (copy-on-write), so the cost is
+proportional to the size of the patch rather than the size of the record.
+"""
+from __future__ import annotations
+
+from typing import TypeVar
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def apply_patch(existing: ModelT, update: BaseModel, **changes: object) -> ModelT:
+    """
+    A new record equal to `existing` with the fields set in `update` (and any
+    server-side `changes`, e.g. updated_at) replaced. Each value is validated
+    against the stored model's own field definition, so a patch cannot produce
+    a record the model would reject (e.g. null for a required field); such a
+    patch raises RequestValidationError, which FastAPI answers with 422.
+    """
+    patched = existing.model_copy()
+    validator = patched.__pydantic_validator__
+    fields = {name: getattr(update, name) for name in update.model_fields_set}
+    fields.update(changes)
+    try:
+        for name, value in fields.items():
+            validator.validate_assignment(patched, name, value)
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [
+                {**error, "loc": ("body", *error["loc"])}
+                for error in exc.errors(include_url=False)
+            ]
+        )
+    return patched
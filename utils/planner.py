@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple, Union
+from uuid import UUID
+
+from utils.indexes import IndexedDict
+
+
+@dataclass
+class PlanStep:
+    """One predicate of a plan: which index was probed and how many rows it touched."""
+
+    index: str
+    value: Hashable
+    estimate: int
+    distinct: int
+    rows_in: int = 0
+    rows_out: int = 0
+
+
+@dataclass
+class QueryPlan:
+    """Equality predicates ordered most-selective first, plus the IDs they produced."""
+
+    collection: str
+    steps: List[PlanStep] = field(default_factory=list)
+    ids: Optional[List[UUID]] = None
+
+    @property
+    def full_scan(self) -> bool:
+        return not self.steps
+
+    def explain(self) -> Dict[str, object]:
+        return {
+            "collection": self.collection,
+            "plan": "full_scan" if self.full_scan else "index_intersection",
+            "steps": [
+                {
+                    "index": s.index,
+                    "value": str(s.value),
+                    "estimate": s.estimate,
+                    "distinct": s.distinct,
+                    "rows_in": s.rows_in,
+                    "rows_out": s.rows_out,
+                }
+                for s in self.steps
+            ],
+            "rows": None if self.ids is None else len(self.ids),
+        }
+
+
+Filters = Union[
+    Dict[str, Optional[Hashable]], Iterable[Tuple[str, Optional[Hashable]]]
+]
+
+
+def plan_query(store: IndexedDict, filters: Filters, collection: str = "") -> QueryPlan:
+    """
+    Build and run a plan for the equality filters in `filters` (index name -> value,
+    or (index name, value) pairs when two filters share an index; None means
+    "not filtered"). Predicates are ordered by their cardinality estimate
+    and intersected smallest-first, stopping as soon as the candidate set is empty.
+    With no filters the plan is a full scan and `ids` stays None.
+    """
+    plan = QueryPlan(collection=collection)
+    if isinstance(filters, dict):
+        filters = filters.items()
+    for name, value in filters:
+        if value is None:
+            continue
+        index = store.indexes[name]
+        plan.steps.append(
+            PlanStep(
+                index=name,
+                value=value,
+                estimate=index.estimate(value),
+                distinct=len(index),
+            )
+        )
+    if plan.full_scan:
+        return plan
+
+    plan.steps.sort(key=lambda s: s.estimate)
+    first, rest = plan.steps[0], plan.steps[1:]
+    candidates = list(store.indexes[first.index].lookup(first.value))
+    first.rows_in = first.rows_out = len(candidates)
+    for step in rest:
+        step.rows_in = len(candidates)
+        if not candidates:
+            break
+        bucket = store.indexes[step.index].lookup(step.value)
+        candidates = [rid for rid in candidates if rid in bucket]
+        step.rows_out = len(candidates)
+    plan.ids = candidates
+    return plan
@@ -0,0 +1,213 @@
+"""
+On-demand sampling profiler.
+
+A session runs one background thread that wakes every `interval` seconds, reads
+the current stack of every other thread via sys._current_frames() and counts
+identical stacks. Nothing is hooked into the interpreter (no sys.setprofile),
+so the handlers run at full speed, and when no session is running there is no
+thread at all.
+
+With a route pattern, samples are only taken while at least one request whose
+path matches the pattern is in flight (see middleware.profiler). Stacks of
+other threads sampled during that window are included too; under concurrent
+load, compare against an unfiltered profile.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_INTERVAL = 0.005
+MAX_DURATION = 300.0
+
+# Leaf frames of threads that are parked rather than working (idle thread-pool
+# workers, the event loop waiting in select); counting them would drown the
+# real work
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+
+class SamplingProfiler:
+    """One profiling session: samples for `duration` seconds or until stop()."""
+
+    def __init__(
+        self,
+        duration: float,
+        interval: float = DEFAULT_INTERVAL,
+        route: Optional[str] = None,
+    ):
+        self.duration = duration
+        self.interval = interval
+        self.route = route
+        self.samples: Counter = Counter()  # tuple of Frame, root first -> count
+        self.started_at: Optional[float] = None
+        self.sampled_seconds = 0.0
+        self._in_flight = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------------------------------------------------------- control
+    def start(self, on_finish=None) -> None:
+        def run():
+            try:
+                self._run()
+            finally:
+                if on_finish is not None:
+                    on_finish(self)
+
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def enter(self) -> None:
+        """A request matching the route pattern started."""
+        self._in_flight += 1
+
+    def exit(self) -> None:
+        self._in_flight -= 1
+
+    # --------------------------------------------------------------- sampling
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        deadline = time.monotonic() + self.duration
+        while not self._stop.wait(self.interval):
+            if time.monotonic() >= deadline:
+                break
+            if self.route is not None and self._in_flight <= 0:
+                continue
+            frames = sys._current_frames()
+            if any(ident not in names for ident in frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    continue
+                stack: List[Frame] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append((f"thread:{names.get(ident, ident)}", "", 0))
+                stack.reverse()
+                self.samples[tuple(stack)] += 1
+            self.sampled_seconds += self.interval
+
+    # ---------------------------------------------------------------- exports
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format (flamegraph.pl, speedscope)."""
+        lines = []
+        for stack, count in self.samples.most_common():
+            names = ";".join(
+                name if not file else f"{name} ({file}:{line})"
+                for name, file, line in stack
+            )
+            lines.append(f"{names} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict:
+        """A speedscope "sampled" profile; stacks are weighted in seconds."""
+        index: Dict[Frame, int] = {}
+        frames: List[dict] = []
+        samples: List[List[int]] = []
+        weights: List[float] = []
+        for stack, count in self.samples.most_common():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    name, file, line = frame
+                    entry = {"name": name}
+                    if file:
+                        entry.update(file=file, line=line)
+                    frames.append(entry)
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(count * self.interval)
+        name = f"profile {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started_at))}"
+        if self.route:
+            name += f" route={self.route}"
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "name": name,
+            "exporter": "utils.profiler",
+        }
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "route": self.route,
+            "interval": self.interval,
+            "duration": self.duration,
+            "started_at": self.started_at,
+            "sampled_seconds": round(self.sampled_seconds, 3),
+            "samples": sum(self.samples.values()),
+            "stacks": len(self.samples),
+        }
+
+
+class Profiling:
+    """Holds the running session (at most one) and the last finished one."""
+
+    def __init__(self):
+        self.active: Optional[SamplingProfiler] = None
+        self.last: Optional[SamplingProfiler] = None
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        duration: float,
+        interval: float = DEFAULT_INTERVAL,
+        route: Optional[str] = None,
+    ) -> SamplingProfiler:
+        with self._lock:
+            if self.active is not None:
+                raise RuntimeError("A profiling session is already running")
+            session = SamplingProfiler(duration, interval, route)
+            self.active = session
+        session.start(on_finish=self._finished)
+        return session
+
+    def stop(self) -> Optional[SamplingProfiler]:
+        session = self.active
+        if session is not None:
+            session.stop()
+        return session
+
+    def _finished(self, session: SamplingProfiler) -> None:
+        with self._lock:
+            if self.active is session:
+                self.active = None
+            self.last = session
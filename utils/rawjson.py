@@ -0,0 +1,30 @@
+"""
+Responses assembled from JSON bytes the stores already hold (see
+Repository.get_json), instead of handing models to FastAPI's response_model
+machinery, which would validate and serialize every record again.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional
+
+from fastapi import Response
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def json_array(parts: Iterable[bytes]) -> bytes:
+    """Join encoded records into a JSON array; no re-encoding takes place."""
+    return b"[" + b",".join(parts) + b"]"
+
+
+def response_headers(response: Response) -> Dict[str, str]:
+    """Headers a handler set on its injected `response` (minus the body length)."""
+    return {k: v for k, v in response.headers.items() if k != "content-length"}
+
+
+def json_response(
+    body: bytes, headers: Optional[Dict[str, str]] = None, status_code: int = 200
+) -> Response:
+    return Response(
+        body, status_code=status_code, media_type=JSON_MEDIA_TYPE, headers=headers
+    )
@@ -0,0 +1,126 @@
+"""
+LRU cache of serialized list responses.
+
+Entries are keyed by collection and normalized query string (parameter order
+does not matter) and remember the store generation they were computed at. A
+lookup made at any other generation drops the entry, so every write to a
+collection, through any handler, batch or worker process, invalidates exactly
+that collection's entries and nothing else. A response computed while a write
+lands is stored under the generation read before the query, so at worst it
+is never served; a stale body is never returned.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+from utils.etag import Generation, normalized_query
+from utils.rawjson import json_response, response_headers
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Rough per-entry bookkeeping cost (key tuple, entry tuple, OrderedDict node)
+ENTRY_OVERHEAD = 256
+
+
+class CachedResponse(NamedTuple):
+    generation: Generation
+    body: bytes
+    headers: Dict[str, str]
+    size: int
+
+    def response(self) -> Response:
+        return json_response(self.body, self.headers)
+
+
+def cache_key(collection: str, request: Request) -> CacheKey:
+    return collection, normalized_query(request)
+
+
+class ResponseCache:
+    """Thread-safe LRU bounded by the approximate bytes it holds."""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, key: CacheKey) -> None:
+        self.bytes -= self._entries.pop(key).size
+
+    def get(
+        self, collection: str, request: Request, generation: Generation
+    ) -> Optional[Response]:
+        """The cached response for this query at `generation`, if there is one."""
+        key = cache_key(collection, request)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.generation != generation:
+                self._drop(key)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry.response()
+
+    def put(
+        self,
+        collection: str,
+        request: Request,
+        generation: Generation,
+        body: bytes,
+        response: Response,
+    ) -> Response:
+        """
+        Remember `body` together with the headers set on the handler's
+        `response`, and return the finished response.
+        """
+        headers = response_headers(response)
+        key = cache_key(collection, request)
+        size = (
+            len(body)
+            + sum(len(k) + len(v) for k, v in headers.items())
+            + sum(len(k) + len(v) for k, v in key[1])
+            + ENTRY_OVERHEAD
+        )
+        entry = CachedResponse(generation, body, headers, size)
+        if size <= self.max_bytes:
+            with self._lock:
+                if key in self._entries:
+                    self._drop(key)
+                self._entries[key] = entry
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    self._drop(next(iter(self._entries)))
+                    self.evictions += 1
+        return entry.response()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,327 @@
+"""
+Inverted index for name search over a store.
+
+A collection declares its searchable fields as key functions returning text,
+like its index spec. The text is normalized (accents stripped, case folded)
+and split into word tokens; each token maps to the rows of the records that
+contain it. Query terms match tokens exactly, as a prefix (search as you type)
+or, for fields declared fuzzy, within a small edit distance; candidates for
+the latter come from a trigram index over those fields' tokens.
+
+Prefix lookups walk the vocabulary kept as a few sorted runs (merged like a
+binary counter as tokens are added), which gives the range scans of a trie
+with one list slot per token instead of a node per character.
+"""
+from __future__ import annotations
+
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from resources.repository import Repository
+from utils.symbols import SymbolTable
+from utils.views import StoreView
+
+SearchField = Callable[[BaseModel], Optional[str]]
+
+# Tokens a query term may expand to as a prefix
+MAX_EXPANSIONS = 64
+# Fuzzy candidates (most shared trigrams first) checked by edit distance
+FUZZY_CANDIDATES = 64
+
+# Match quality of a token for a query term; a record scores the sum over terms
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.5
+FUZZY_SCORE = 0.4
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Normalized word tokens of `text` (accents stripped, case folded)."""
+    if not text:
+        return []
+    decomposed = unicodedata.normalize("NFKD", text)
+    folded = "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return _WORD.findall(folded)
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Edit distance with adjacent transpositions (optimal string alignment),
+    or limit + 1 once it is known to exceed `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (
+                i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+class Vocabulary:
+    """
+    The distinct tokens in sorted runs. Adding a token pushes a run of one and
+    merges runs of equal or smaller size, so there are O(log n) runs and each
+    token is moved O(log n) times. Tokens are never removed; the index skips
+    the ones it no longer holds and asks for a rebuild once they pile up.
+    """
+
+    def __init__(self, tokens: Iterable[str] = ()):
+        tokens = sorted(set(tokens))
+        self.runs: List[List[str]] = [tokens] if tokens else []
+        self.size = len(tokens)
+
+    def add(self, token: str) -> None:
+        run = [token]
+        while self.runs and len(self.runs[-1]) <= len(run):
+            # timsort merges the two sorted halves in linear time
+            run = sorted(self.runs.pop() + run)
+        self.runs.append(run)
+        self.size += 1
+
+    def prefixed(self, prefix: str, limit: int) -> Iterator[str]:
+        """Tokens starting with `prefix`, up to `limit` from each run."""
+        for run in self.runs:
+            i = bisect_left(run, prefix)
+            for token in run[i : i + limit]:
+                if not token.startswith(prefix):
+                    break
+                yield token
+
+
+class SearchIndex(StoreView):
+    def __init__(
+        self,
+        store: Repository,
+        fields: Dict[str, SearchField],
+        fuzzy: Iterable[str] = (),
+    ):
+        self.fields = fields
+        self.fuzzy_fields = frozenset(fuzzy)
+        self.reset()
+        super().__init__(store)
+
+    def reset(self) -> None:
+        self.rows: Dict[UUID, int] = {}
+        self.ids: List[Optional[UUID]] = []
+        self.free: List[int] = []
+        # row -> (its tokens, those from fuzzy fields)
+        self.tokens: List[Optional[Tuple[Tuple[str, ...], Tuple[str, ...]]]] = []
+        # token -> row, or the set of rows once there are several
+        self.postings: Dict[str, Union[int, Set[int]]] = {}
+        # One string per distinct token, shared by the rows holding it
+        self.symbols = SymbolTable()
+        self.vocabulary = Vocabulary()
+        # fuzzy token -> rows holding it in a fuzzy field; trigram -> those tokens
+        self.fuzzy_counts: Dict[str, int] = {}
+        self.trigrams: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # --------------------------------------------------------------- updates
+    def add(self, record_id: UUID, record: BaseModel) -> None:
+        tokens, fuzzy = set(), set()
+        for name, key in self.fields.items():
+            found = [self.symbols.intern(t) for t in tokenize(key(record))]
+            tokens.update(found)
+            if name in self.fuzzy_fields:
+                fuzzy.update(found)
+        if self.free:
+            row = self.free.pop()
+            self.ids[row] = record_id
+            self.tokens[row] = (tuple(tokens), tuple(fuzzy))
+        else:
+            row = len(self.ids)
+            self.ids.append(record_id)
+            self.tokens.append((tuple(tokens), tuple(fuzzy)))
+        self.rows[record_id] = row
+        for token in tokens:
+            rows = self.postings.get(token)
+            if rows is None:
+                self.postings[token] = row
+                self.vocabulary.add(token)
+            elif isinstance(rows, int):
+                self.postings[token] = {rows, row}
+            else:
+                rows.add(row)
+        for token in fuzzy:
+            count = self.fuzzy_counts.get(token, 0)
+            if not count:
+                for trigram in trigrams(token):
+                    self.trigrams.setdefault(trigram, set()).add(token)
+            self.fuzzy_counts[token] = count + 1
+
+    def remove(self, record_id: UUID) -> None:
+        row = self.rows.pop(record_id, None)
+        if row is None:
+            return
+        tokens, fuzzy = self.tokens[row]
+        self.ids[row] = self.tokens[row] = None
+        self.free.append(row)
+        for token in tokens:
+            rows = self.postings[token]
+            if isinstance(rows, int):
+                del self.postings[token]
+                self.symbols.discard(token)
+            else:
+                rows.discard(row)
+                if len(rows) == 1:
+                    self.postings[token] = next(iter(rows))
+        for token in fuzzy:
+            count = self.fuzzy_counts.pop(token) - 1
+            if count:
+                self.fuzzy_counts[token] = count
+            else:
+                for trigram in trigrams(token):
+                    holders = self.trigrams[trigram]
+                    holders.discard(token)
+                    if not holders:
+                        del self.trigrams[trigram]
+        if self.vocabulary.size > 2 * len(self.postings) + 1024:
+            self.vocabulary = Vocabulary(self.postings)
+
+    # ----------------------------------------------------------------- query
+    def _rows(self, token: str) -> Iterable[int]:
+        rows = self.postings.get(token)
+        if rows is None:
+            return ()
+        return (rows,) if isinstance(rows, int) else rows
+
+    def _size(self, token: str) -> int:
+        rows = self.postings.get(token)
+        return 1 if isinstance(rows, int) else len(rows or ())
+
+    def _fuzzy_matches(self, term: str) -> Dict[str, float]:
+        limit = 1 if len(term) <= 5 else 2
+        term_trigrams = trigrams(term)
+        shared = Counter()
+        for trigram in term_trigrams:
+            shared.update(self.trigrams.get(trigram, ()))
+        # An edit changes at most three trigrams (a transposition counts twice)
+        needed = max(1, len(term_trigrams) - 6 * limit)
+        candidates = heapq.nsmallest(
+            FUZZY_CANDIDATES,
+            (
+                (-count, abs(len(token) - len(term)), token)
+                for token, count in shared.items()
+                if count >= needed
+            ),
+        )
+        matches = {}
+        for _, _, token in candidates:
+            distance = edit_distance(term, token, limit)
+            if 0 < distance <= limit:
+                matches[token] = FUZZY_SCORE * (1 - distance / (len(term) + 1))
+        return matches
+
+    def _matches(self, term: str, fuzzy: bool) -> Dict[str, float]:
+        """Tokens `term` matches and how well: whole, as a prefix, else fuzzily."""
+        matches = {}
+        if term in self.postings:
+            matches[term] = EXACT_SCORE
+        expansions = sorted(
+            {t for t in self.vocabulary.prefixed(term, MAX_EXPANSIONS) if t != term}
+        )
+        for token in expansions[:MAX_EXPANSIONS]:
+            if token in self.postings:
+                matches[token] = _prefix_score(term, token)
+        if not matches and fuzzy and self.trigrams:
+            matches = self._fuzzy_matches(term)
+        return matches
+
+    def search(
+        self, query: str, limit: int, fuzzy: bool = True
+    ) -> List[Tuple[float, UUID]]:
+        """
+        The `limit` best (score, record ID) matches for `query`, best first.
+        Every term of the query has to match the record.
+
+        The rows of the most selective term are visited best token first and
+        the other terms are checked against each row's own tokens, so the walk
+        stops as soon as no remaining row can beat the results at hand.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self.current():
+            per_term = [(term, self._matches(term, fuzzy)) for term in terms]
+            if not all(matches for _, matches in per_term):
+                return []
+            per_term.sort(key=lambda tm: sum(self._size(t) for t in tm[1]))
+            (_, driver), others = per_term[0], per_term[1:]
+            best_others = sum(max(matches.values()) for _, matches in others)
+            top = self._top(driver, others, best_others, limit)
+            return [(round(score, 4), self.ids[row]) for score, _, row in top]
+
+    def _top(
+        self,
+        driver: Dict[str, float],
+        others: List[Tuple[str, Dict[str, float]]],
+        best_others: float,
+        limit: int,
+    ) -> List[Tuple[float, int, int]]:
+        # Min-heap of (score, -arrival, row): the worst of the best kept on top
+        heap: List[Tuple[float, int, int]] = []
+        seen: Set[int] = set()
+        for token, quality in sorted(driver.items(), key=lambda tq: -tq[1]):
+            bound = quality + best_others
+            for row in self._rows(token):
+                if len(heap) == limit and heap[0][0] >= bound:
+                    return sorted(heap, reverse=True)
+                if row in seen:
+                    continue  # already scored through a better token
+                seen.add(row)
+                score = quality
+                tokens = self.tokens[row][0]
+                for term, matches in others:
+                    best = max(
+                        (_quality(term, t, matches) for t in tokens), default=0.0
+                    )
+                    if not best:
+                        break
+                    score += best
+                else:
+                    entry = (score, -len(seen), row)
+                    if len(heap) < limit:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+        return sorted(heap, reverse=True)
+
+
+def _prefix_score(term: str, token: str) -> float:
+    # Between half and all of PREFIX_SCORE, by how much of the token is typed
+    return PREFIX_SCORE * (1 + len(term) / len(token)) / 2
+
+
+def _quality(term: str, token: str, matches: Dict[str, float]) -> float:
+    """How well `token` matches `term` (prefixes beyond the expansion cap too)."""
+    quality = matches.get(token)
+    if quality is not None:
+        return quality
+    return _prefix_score(term, token) if token.startswith(term) else 0.0
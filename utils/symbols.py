@@ -0,0 +1,49 @@
+"""
+Symbol tables: one canonical object per distinct value.
+
+Structures that hold a value once per record (search index rows, facet paths,
+columnar dictionaries) intern it here, so equal values share one object instead
+of each holding the copy parsed out of its own JSON. A table owned by one
+structure discards values as they leave it. The fields in SHARED_FIELDS get one
+table per field name for the whole process, shared by every view that holds
+them; those tables never shrink, so they are kept to fields whose values come
+from a small fixed set.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Dict, Hashable, Optional
+
+# Fields whose values come from a small fixed set shared across collections
+SHARED_FIELDS = frozenset({"continent", "country"})
+
+
+class SymbolTable:
+    def __init__(self):
+        self._symbols: Dict[Hashable, Hashable] = {}
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def intern(self, value: Hashable) -> Hashable:
+        """The canonical object equal to `value` (`value` itself the first time)."""
+        return self._symbols.setdefault(value, value)
+
+    def discard(self, value: Hashable) -> None:
+        """Forget `value` (for tables of values that come and go)."""
+        self._symbols.pop(value, None)
+
+
+_shared: Dict[str, SymbolTable] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_symbols(field: str) -> Optional[SymbolTable]:
+    """The process-wide table of `field`, or None if it is not in SHARED_FIELDS."""
+    if field not in SHARED_FIELDS:
+        return None
+    with _shared_lock:
+        table = _shared.get(field)
+        if table is None:
+            table = _shared[field] = SymbolTable()
+        return table
@@ -0,0 +1,193 @@
+"""
+Derived views of a store: structures computed from its records (columns,
+graph edges, counters) and kept up to date incrementally from its writes.
+"""
+from __future__ import annotations
+
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional, Set
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from resources.repository import Repository
+
+# Records read per chunk when a view is rebuilt from the store
+REBUILD_CHUNK_SIZE = 1000
+
+# Rounds of re-reading the records written during a rebuild's scan before the
+# rest is re-read with writers held off
+MAX_DRAIN_ROUNDS = 10
+
+# Records written elsewhere that a view catches up on one by one; past this it
+# rebuilds from a scan instead
+CATCH_UP_LIMIT = 10_000
+
+
+class StoreView(ABC):
+    """
+    Base class of the derived views. A view subscribes to its store and applies
+    every put/delete as it happens (subclasses implement add/remove/reset).
+    Views are updated in memory under the store lock and never make writers
+    wait, and remove() works from the record ID alone, so stores do not read
+    the record being replaced just to tell the view.
+
+    Each write it applies accounts for one generation, so before a read the view
+    compares the generations it has seen with the store's. Anything it could not
+    see (a write from another worker on a shared SQLite store, or a clear())
+    shows up as a difference: the view re-reads the records the store reports
+    changed (Repository.changes), or rebuilds if the store cannot say.
+
+    A rebuild scans the store without holding its lock, so writers carry on;
+    the IDs they write meanwhile are noted and re-read once the scan is done.
+    Views are built in the background at startup (build_views) or else by
+    their first read; until then writes are not applied.
+    """
+
+    blocks_writers = False
+
+    def __init__(self, store: Repository):
+        self.store = store
+        # Guards the view's own structures; taken after store.lock, never before
+        self.lock = threading.RLock()
+        # One build or catch-up at a time; taken before store.lock
+        self._syncing = threading.Lock()
+        # Store generation the view was last synced to (None: not built yet)
+        self._generation: Optional[int] = None
+        self._applied = 0
+        # IDs written while a rebuild scans the store
+        self._dirty: Optional[Set[UUID]] = None
+        self.rebuilds = 0
+        store.subscribe(self)
+
+    # ------------------------------------------------------------------ hooks
+    @abstractmethod
+    def reset(self) -> None:
+        """Drop everything the view holds."""
+
+    @abstractmethod
+    def add(self, record_id: UUID, record: BaseModel) -> None: ...
+
+    @abstractmethod
+    def remove(self, record_id: UUID) -> None:
+        """Drop what the view holds for `record_id` (nothing if it holds nothing)."""
+
+    # -------------------------------------------------------------- listener
+    def on_put(self, record_id: UUID, new: BaseModel):
+        if self._generation is None and self._dirty is None:
+            return  # not built yet
+        with self.lock:
+            self._applied += 1
+            if self._dirty is not None:
+                self._dirty.add(record_id)
+            else:
+                self.remove(record_id)
+                self.add(record_id, new)
+
+    def on_delete(self, record_id: UUID):
+        if self._generation is None and self._dirty is None:
+            return
+        with self.lock:
+            self._applied += 1
+            if self._dirty is not None:
+                self._dirty.add(record_id)
+            else:
+                self.remove(record_id)
+
+    # ----------------------------------------------------------------- reads
+    def _refresh(self, record_ids: Iterable[UUID]) -> None:
+        """Re-read records from the store into the view."""
+        for record_id in record_ids:
+            record = self.store.get(record_id)
+            with self.lock:
+                self.remove(record_id)
+                if record is not None:
+                    self.add(record_id, record)
+
+    def _rebuild(self) -> bool:
+        """Rebuild from a scan; False if writes went unseen meanwhile."""
+        with self.store.lock:
+            since = self.store.generation
+            with self.lock:
+                self.reset()
+                self._generation = None
+                self._applied = 0
+                self._dirty = set()
+        try:
+            for records in self.store.scan((), None, REBUILD_CHUNK_SIZE):
+                with self.lock:
+                    for record in records:
+                        # A record written during the scan may come up twice
+                        self.remove(record.id)
+                        self.add(record.id, record)
+            # Re-read what was written during the scan (here or by other
+            # workers), still without blocking writers, until little enough is
+            # left to finish under their lock
+            counted = True  # self._applied counts every write since `since`
+            for _ in range(MAX_DRAIN_ROUNDS):
+                generation = self.store.generation
+                changed = self.store.changes(since, CATCH_UP_LIMIT)
+                with self.lock:
+                    if len(self._dirty) + len(changed or ()) <= REBUILD_CHUNK_SIZE:
+                        break
+                    dirty, self._dirty = self._dirty, set()
+                if changed is not None:
+                    dirty.update(changed)
+                    since, counted = generation, False
+                self._refresh(dirty)
+            with self.store.lock:
+                generation = self.store.generation
+                changed = self.store.changes(since, CATCH_UP_LIMIT)
+                with self.lock:
+                    if changed is None and not (
+                        counted and since + self._applied == generation
+                    ):
+                        return False
+                    self._refresh(self._dirty.union(changed or ()))
+                    self._generation = generation
+                    self._applied = 0
+                    self._dirty = None
+                    self.rebuilds += 1
+                    return True
+        finally:
+            # A failed rebuild leaves the view unbuilt: writes are ignored again
+            self._dirty = None
+
+    def _sync(self) -> None:
+        with self._syncing:
+            if self._generation is not None:
+                with self.store.lock:
+                    generation = self.store.generation
+                    with self.lock:
+                        if self._generation + self._applied == generation:
+                            self._generation, self._applied = generation, 0
+                            return
+                    changed = self.store.changes(self._generation, CATCH_UP_LIMIT)
+                    if changed is not None:
+                        with self.lock:
+                            self._refresh(changed)
+                            self._generation, self._applied = generation, 0
+                        return
+            while not self._rebuild():
+                pass
+
+    @contextmanager
+    def current(self) -> Iterator[None]:
+        """Hold the view, brought up to date with the store, for a read."""
+        self._sync()
+        with self.lock:
+            yield
+
+
+def build_views(views: Iterable[StoreView]) -> threading.Thread:
+    """Build the views in a background thread, so startup does not wait."""
+
+    def build() -> None:
+        for view in views:
+            view._sync()
+
+    thread = threading.Thread(target=build, name="build-views", daemon=True)
+    thread.start()
+    return thread